@@ -0,0 +1,118 @@
+"""Throughput of AsyncAPIClient with and without keep-alive connections.
+
+Usage: python benchmarks/api_client.py [--requests 2000] [--concurrency 16] [--tls]
+
+`--tls` serves over https with a throwaway self-signed certificate (needs the `openssl` binary),
+which is closer to an upstream provider than plain http over loopback where connecting is nearly
+free.
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+from fastapi import FastAPI, Request
+
+from vmc.utils.api_client import AsyncAPIClient
+
+app = FastAPI()
+peers: set[tuple[str, int]] = set()
+
+
+@app.get("/ping")
+async def ping(request: Request):
+    peers.add(request.scope["client"])
+    return {"code": 0, "msg": "ok"}
+
+
+@app.post("/peers")
+async def count_peers():
+    """Number of distinct client connections seen since the last call."""
+    count = len(peers)
+    peers.clear()
+    return {"code": 0, "msg": "ok", "count": count}
+
+
+class NoKeepAliveClient(AsyncAPIClient):
+    """Previous behaviour: every request asks the server to close the connection."""
+
+    async def _build_headers(self, options):
+        headers = await super()._build_headers(options)
+        headers["Connection"] = "close"
+        return headers
+
+
+async def run(client: AsyncAPIClient, requests: int, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            await client.get("/ping", cast_to=dict)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[one() for _ in range(requests)])
+    elapsed = time.perf_counter() - start
+    await client.close()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--port", type=int, default=18765)
+    parser.add_argument("--tls", action="store_true")
+    args = parser.parse_args()
+
+    command = [sys.executable, "-m", "uvicorn", "api_client:app", "--port", str(args.port)]
+    scheme = "http"
+    if args.tls:
+        certdir = tempfile.mkdtemp()
+        key, cert = os.path.join(certdir, "key.pem"), os.path.join(certdir, "cert.pem")
+        subprocess.run(
+            ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1"]
+            + ["-keyout", key, "-out", cert, "-subj", "/CN=127.0.0.1"]
+            + ["-addext", "subjectAltName=IP:127.0.0.1"],
+            check=True,
+            capture_output=True,
+        )
+        command += ["--ssl-keyfile", key, "--ssl-certfile", cert]
+        os.environ["SSL_CERT_FILE"] = cert
+        scheme = "https"
+    # run the server in its own process so it does not share the GIL with the client
+    server = subprocess.Popen(
+        command,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    base_url = f"{scheme}://127.0.0.1:{args.port}"
+    while True:
+        try:
+            httpx.post(f"{base_url}/peers")
+            break
+        except httpx.TransportError:
+            time.sleep(0.1)
+
+    limits = httpx.Limits(max_connections=args.concurrency)
+    try:
+        for name, cls in [("connection: close", NoKeepAliveClient), ("keep-alive", AsyncAPIClient)]:
+            elapsed = asyncio.run(
+                run(cls(base_url=base_url, limits=limits), args.requests, args.concurrency)
+            )
+            connections = httpx.post(f"{base_url}/peers").json()["count"]
+            print(
+                f"{name:>18}: {args.requests / elapsed:8.0f} req/s, "
+                f"{connections} connections for {args.requests} requests"
+            )
+    finally:
+        server.terminate()
+
+
+if __name__ == "__main__":
+    main()
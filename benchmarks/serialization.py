@@ -0,0 +1,74 @@
+"""Serialization time of hot responses with the default path and with `VMC_FAST_JSON`.
+
+Usage: python benchmarks/serialization.py [--rows 512] [--dim 1024] [--chunks 10000]
+
+The default path of a route is `jsonable_encoder` then `json.dumps` in `JSONResponse`. The fast
+path serializes the pydantic model with pydantic-core, or a numpy matrix with orjson. Stream
+events already use pydantic's `model_dump_json`, they are compared with orjson for reference.
+"""
+
+import argparse
+import time
+
+import numpy as np
+import orjson
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from vmc.types.embedding.embedding import EmbeddingResponse
+from vmc.types.generation.generation_chunk import GenerationChunk
+from vmc.utils.fastjson import FastJSONResponse, dumps
+
+
+def timeit(fn, repeat: int) -> float:
+    """Best time of `repeat` runs, in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=512)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--chunks", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    matrix = np.random.rand(args.rows, args.dim).astype(np.float32)
+    embedding = EmbeddingResponse(
+        created=time.time(), embed_time=0.1, embedding=matrix.tolist(), model="bench"
+    )
+    print(f"EmbeddingResponse {args.rows}x{args.dim}")
+    for name, fn in [
+        ("jsonable_encoder", lambda: JSONResponse(jsonable_encoder(embedding))),
+        ("model_dump_json", lambda: embedding.model_dump_json()),
+        ("orjson model_dump", lambda: orjson.dumps(embedding.model_dump())),
+        ("FastJSONResponse", lambda: FastJSONResponse(embedding)),
+        ("orjson numpy", lambda: dumps({"embedding": matrix})),
+    ]:
+        print(f"{name:>18}: {timeit(fn, args.repeat) * 1000:8.1f} ms")
+
+    chunk = GenerationChunk.model_validate(
+        {
+            "id": "bench",
+            "choices": [{"delta": {"content": "token", "role": "assistant"}, "index": 0}],
+            "created": time.time(),
+            "generation_time": 0.01,
+            "model": "bench",
+        }
+    )
+    print(f"GenerationChunk events x{args.chunks}")
+    for name, fn in [
+        ("model_dump_json", lambda: f"data: {chunk.model_dump_json()}\n\n"),
+        ("orjson model_dump", lambda: f"data: {orjson.dumps(chunk.model_dump()).decode()}\n\n"),
+    ]:
+        elapsed = timeit(lambda: [fn() for _ in range(args.chunks)], args.repeat)
+        print(f"{name:>18}: {elapsed / args.chunks * 1e6:8.2f} us/event")
+
+
+if __name__ == "__main__":
+    main()
@@ -23,7 +23,7 @@ from vmc_client.types.generation.generation_params import (
 )
 
 from ._async_client import AsyncAPIClient
-from ._constants import DEFAULT_MAX_RETRIES, DEFAULT_TIMEOUT
+from ._constants import DEFAULT_CONNECTION_LIMITS, DEFAULT_MAX_RETRIES, DEFAULT_TIMEOUT
 from .types._types import NOT_GIVEN, NotGiven
 
 
@@ -40,6 +40,8 @@ class AsyncVMC:
         model: Optional[str] = None,
         max_retries: Optional[int] = DEFAULT_MAX_RETRIES,
         timeout: Optional[httpx.Timeout] = DEFAULT_TIMEOUT,
+        limits: httpx.Limits = DEFAULT_CONNECTION_LIMITS,
+        http2: bool = False,
     ):
         base_url = host or os.getenv("VMC_BASE_URL")
         username = username or os.getenv("VMC_USERNAME")
@@ -51,6 +53,8 @@ class AsyncVMC:
             "max_retries": max_retries,
             "timeout": timeout,
             "auth_headers": {"Authorization": f"{username}:{password}"},
+            "limits": limits,
+            "http2": http2,
         }
         self._default_model = model
         self._client = AsyncAPIClient(**params)
@@ -9,6 +9,7 @@ from httpx import URL
 from loguru import logger
 
 from ._constants import (
+    DEFAULT_CONNECTION_LIMITS,
     DEFAULT_MAX_RETRIES,
     DEFAULT_TIMEOUT,
     INITIAL_RETRY_DELAY,
@@ -50,11 +51,18 @@ class SyncAPIClient:
         timeout: httpx.Timeout = DEFAULT_TIMEOUT,
         proxies: Union[None, httpx._types.ProxyTypes] = None,
         auth_headers: Union[None, Dict] = None,
+        limits: httpx.Limits = DEFAULT_CONNECTION_LIMITS,
+        http2: bool = False,
     ):
-        self._client = httpx.Client(base_url=base_url, timeout=timeout, proxies=proxies)
+        self._client = httpx.Client(
+            base_url=base_url, timeout=timeout, proxies=proxies, limits=limits, http2=http2
+        )
         self.max_retries = max_retries
         self.auth_headers = auth_headers or {}
 
+    def close(self):
+        self._client.close()
+
     def get_auth_headers(self) -> dict:
         return self.auth_headers
 
@@ -78,8 +86,6 @@ class SyncAPIClient:
             headers["Content-Type"] = "application/json; charset=utf-8"
         # if options.files is not None or options.data is not None and content_type is None:
         #     headers["Content-Type"] = "multipart/form-data"
-        # httpx uses connection pooling, uncompatible with asyncio
-        headers["Connection"] = "close"
         kwargs = {}
         if options.timeout is not None:
             kwargs["timeout"] = options.timeout
@@ -177,6 +183,9 @@ class SyncAPIClient:
         try:
             response.raise_for_status()
         except httpx.HTTPStatusError as e:
+            if options.stream:
+                response.read()
+                response.close()
             logger.debug(f"Request failed: {e}, {response.text}")
             if retries > 0 and self._should_retry(response):
                 return self._retry_request(cast_to, options, retries)
@@ -195,27 +204,32 @@ class SyncAPIClient:
         else:
 
             def streaming():
-                for chunk in response.iter_lines():
-                    if not chunk:
-                        continue
-                    if options.raw_response:
-                        yield cast(ResponseT, chunk)
-                    else:
-                        if not chunk.startswith(options.stream_prefix):
-                            raise BadResponseError(
-                                msg="Invalid stream prefix",
-                                context={"response": chunk},
-                            )
-                        data = chunk[len(options.stream_prefix) :]
-                        self._raise_api_exception_from_text(data)
-                        try:
-                            if inspect.isclass(cast_to) and issubclass(cast_to, pydantic.BaseModel):
-                                yield cast(ResponseT, cast_to.model_validate(json.loads(data)))
-                            else:
-                                yield cast(ResponseT, json.loads(data))
-                        except Exception as e:
-                            logger.error(f"Encountered Bad Response: {data}")
-                            raise BadResponseError(str(e), context={"response": data})
+                try:
+                    for chunk in response.iter_lines():
+                        if not chunk:
+                            continue
+                        if options.raw_response:
+                            yield cast(ResponseT, chunk)
+                        else:
+                            if not chunk.startswith(options.stream_prefix):
+                                raise BadResponseError(
+                                    msg="Invalid stream prefix",
+                                    context={"response": chunk},
+                                )
+                            data = chunk[len(options.stream_prefix) :]
+                            self._raise_api_exception_from_text(data)
+                            try:
+                                if inspect.isclass(cast_to) and issubclass(
+                                    cast_to, pydantic.BaseModel
+                                ):
+                                    yield cast(ResponseT, cast_to.model_validate(json.loads(data)))
+                                else:
+                                    yield cast(ResponseT, json.loads(data))
+                            except Exception as e:
+                                logger.error(f"Encountered Bad Response: {data}")
+                                raise BadResponseError(str(e), context={"response": data})
+                finally:
+                    response.close()
 
             return streaming()
 
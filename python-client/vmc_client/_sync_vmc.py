@@ -23,7 +23,7 @@ from vmc_client.types.generation.generation_params import (
     ResponseFormat,
 )
 
-from ._constants import DEFAULT_MAX_RETRIES, DEFAULT_TIMEOUT
+from ._constants import DEFAULT_CONNECTION_LIMITS, DEFAULT_MAX_RETRIES, DEFAULT_TIMEOUT
 from ._sync_client import SyncAPIClient
 from .types._types import NOT_GIVEN, NotGiven
 
@@ -41,6 +41,8 @@ class SyncVMC:
         model: Optional[str] = None,
         max_retries: Optional[int] = DEFAULT_MAX_RETRIES,
         timeout: Optional[httpx.Timeout] = DEFAULT_TIMEOUT,
+        limits: httpx.Limits = DEFAULT_CONNECTION_LIMITS,
+        http2: bool = False,
     ):
         base_url = host or os.getenv("VMC_BASE_URL")
         username = username or os.getenv("VMC_USERNAME")
@@ -52,6 +54,8 @@ class SyncVMC:
             "max_retries": max_retries,
             "timeout": timeout,
             "auth_headers": {"Authorization": f"{username}:{password}"},
+            "limits": limits,
+            "http2": http2,
         }
         self._default_model = model
         self._client = SyncAPIClient(**params)
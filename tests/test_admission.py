@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+from vmc.proxy.admission import AdmissionController
+from vmc.types.errors import OverloadedError
+from vmc.types.model_config import AdmissionConfig
+
+
+def make_controller(**kwargs) -> AdmissionController:
+    return AdmissionController("test", AdmissionConfig(**{"max_concurrency": 1, **kwargs}))
+
+
+def test_unlimited_never_waits():
+    controller = AdmissionController("test")
+
+    async def main():
+        return await asyncio.gather(*[controller.acquire() for _ in range(100)])
+
+    assert len(asyncio.run(main())) == 100
+    assert controller.retry_after() == 0
+
+
+def test_waiters_get_slots_in_order():
+    controller = make_controller()
+    order = []
+
+    async def call(i: int):
+        permit = await controller.acquire()
+        order.append(i)
+        await asyncio.sleep(0.01)
+        permit.release()
+
+    async def main():
+        await asyncio.gather(*[call(i) for i in range(4)])
+
+    asyncio.run(main())
+    assert order == [0, 1, 2, 3]
+    assert controller.inflight == 0
+
+
+def test_full_queue_is_rejected_with_retry_after():
+    controller = make_controller(max_queue=2)
+
+    async def main():
+        controller._hold_time.update(2.0)
+        await controller.acquire()
+        waiters = [asyncio.create_task(controller.acquire()) for _ in range(2)]
+        await asyncio.sleep(0)
+        assert controller.waiting == 2
+        with pytest.raises(OverloadedError) as e:
+            await controller.acquire()
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        return e.value
+
+    error = asyncio.run(main())
+    """Three calls ahead of a new one, one slot held 2s each"""
+    assert error.context["retry_after"] == pytest.approx(6.0)
+    assert controller.rejected == 1
+    assert controller.waiting == 0
+
+
+def test_queue_time_is_bounded():
+    controller = make_controller(max_queue_time=0.02)
+
+    async def main():
+        await controller.acquire()
+        with pytest.raises(OverloadedError):
+            await controller.acquire()
+
+    asyncio.run(main())
+    assert controller.waiting == 0
+    assert controller.inflight == 1
+
+
+def test_dropped_stream_releases_slot():
+    controller = make_controller()
+
+    async def stream():
+        yield "chunk"
+
+    async def main():
+        permit = await controller.acquire()
+        held = permit.hold(stream())
+        assert controller.inflight == 1
+        del held
+        assert controller.inflight == 0
+
+    asyncio.run(main())
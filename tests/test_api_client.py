@@ -0,0 +1,90 @@
+import asyncio
+import threading
+import time
+
+import httpx
+import pytest
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+from utils import get_random_avaiable_port
+
+from vmc.utils.api_client import AsyncAPIClient
+
+app = FastAPI()
+peers: set[tuple[str, int]] = set()
+
+
+@app.get("/ping")
+async def ping(request: Request):
+    peers.add(request.scope["client"])
+    await asyncio.sleep(0.01)
+    return {"code": 0, "msg": "ok"}
+
+
+@app.post("/stream")
+async def stream(request: Request):
+    peers.add(request.scope["client"])
+
+    async def events():
+        for i in range(3):
+            yield f'data: {{"code": 0, "msg": "{i}"}}\n\n'
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@pytest.fixture(scope="module")
+def base_url():
+    port = get_random_avaiable_port()
+    server = uvicorn.Server(uvicorn.Config(app, port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    yield f"http://127.0.0.1:{port}"
+    server.should_exit = True
+    thread.join()
+
+
+@pytest.fixture(autouse=True)
+def reset_peers():
+    peers.clear()
+
+
+def test_concurrent_requests_reuse_connections(base_url):
+    client = AsyncAPIClient(base_url=base_url, limits=httpx.Limits(max_connections=8))
+
+    async def main():
+        results = await asyncio.gather(*[client.get("/ping", cast_to=dict) for _ in range(200)])
+        await client.close()
+        return results
+
+    results = asyncio.run(main())
+    assert all(r["msg"] == "ok" for r in results)
+    assert len(peers) <= 8
+
+
+def test_client_is_bound_per_event_loop(base_url):
+    client = AsyncAPIClient(base_url=base_url)
+
+    async def main():
+        for _ in range(5):
+            await client.get("/ping", cast_to=dict)
+        await client.close()
+
+    asyncio.run(main())
+    asyncio.run(main())
+    assert len(peers) == 2
+
+
+def test_stream_releases_connection(base_url):
+    client = AsyncAPIClient(base_url=base_url, limits=httpx.Limits(max_connections=1))
+
+    async def main():
+        for _ in range(5):
+            chunks = [c async for c in await client.stream("/stream", cast_to=dict)]
+            assert [c["msg"] for c in chunks] == ["0", "1", "2"]
+        await client.close()
+
+    asyncio.run(asyncio.wait_for(main(), timeout=10))
+    assert len(peers) == 1
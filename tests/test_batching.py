@@ -0,0 +1,111 @@
+import asyncio
+import time
+
+from vmc.serve.batching import MicroBatcher
+
+
+class Recorder:
+    """Model call that upper-cases its items and records the batches it received"""
+
+    def __init__(self):
+        self.batches: list[list[str]] = []
+
+    async def __call__(self, items: list[str], options: list) -> list[str]:
+        self.batches.append(items)
+        return [item.upper() for item in items]
+
+
+def test_flush_on_size():
+    process = Recorder()
+    batcher = MicroBatcher(process, name="test_size", max_wait=10, max_batch_size=4)
+
+    async def main():
+        return await asyncio.gather(
+            batcher.submit(["a", "b"], None), batcher.submit(["c", "d"], None)
+        )
+
+    start = time.monotonic()
+    results = asyncio.run(asyncio.wait_for(main(), timeout=5))
+    assert time.monotonic() - start < 1
+    assert results == [["A", "B"], ["C", "D"]]
+    assert process.batches == [["a", "b", "c", "d"]]
+
+
+def test_flush_on_tokens():
+    process = Recorder()
+    batcher = MicroBatcher(
+        process, name="test_tokens", count_tokens=len, max_wait=10, max_batch_tokens=8
+    )
+
+    async def main():
+        return await asyncio.gather(batcher.submit(["aaaa"], None), batcher.submit(["bbbb"], None))
+
+    assert asyncio.run(asyncio.wait_for(main(), timeout=5)) == [["AAAA"], ["BBBB"]]
+    assert process.batches == [["aaaa", "bbbb"]]
+
+
+def test_flush_on_timeout():
+    process = Recorder()
+    batcher = MicroBatcher(process, name="test_timeout", max_wait=0.05)
+
+    async def main():
+        first = asyncio.create_task(batcher.submit(["a"], None))
+        await asyncio.sleep(0.01)
+        second = asyncio.create_task(batcher.submit(["b"], None))
+        return await asyncio.gather(first, second)
+
+    start = time.monotonic()
+    assert asyncio.run(main()) == [["A"], ["B"]]
+    assert 0.05 <= time.monotonic() - start < 1
+    assert process.batches == [["a", "b"]]
+
+
+def test_requests_are_not_split():
+    process = Recorder()
+    batcher = MicroBatcher(process, name="test_split", max_wait=0.01, max_batch_size=3)
+
+    async def main():
+        return await asyncio.gather(
+            batcher.submit(["a", "b"], None), batcher.submit(["c", "d"], None)
+        )
+
+    assert asyncio.run(main()) == [["A", "B"], ["C", "D"]]
+    assert process.batches == [["a", "b"], ["c", "d"]]
+
+
+def test_failure_reaches_every_request():
+    async def process(items, options):
+        raise RuntimeError("model failed")
+
+    batcher = MicroBatcher(process, name="test_failure", max_wait=0.01)
+
+    async def main():
+        return await asyncio.gather(
+            batcher.submit(["a"], None), batcher.submit(["b"], None), return_exceptions=True
+        )
+
+    results = asyncio.run(main())
+    assert [str(result) for result in results] == ["model failed"] * 2
+
+
+def test_bad_result_count_fails_batch_and_worker_survives():
+    calls = 0
+
+    async def process(items, options):
+        nonlocal calls
+        calls += 1
+        return items[:1] if calls == 1 else items
+
+    batcher = MicroBatcher(process, name="test_split_failure", max_wait=0.01)
+
+    async def main():
+        results = await asyncio.wait_for(
+            asyncio.gather(
+                batcher.submit(["a"], None), batcher.submit(["b"], None), return_exceptions=True
+            ),
+            timeout=5,
+        )
+        assert all(isinstance(result, ValueError) for result in results)
+        return await asyncio.wait_for(batcher.submit(["c"], None), timeout=5)
+
+    assert asyncio.run(main()) == ["c"]
@@ -0,0 +1,50 @@
+import time
+
+from vmc.utils.cache import TTLCache
+
+
+def test_entries_expire_after_ttl():
+    cache = TTLCache("test_ttl", ttl=0.05)
+    cache.set("token", "user")
+    assert cache.get("token") == "user"
+    time.sleep(0.06)
+    assert cache.get("token") is None
+    assert len(cache) == 0
+
+
+def test_least_recently_used_is_evicted():
+    cache = TTLCache("test_lru", maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert len(cache) == 2
+
+
+def test_setting_refreshes_entry():
+    cache = TTLCache("test_refresh", maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.set("a", 10)
+    cache.set("c", 3)
+    assert cache.get("a") == 10
+    assert cache.get("b") is None
+
+
+def test_invalidate_and_pop():
+    cache = TTLCache("test_invalidate")
+    for key in ["alice:1", "alice:2", "bob:1"]:
+        cache.set(key, key.split(":")[0])
+    cache.invalidate(lambda _, user: user == "alice")
+    assert len(cache) == 1
+    assert cache.pop("bob:1") == "bob"
+    assert cache.pop("bob:1") is None
+
+
+def test_disabled_cache_stores_nothing():
+    for cache in [TTLCache("test_no_ttl", ttl=0), TTLCache("test_no_size", maxsize=0)]:
+        assert not cache.enabled
+        cache.set("a", 1)
+        assert cache.get("a") is None
@@ -0,0 +1,112 @@
+import asyncio
+import gc
+import time
+
+import httpx
+
+from vmc.types.errors import BadParamsError
+from vmc.types.model_config import CircuitBreakerConfig
+from vmc.utils.circuit import CircuitBreaker
+
+FAILURE = httpx.ConnectError("refused")
+
+
+def make_breaker(**kwargs) -> CircuitBreaker:
+    config = {"window": 4, "min_requests": 4, "error_rate": 0.5, "open_duration": 0.05, **kwargs}
+    return CircuitBreaker("test", CircuitBreakerConfig(**config))
+
+
+def open_breaker(breaker: CircuitBreaker):
+    for _ in range(breaker.config.min_requests):
+        assert breaker.allow()
+        breaker.record(FAILURE, 0.01)
+    assert breaker.state == "open"
+
+
+def test_opens_on_error_rate():
+    breaker = make_breaker()
+    for error in [None, FAILURE, None]:
+        assert breaker.allow()
+        breaker.record(error, 0.01)
+    assert breaker.state == "closed"
+    breaker.record(FAILURE, 0.01)
+    assert breaker.state == "open"
+    assert not breaker.allow()
+    assert 0 < breaker.retry_after() <= 0.05
+
+
+def test_client_errors_count_as_successes():
+    breaker = make_breaker()
+    for _ in range(8):
+        breaker.record(BadParamsError(), 0.01)
+    assert breaker.state == "closed"
+
+
+def test_opens_on_slow_calls():
+    breaker = make_breaker(slow_call_duration=1, slow_call_rate=0.5)
+    for duration in [2, 2, 0.1, 0.1]:
+        breaker.record(None, duration)
+    assert breaker.state == "open"
+
+
+def test_half_open_closes_after_successful_trial():
+    breaker = make_breaker()
+    open_breaker(breaker)
+    time.sleep(0.06)
+    assert breaker.available
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    """Only `half_open_max_calls` trials at a time"""
+    assert not breaker.allow()
+    breaker.record(None, 0.01)
+    assert breaker.state == "closed"
+    assert breaker.allow()
+
+
+def test_half_open_reopens_on_failed_trial():
+    breaker = make_breaker()
+    open_breaker(breaker)
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record(FAILURE, 0.01)
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+def test_dropped_stream_gives_back_trial():
+    breaker = make_breaker()
+    open_breaker(breaker)
+    time.sleep(0.06)
+    assert breaker.allow()
+
+    async def stream():
+        yield "chunk"
+
+    guarded = breaker.guard(stream(), time.monotonic())
+    del guarded
+    gc.collect()
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+
+
+def test_stream_records_first_chunk():
+    breaker = make_breaker()
+    open_breaker(breaker)
+    time.sleep(0.06)
+    assert breaker.allow()
+
+    async def stream():
+        yield "chunk"
+        raise FAILURE
+
+    async def main():
+        chunks = []
+        try:
+            async for chunk in breaker.guard(stream(), time.monotonic()):
+                chunks.append(chunk)
+        except httpx.ConnectError:
+            pass
+        return chunks
+
+    assert asyncio.run(main()) == ["chunk"]
+    assert breaker.state == "closed"
@@ -0,0 +1,113 @@
+import asyncio
+
+import httpx
+import pytest
+
+from vmc.models.credentials import CredentialPool
+from vmc.types.errors import BadParamsError, OverloadedError, RateLimitError
+from vmc.types.model_config import AdmissionConfig
+from vmc.utils.concurrency import AdaptiveLimit
+
+
+def test_from_config():
+    assert AdaptiveLimit.from_config("test", AdmissionConfig(max_concurrency=8)) is None
+    assert AdaptiveLimit.from_config("test", AdmissionConfig(adaptive=True)) is None
+    limit = AdaptiveLimit.from_config(
+        "test", AdmissionConfig(adaptive=True, max_concurrency=8, min_concurrency=2)
+    )
+    assert (limit.min_limit, limit.max_limit, int(limit)) == (2, 8, 2)
+
+
+def test_increases_by_one_per_window_of_successes():
+    limit = AdaptiveLimit("test", min_limit=4, max_limit=10)
+    for _ in range(4):
+        limit.record(None, 0.1, inflight=4)
+    assert 4.9 < limit.limit < 5
+    limit.record(None, 0.1, inflight=4)
+    assert int(limit) == 5
+
+
+def test_idle_successes_do_not_increase():
+    limit = AdaptiveLimit("test", min_limit=4, max_limit=10)
+    for _ in range(100):
+        limit.record(None, 0.1, inflight=1)
+    assert limit.limit == 4
+
+
+def test_increase_is_capped():
+    limit = AdaptiveLimit("test", min_limit=1, max_limit=3)
+    for _ in range(1000):
+        limit.record(None, 0.1, inflight=3)
+    assert limit.limit == 3
+
+
+def test_decreases_on_rate_limit_once_per_window():
+    limit = AdaptiveLimit("test", min_limit=1, max_limit=100, backoff_ratio=0.5)
+    limit.limit = 40
+    limit.record(RateLimitError(), 0, inflight=40)
+    assert limit.limit == 20
+    """Calls started before the decrease are ignored"""
+    limit.record(RateLimitError(), 1, inflight=20)
+    limit.record(httpx.ReadTimeout("timeout"), 1, inflight=20)
+    assert limit.limit == 20
+    limit.record(RateLimitError(), 0, inflight=20)
+    assert limit.limit == 10
+
+
+def test_decreases_on_slow_calls():
+    limit = AdaptiveLimit("test", min_limit=1, max_limit=100, latency_tolerance=2)
+    limit.limit = 10
+    limit.record(None, 0.1, inflight=1)
+    limit.record(None, 0.5, inflight=1)
+    assert limit.limit == 9
+
+
+def test_never_below_min_and_ignores_client_errors():
+    limit = AdaptiveLimit("test", min_limit=2, max_limit=10, backoff_ratio=0.1)
+    limit.limit = 5
+    limit.record(BadParamsError(), 0, inflight=5)
+    assert limit.limit == 5
+    limit.record(RateLimitError(), 0, inflight=5)
+    assert limit.limit == 2
+
+
+def adaptive_pool(max_queue_time: float = 5) -> CredentialPool:
+    return CredentialPool(
+        "test",
+        [{"api_key": "a"}],
+        admission=AdmissionConfig(
+            adaptive=True, max_concurrency=4, min_concurrency=1, max_queue_time=max_queue_time
+        ),
+    )
+
+
+def test_credential_waits_for_its_adaptive_limit():
+    pool = adaptive_pool()
+    credential = pool.credentials[0]
+    order = []
+
+    async def call(name: str):
+        async with pool.use():
+            order.append((name, credential.inflight))
+            await asyncio.sleep(0.01)
+
+    async def main():
+        await asyncio.gather(call("first"), call("second"))
+
+    asyncio.run(main())
+    assert order == [("first", 1), ("second", 1)]
+    assert credential.inflight == 0 and pool._waiters == []
+
+
+def test_credential_at_its_limit_sheds_after_max_queue_time():
+    pool = adaptive_pool(max_queue_time=0.02)
+
+    async def main():
+        async with pool.use():
+            with pytest.raises(OverloadedError) as e:
+                async with pool.use():
+                    pass
+        return e.value
+
+    assert asyncio.run(main()).context["retry_after"] > 0
+    assert pool._waiters == []
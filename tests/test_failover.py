@@ -0,0 +1,134 @@
+import asyncio
+
+import pytest
+
+from vmc.proxy.failover import FailoverPolicy
+from vmc.proxy.hedging import HedgingPolicy
+from vmc.proxy.model import ProxyModel, VirtualModel
+from vmc.types.errors import InternalServerError, RateLimitError
+from vmc.types.model_config import ModelConfig
+
+
+class Member:
+    """Stub of an upstream model, `generate` runs `behaviour` and records the outcome"""
+
+    def __init__(self, behaviour):
+        self.behaviour = behaviour
+        self.calls = 0
+        self.cancelled = False
+
+    async def generate(self, content, **kwargs):
+        self.calls += 1
+        try:
+            return await self.behaviour(content)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+
+
+def make_member(name: str, behaviour) -> ProxyModel:
+    model = ProxyModel(ModelConfig(name=name, model_class="Member"))
+    model._model = Member(behaviour)
+    model.health.mark_up()
+    return model
+
+
+async def echo(content):
+    return content
+
+
+async def rate_limited(content):
+    raise RateLimitError()
+
+
+async def failing(content):
+    raise InternalServerError()
+
+
+def test_rate_limited_member_fails_over():
+    first, second = make_member("first", rate_limited), make_member("second", echo)
+    group = VirtualModel([first, second])
+
+    assert asyncio.run(group.generate("hi")) == "hi"
+    assert (first._model.calls, second._model.calls) == (1, 1)
+
+
+def test_raises_once_retry_budget_is_spent():
+    members = [make_member(f"m{i}", failing) for i in range(3)]
+    group = VirtualModel(
+        members, failover=FailoverPolicy(max_attempts=10, budget_ratio=0, budget_capacity=1)
+    )
+
+    with pytest.raises(InternalServerError):
+        asyncio.run(group.generate("hi"))
+    """The first attempt and the single retry of the budget"""
+    assert sum(m._model.calls for m in members) == 2
+
+
+def test_raises_after_max_attempts():
+    members = [make_member(f"m{i}", failing) for i in range(3)]
+    group = VirtualModel(members, failover=FailoverPolicy(max_attempts=3))
+
+    with pytest.raises(InternalServerError):
+        asyncio.run(group.generate("hi"))
+    assert [m._model.calls for m in members] == [1, 1, 1]
+
+
+def test_stream_failing_before_first_chunk_fails_over():
+    async def broken_stream(content):
+        async def chunks():
+            raise InternalServerError()
+            yield content
+
+        return chunks()
+
+    async def stream(content):
+        async def chunks():
+            for chunk in content:
+                yield chunk
+
+        return chunks()
+
+    first, second = make_member("first", broken_stream), make_member("second", stream)
+    group = VirtualModel([first, second])
+
+    async def main():
+        return [chunk async for chunk in await group.generate("abc")]
+
+    assert asyncio.run(main()) == ["a", "b", "c"]
+    assert (first._model.calls, second._model.calls) == (1, 1)
+    assert first.stats.inflight == second.stats.inflight == 0
+
+
+def test_hedge_fires_after_delay_and_cancels_loser():
+    async def slow(content):
+        await asyncio.sleep(10)
+        return "slow"
+
+    first, second = make_member("first", slow), make_member("second", echo)
+    first.stats._latencies.extend([0.01] * 5)
+    group = VirtualModel(
+        [first, second], hedging=HedgingPolicy(enabled=True, min_samples=5, min_delay=0.02)
+    )
+
+    async def main():
+        result = await asyncio.wait_for(group.generate("fast"), timeout=5)
+        await asyncio.sleep(0.01)
+        return result
+
+    assert asyncio.run(main()) == "fast"
+    assert (first._model.calls, second._model.calls) == (1, 1)
+    assert first._model.cancelled
+    assert first.stats.inflight == 0
+
+
+def test_no_hedge_without_latency_samples():
+    async def slow(content):
+        await asyncio.sleep(0.05)
+        return "slow"
+
+    first, second = make_member("first", slow), make_member("second", echo)
+    group = VirtualModel([first, second], hedging=HedgingPolicy(enabled=True))
+
+    assert asyncio.run(group.generate("fast")) == "slow"
+    assert second._model.calls == 0
@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+
+import vmc.models as api_module
+from vmc.proxy.model import ProxyModel, base_method
+from vmc.routes.wrapper import wrap_fastapi
+from vmc.types.errors import OverloadedError
+from vmc.types.model_config import AdmissionConfig, ModelConfig
+
+
+class Upstream:
+    """Stub of a VMC server client, `generate_openai` blocks until `release` is set"""
+
+    def __init__(self):
+        self.release = asyncio.Event()
+        self.calls = 0
+
+    async def generate_openai(self, content, **kwargs):
+        self.calls += 1
+        await self.release.wait()
+        return {"content": content}
+
+
+def make_forwarded(**admission) -> ProxyModel:
+    model = ProxyModel(
+        ModelConfig(
+            name="local",
+            model_class="Local",
+            is_local=True,
+            load_method="tf",
+            admission=AdmissionConfig(**admission),
+        )
+    )
+    model._model = Upstream()
+    model.health.mark_up()
+    return model
+
+
+def test_base_method():
+    assert base_method("_generate") == "generate"
+    assert base_method("generate_openai") == "generate"
+    assert base_method("embedding_openai") == "embedding"
+    assert base_method("tokenize") == "tokenize"
+
+
+def test_forwarded_openai_call_goes_through_admission():
+    model = make_forwarded(max_concurrency=1, max_queue=0)
+    assert wrap_fastapi(model) is model
+
+    async def main():
+        first = asyncio.create_task(model.generate_openai(content="hi"))
+        await asyncio.sleep(0.01)
+        assert model.admission.inflight == 1
+        assert model.stats.inflight == 1
+        with pytest.raises(OverloadedError) as e:
+            await model.generate_openai(content="hi")
+        model._model.release.set()
+        assert await first == {"content": "hi"}
+        return e.value
+
+    error = asyncio.run(main())
+    assert error.context["retry_after"] > 0
+    assert model._model.calls == 1
+    assert model.admission.inflight == 0
+    assert model.stats.inflight == 0
+    assert model.stats.requests == 1
+
+
+class Client:
+    """Stub of an API model, `generate` takes 10ms"""
+
+    instances: list["Client"] = []
+
+    def __init__(self, **kwargs):
+        self.closed = False
+        self.calls = 0
+        Client.instances.append(self)
+
+    async def generate(self, content, **kwargs):
+        assert not self.closed
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return content
+
+    async def close(self):
+        self.closed = True
+
+
+def test_reload_closes_old_client_under_constant_load(monkeypatch):
+    monkeypatch.setattr(api_module, "Client", Client, raising=False)
+    Client.instances.clear()
+    model = ProxyModel(ModelConfig(name="api", model_class="Client"))
+
+    async def traffic(stop: asyncio.Event):
+        while not stop.is_set():
+            assert await model.generate("hi") == "hi"
+
+    async def main():
+        stop = asyncio.Event()
+        workers = [asyncio.create_task(traffic(stop)) for _ in range(8)]
+        await asyncio.sleep(0.05)
+        for _ in range(3):
+            """Rotate, e.g. for new credentials, while calls keep coming"""
+            await model.load()
+            await asyncio.sleep(0.05)
+            assert model.stats.inflight > 0
+        closed = [client.closed for client in Client.instances]
+        stop.set()
+        await asyncio.gather(*workers)
+        return closed
+
+    assert asyncio.run(main()) == [True, True, True, False]
+    assert all(client.calls > 0 for client in Client.instances)
+    assert model._uses == {} and model._drained == {}
@@ -0,0 +1,82 @@
+import asyncio
+import time
+
+import pytest
+
+from vmc.utils.ratelimit import RateLimiter, TokenBucket
+
+
+def test_bucket_refills_up_to_capacity():
+    bucket = TokenBucket(capacity=10, rate=5)
+    bucket.consume(10)
+    assert bucket.delay(5) == pytest.approx(1)
+
+    bucket.refill(bucket._updated + 0.5)
+    assert bucket.level == pytest.approx(2.5)
+    assert bucket.delay(5) == pytest.approx(0.5)
+
+    bucket.refill(bucket._updated + 60)
+    assert bucket.level == 10
+    assert bucket.delay(5) == 0
+
+
+def test_oversized_request_waits_for_a_full_bucket():
+    bucket = TokenBucket(capacity=10, rate=10)
+    bucket.consume(4)
+    assert bucket.delay(100) == pytest.approx(0.4)
+    bucket.refill(bucket._updated + 0.4)
+    bucket.consume(100)
+    assert bucket.level == pytest.approx(-90)
+
+
+def test_acquire_waits_for_refill():
+    limiter = RateLimiter(requests=2, period=0.2)
+
+    async def main():
+        start = time.monotonic()
+        for _ in range(4):
+            await limiter.acquire()
+        return time.monotonic() - start
+
+    elapsed = asyncio.run(main())
+    """Two requests pass at once, the next two wait 0.1s each"""
+    assert 0.18 <= elapsed < 0.5
+    assert limiter.stats()["acquired"] == 4
+    assert limiter.stats()["max_wait"] > 0
+
+
+def test_acquire_limits_tokens():
+    limiter = RateLimiter(tpm=600)
+
+    async def main():
+        await limiter.acquire(600)
+        assert limiter.delay(5) > 0.4
+        start = time.monotonic()
+        await limiter.acquire(5)
+        return time.monotonic() - start
+
+    assert 0.4 <= asyncio.run(main()) < 1
+
+
+def test_cancelled_waiter_consumes_nothing():
+    limiter = RateLimiter(requests=1, period=10)
+
+    async def main():
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0.01)
+        assert limiter.queue_depth == 1
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert limiter.queue_depth == 0
+
+    asyncio.run(main())
+    assert limiter.stats()["acquired"] == 1
+    assert limiter.requests.level < 1
+
+
+def test_disabled_limiter_never_waits():
+    limiter = RateLimiter()
+    assert not limiter.enabled
+    asyncio.run(limiter.acquire(10**9))
+    assert limiter.delay(10**9) == 0
@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+from vmc.utils.singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_run():
+    flight = SingleFlight()
+    runs = 0
+
+    async def load():
+        nonlocal runs
+        runs += 1
+        await asyncio.sleep(0.01)
+        return runs
+
+    async def main():
+        return await asyncio.gather(*[flight.do("model", load) for _ in range(10)])
+
+    assert asyncio.run(main()) == [1] * 10
+    assert runs == 1
+
+
+def test_distinct_keys_run_separately():
+    flight = SingleFlight()
+
+    async def main():
+        return await asyncio.gather(
+            flight.do("a", lambda: asyncio.sleep(0.01, "a")),
+            flight.do("b", lambda: asyncio.sleep(0.01, "b")),
+        )
+
+    assert asyncio.run(main()) == ["a", "b"]
+
+
+def test_failure_is_cached_until_expiry():
+    flight = SingleFlight(negative_ttl=0.05)
+    runs = 0
+
+    async def load():
+        nonlocal runs
+        runs += 1
+        if runs == 1:
+            raise RuntimeError("load failed")
+        return "loaded"
+
+    async def main():
+        with pytest.raises(RuntimeError):
+            await flight.do("model", load)
+        with pytest.raises(RuntimeError):
+            await flight.do("model", load)
+        assert runs == 1
+        await asyncio.sleep(0.06)
+        return await flight.do("model", load)
+
+    assert asyncio.run(main()) == "loaded"
+    assert runs == 2
+
+
+def test_forget_drops_failure():
+    flight = SingleFlight(negative_ttl=60)
+
+    async def fail():
+        raise RuntimeError("load failed")
+
+    async def main():
+        with pytest.raises(RuntimeError):
+            await flight.do("model", fail)
+        flight.forget("model")
+        return await flight.do("model", lambda: asyncio.sleep(0, "loaded"))
+
+    assert asyncio.run(main()) == "loaded"
+
+
+def test_cancelled_caller_does_not_abort_others():
+    flight = SingleFlight()
+
+    async def main():
+        first = asyncio.create_task(flight.do("model", lambda: asyncio.sleep(0.02, "loaded")))
+        second = asyncio.create_task(flight.do("model", lambda: asyncio.sleep(0, "other")))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(main()) == "loaded"
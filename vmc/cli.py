@@ -24,10 +24,14 @@ def cli():
 @click.option("--type", default=None)
 @click.option("--host", default="localhost")
 @click.option("--port", default=8100)
+@click.option("--uds", default=None, help="Unix domain socket to bind instead of host and port")
 @click.option("--api-key", default=None)
 @click.option("--reload", is_flag=True)
 @click.option("--backend", default="torch")
 @click.option("--device-map-auto", is_flag=True)
+@click.option(
+    "--continuous-batching", is_flag=True, help="Batch concurrent generations of a tf chat model"
+)
 def serve(
     name: str,
     model_id: str,
@@ -36,9 +40,11 @@ def serve(
     backend: Literal["torch", "onnx", "openvino"],
     host: str,
     port: int,
+    uds: str | None,
     api_key: str,
     reload: bool,
     device_map_auto: bool,
+    continuous_batching: bool,
 ):
     from vmc.serve import SERVER_FAILED_MSG
 
@@ -52,6 +58,7 @@ def serve(
         os.environ["SERVE_TYPE"] = type
     os.environ["SERVE_BACKEND"] = backend
     os.environ["SERVE_DEVICE_MAP_AUTO"] = str(device_map_auto)
+    os.environ["SERVE_CONTINUOUS_BATCHING"] = str(continuous_batching)
 
     if api_key:
         os.environ["SERVE_API_KEY"] = api_key
@@ -60,16 +67,13 @@ def serve(
             "uvicorn",
             "vmc.serve.server:app",
             "--reload",
-            "--host",
-            host,
-            "--port",
-            str(port),
+            *(["--uds", uds] if uds else ["--host", host, "--port", str(port)]),
         ]
     else:
         cmd = [
             "gunicorn",
             "-b",
-            f"{host}:{port}",
+            f"unix:{uds}" if uds else f"{host}:{port}",
             "-k",
             "uvicorn.workers.UvicornWorker",
             "--log-level",
@@ -136,15 +140,16 @@ def start_server(port: int | None = None, reload: bool = False):
 @cli.command()
 @click.option("--host", default="localhost")
 @click.option("--port", default=8200)
+@click.option("--uds", default=None, help="Unix domain socket to bind instead of host and port")
 @click.option("--reload", is_flag=True)
-def manager(host: str, port: int, reload: bool):
+def manager(host: str, port: int, uds: str | None, reload: bool):
     import subprocess
 
     if not reload:
         command = [
             "gunicorn",
             "-b",
-            f"{host}:{port}",
+            f"unix:{uds}" if uds else f"{host}:{port}",
             "-k",
             "uvicorn.workers.UvicornWorker",
             "--log-level",
@@ -157,10 +162,7 @@ def manager(host: str, port: int, reload: bool):
         command = [
             "uvicorn",
             "vmc.serve.manager.server:app",
-            "--host",
-            host,
-            "--port",
-            str(port),
+            *(["--uds", uds] if uds else ["--host", host, "--port", str(port)]),
             "--reload",
         ]
     try:
@@ -3,3 +3,9 @@ from contextvars import ContextVar
 from fastapi import Request
 
 request: ContextVar[Request] = ContextVar("request", default=None)
+
+
+async def bind_request(req: Request):
+    """App dependency making the request of a route available to the models, e.g. to the `VMC`
+    forwarder. Its body is read only if the route parses it."""
+    request.set(req)
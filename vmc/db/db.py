@@ -1,3 +1,4 @@
+import os
 from typing import Any, List, Type, TypeVar, Union
 
 from pydantic import BaseModel
@@ -8,6 +9,7 @@ from vmc.types.generation import Generation as GenerationType
 from vmc.types.generation import GenerationChunk
 from vmc.types.generation.message_params import GenerationMessageParam
 from vmc.utils import sha256
+from vmc.utils.cache import TTLCache
 
 ItemT = TypeVar(
     "ResponseT",
@@ -39,28 +41,51 @@ def deserialize(value: ItemT, cast_to: Type[ItemT]) -> ItemT:
 
 
 class UserOpMixin:
+    _token_cache: TTLCache[str, User] | None = None
+
+    @property
+    def token_cache(self) -> TTLCache[str, User]:
+        """Users of recently authenticated tokens, keyed by the token hash. Entries are kept
+        `VMC_AUTH_CACHE_TTL` seconds (0 disables the cache) and invalidated when the user is added
+        or deleted through this process."""
+        if self._token_cache is None:
+            self._token_cache = TTLCache(
+                "auth",
+                maxsize=int(os.getenv("VMC_AUTH_CACHE_SIZE", 10000)),
+                ttl=float(os.getenv("VMC_AUTH_CACHE_TTL", 60)),
+            )
+        return self._token_cache
+
     async def get_user(self, key: str) -> User:
         return await self.get_by_id("users", key, User)
 
     async def get_user_by_token(self, token: str) -> User:
         if token.startswith("Bearer "):
             token = token[7:]
+        """Cache by the hash of the token, which carries the password in clear"""
+        key = sha256(token)
+        user = self.token_cache.get(key)
+        if user is not None:
+            return user
         username, password = token.split(":", 1)
         if not username or not password:
             return None
 
         user = await self.get_user(username)
         if user and user.password == sha256(password):
+            self.token_cache.set(key, user)
             return user
         return None
 
     async def add_user(self, username: str, password: str, role: Literal["admin", "user"]) -> User:
         user = User(id=username, username=username, password=sha256(password), role=role)
         await self.insert("users", user)
+        self.token_cache.invalidate(lambda _, cached: cached.id == user.id)
         return user
 
     async def delete_user(self, key: str):
         await self.delete_by_id("users", key)
+        self.token_cache.invalidate(lambda _, cached: cached.id == key)
 
 
 class GenerationOpMixin:
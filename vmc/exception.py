@@ -1,5 +1,10 @@
+import asyncio
+import email.utils
+import time
 import traceback
+from typing import Literal
 
+import httpx
 import openai
 import zhipuai
 from loguru import logger
@@ -25,10 +30,56 @@ async def exception_handler(exc: Exception):
     tb = traceback.format_exc()
     await callback.on_exception(None, exc, tb=tb)
     if isinstance(exc, err.VMCException):
-        return ErrorMessage(status_code=exc.code, code=exc.vmc_code, msg=exc.msg)
+        return ErrorMessage(
+            status_code=exc.code, code=exc.vmc_code, msg=exc.msg, retry_after=retry_after(exc)
+        )
     if exc.__class__ in __exception_map:
         code, vmc_code = __exception_map[exc.__class__]
-        return ErrorMessage(status_code=code, code=vmc_code, msg=str(exc))
+        return ErrorMessage(
+            status_code=code, code=vmc_code, msg=str(exc), retry_after=retry_after(exc)
+        )
     code, vmc_code = s.INTERNAL_ERROR, v.INTERNAL_ERROR
     logger.exception(exc)
     return ErrorMessage(status_code=code, code=vmc_code, msg=str(exc) + "\n" + tb)
+
+
+ErrorClass = Literal["rate_limit", "timeout", "connection", "server", "client", "other"]
+
+
+def classify(exc: BaseException) -> ErrorClass:
+    """Coarse class of an upstream error, used to decide whether another attempt can help."""
+    if isinstance(exc, (openai.RateLimitError, err.RateLimitError)):
+        return "rate_limit"
+    if isinstance(
+        exc,
+        (openai.APITimeoutError, err.APITimeoutError, httpx.TimeoutException, asyncio.TimeoutError),
+    ):
+        return "timeout"
+    if isinstance(exc, (openai.APIConnectionError, err.APIConnectionError, httpx.TransportError)):
+        return "connection"
+    if isinstance(exc, openai.APIStatusError):
+        return "server" if exc.status_code >= 500 else "client"
+    if isinstance(exc, err.VMCException):
+        if exc.vmc_code in (v.API_RATE_LIMIT, v.OVERLOADED):
+            return "rate_limit"
+        return "server" if exc.code >= 500 else "client"
+    return "other"
+
+
+def retry_after(exc: BaseException) -> float | None:
+    """Seconds from the `Retry-After` header of the response attached to `exc`, if any."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    value = headers.get("retry-after") if headers is not None else None
+    if value is None and hasattr(exc, "context"):
+        value = exc.context.get("retry_after")
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0)
+    except (TypeError, ValueError):
+        pass
+    try:
+        return max(email.utils.parsedate_to_datetime(value).timestamp() - time.time(), 0)
+    except (TypeError, ValueError):
+        return None
@@ -3,11 +3,16 @@ import random
 
 from vmc.types.model_config import ModelConfig
 
+from .credentials import Credential, CredentialPool
+
 
 class BaseModel:
     """Base model for actual models.
     Functions starting with `_` are meant to be used by the vmc itself."""
 
+    credential_aliases: dict[str, str] = {}
+    """Credential keys renamed to client options, e.g. `OPENAI_API_KEY` to `api_key`"""
+
     def __init__(
         self,
         config: ModelConfig,
@@ -20,31 +25,58 @@ class BaseModel:
             model_id (str): Model ID, in the form of `domain/model_name`
             config (ModelConfig): Configuration for the model
             credentials (list[dict] | None, optional): Credentials for the model. Usually contains API keys and Hosts.
-                If the value is `.env.vmc/xxx`, it will be replaced with the actual value from the environment variable.. Defaults to None.
+                If the value is `.env.vmc/xxx`, it will be replaced with the actual value from the environment variable. Defaults to None.
             callbacks (list[Callback], optional): Callbacks. Defaults to [].
         """
         self.config = config
         self.model_id = model_id or config.name
         self.pricing = config.pricing
         self.credentials = credentials
+        self.credential_pool = CredentialPool(
+            self.model_id,
+            credentials,
+            config.circuit_breaker,
+            resolve=self._resolve_credential,
+            admission=config.admission,
+        )
 
-    def _choose_credential(self):
+    def _choose_credential(self) -> Credential | None:
+        """A credential for calls that are not scheduled, e.g. tokenization."""
         if self.credentials:
-            return random.choice(self.credentials)
+            return self.credential_pool.pick() or random.choice(self.credential_pool.credentials)
         return None
 
-    def set_credential(self):
-        if self.credentials:
-            credential = self._choose_credential()
-            ret = {}
-            for k, v in credential.items():
-                if v.startswith(".env.vmc/"):
-                    os.environ[k] = os.getenv(v[9:])
-                else:
-                    ret[k] = v
-            self.validate_credential(ret)
-            return ret
-        return {}
+    def _use_credential(self, tokens: int = 0):
+        """Context manager holding a credential for one upstream call, see `CredentialPool.use`."""
+        return self.credential_pool.use(tokens)
+
+    def _resolve_credential(self, credential: dict[str, str]) -> dict[str, str]:
+        """Client options of a credential entry.
+
+        A value `.env.vmc/NAME` is read from the environment variable `NAME`, and keys named after
+        the provider's environment variables are renamed by `credential_aliases`. The process
+        environment is never modified.
+        """
+        ret = {}
+        for k, v in credential.items():
+            if not isinstance(v, str):
+                """Not a client option, e.g. `rate_limit`"""
+                continue
+            if v.startswith(".env.vmc/"):
+                v = os.getenv(v[9:])
+                if v is None:
+                    continue
+            ret[self.credential_aliases.get(k, k)] = v
+        self.validate_credential(ret)
+        return ret
+
+    def set_credential(self) -> dict[str, str]:
+        credential = self._choose_credential()
+        return credential.options if credential else {}
+
+    async def close(self):
+        """Release long-lived resources such as connection pools."""
+        pass
 
     def validate_credential(self, credential: dict[str, str]):
         return True
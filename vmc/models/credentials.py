@@ -0,0 +1,231 @@
+import asyncio
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Callable
+
+from vmc.exception import classify, retry_after
+from vmc.types.errors import CircuitOpenError, OverloadedError, RateLimitError
+from vmc.types.model_config import AdmissionConfig, CircuitBreakerConfig, RateLimitConfig
+from vmc.utils.circuit import CircuitBreaker
+from vmc.utils.concurrency import AdaptiveLimit
+from vmc.utils.metrics import metrics
+from vmc.utils.ratelimit import RateLimiter
+
+
+class Credential:
+    """A credential entry of a provider, with its own budgets, circuit breaker, adaptive
+    concurrency limit and cooldown.
+
+    `values` is the entry as configured and `options` the client options resolved from it once,
+    when the model is loaded. The `rate_limit`, `circuit_breaker` and `admission` mappings are
+    read here and are not client options.
+    """
+
+    def __init__(
+        self,
+        index: int,
+        name: str,
+        values: dict,
+        options: dict[str, str],
+        circuit_breaker: CircuitBreakerConfig,
+        admission: AdmissionConfig | None = None,
+    ):
+        self.index = index
+        self.name = name
+        self.values = values
+        self.options = options
+        self.limiter = (
+            RateLimiter(**RateLimitConfig(**values["rate_limit"]).model_dump())
+            if values.get("rate_limit")
+            else None
+        )
+        self.breaker = CircuitBreaker(
+            name,
+            CircuitBreakerConfig(**values["circuit_breaker"])
+            if values.get("circuit_breaker")
+            else circuit_breaker,
+        )
+        self.concurrency = AdaptiveLimit.from_config(
+            name,
+            AdmissionConfig(**values["admission"])
+            if values.get("admission")
+            else admission or AdmissionConfig(),
+        )
+        self.cooldown_until = 0.0
+        self.inflight = 0
+
+    def cooldown(self) -> float:
+        """Seconds left of the cooldown after a rate limit error."""
+        return max(self.cooldown_until - time.monotonic(), 0.0)
+
+    @property
+    def available(self) -> bool:
+        return self.cooldown() == 0 and self.breaker.available
+
+    def headroom(self, tokens: int = 0) -> float:
+        return self.limiter.headroom(tokens) if self.limiter is not None else 1.0
+
+    @property
+    def saturated(self) -> bool:
+        """Whether the calls in flight reached the adaptive concurrency limit."""
+        return self.concurrency is not None and self.inflight >= int(self.concurrency)
+
+    def dump(self) -> dict:
+        return {
+            "circuit": self.breaker.dump(),
+            "cooldown": self.cooldown(),
+            "inflight": self.inflight,
+            "headroom": self.headroom(),
+            "concurrency": self.concurrency.dump() if self.concurrency is not None else None,
+            "ratelimit": self.limiter.stats() if self.limiter is not None else None,
+        }
+
+
+class CredentialPool:
+    """Schedules the calls of a model over its credentials.
+
+    Every call goes to the available credential below its adaptive concurrency limit, with the
+    most headroom in its request and token budgets, then the fewest calls in flight, ties broken
+    at random. When every credential is at its limit the call waits for a call to end, up to
+    the `max_queue_time` of the model's admission config, then fails with `OverloadedError`.
+    A credential answered with a rate limit error rests for the provider's `Retry-After`, or
+    `default_cooldown` seconds, and a credential whose circuit breaker is open is skipped until
+    it half-opens.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        credentials: list[dict] | None = None,
+        circuit_breaker: CircuitBreakerConfig | None = None,
+        resolve: Callable[[dict], dict[str, str]] | None = None,
+        default_cooldown: float = 1.0,
+        admission: AdmissionConfig | None = None,
+    ):
+        self.name = name
+        self.default_cooldown = default_cooldown
+        self.max_queue_time = (admission or AdmissionConfig()).max_queue_time
+        self._waiters: list[asyncio.Future] = []
+        resolve = resolve or (
+            lambda values: {k: v for k, v in values.items() if isinstance(v, str)}
+        )
+        self.credentials = [
+            Credential(
+                i,
+                f"{name} credential {i}",
+                values,
+                resolve(values),
+                circuit_breaker or CircuitBreakerConfig(),
+                admission,
+            )
+            for i, values in enumerate(credentials or [])
+        ]
+
+    def __len__(self):
+        return len(self.credentials)
+
+    def pick(self, tokens: int = 0) -> Credential | None:
+        """The best available credential for a call of `tokens`, None if none is available."""
+        candidates = [c for c in self.credentials if c.available]
+        if not candidates:
+            return None
+        random.shuffle(candidates)
+        return min(
+            candidates,
+            key=lambda c: (
+                c.saturated,
+                c.limiter.queue_depth if c.limiter is not None else 0,
+                -c.headroom(tokens),
+                c.inflight,
+            ),
+        )
+
+    def _unavailable(self) -> Exception:
+        cooldowns = [c.cooldown() for c in self.credentials if c.cooldown() > 0]
+        if cooldowns:
+            return RateLimitError(
+                msg=f"Every credential of {self.name} is rate limited", retry_after=min(cooldowns)
+            )
+        return CircuitOpenError(
+            msg=f"Every credential of {self.name} is failing",
+            retry_after=min(c.breaker.retry_after() for c in self.credentials),
+        )
+
+    def _wake(self):
+        """Let the waiting calls pick again, a slot freed up or a limit grew."""
+        for waiter in self._waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+        self._waiters.clear()
+
+    async def _acquire(self, tokens: int = 0) -> Credential:
+        """The best available credential below its adaptive limit, waiting for one."""
+        deadline = time.monotonic() + self.max_queue_time
+        while True:
+            credential = self.pick(tokens)
+            if credential is None:
+                raise self._unavailable()
+            if not credential.saturated:
+                return credential
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise OverloadedError(
+                    msg=f"Every credential of {self.name} is at its concurrency limit",
+                    retry_after=credential.concurrency.baseline or 1.0,
+                )
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await asyncio.wait_for(waiter, remaining)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+
+    def record(self, credential: Credential, error: BaseException | None, duration: float):
+        if error is not None and classify(error) == "rate_limit":
+            delay = retry_after(error)
+            credential.cooldown_until = time.monotonic() + (
+                self.default_cooldown if delay is None else delay
+            )
+            metrics.counter("credential_cooldowns_total").inc()
+        credential.breaker.record(error, duration)
+        if credential.concurrency is not None:
+            credential.concurrency.record(error, duration, credential.inflight)
+
+    @asynccontextmanager
+    async def use(self, tokens: int = 0):
+        """Hold a credential for one upstream call and record its outcome.
+
+        Yields the `Credential`, or None for models without credentials. Raises
+        `RateLimitError` or `CircuitOpenError`, with a `retry_after`, when no credential is
+        available, and `OverloadedError` when none got below its adaptive limit in time.
+        """
+        if not self.credentials:
+            yield None
+            return
+        credential = await self._acquire(tokens)
+        if not credential.breaker.allow():
+            raise CircuitOpenError(
+                msg=f"{credential.name} is failing", retry_after=credential.breaker.retry_after()
+            )
+        started = time.monotonic()
+        credential.inflight += 1
+        try:
+            if credential.limiter is not None:
+                await credential.limiter.acquire(tokens)
+            started = time.monotonic()
+            yield credential
+        except BaseException as e:
+            self.record(credential, e, time.monotonic() - started)
+            raise
+        else:
+            self.record(credential, None, time.monotonic() - started)
+        finally:
+            credential.inflight -= 1
+            self._wake()
+
+    def dump(self) -> list[dict]:
+        return [credential.dump() for credential in self.credentials]
@@ -1,6 +1,6 @@
+import functools
 import os
 import time
-from contextlib import nullcontext
 from typing import (
     AsyncGenerator,
     Iterable,
@@ -11,12 +11,19 @@ from typing import (
 
 import google.generativeai as genai
 import httpx
+from google.ai import generativelanguage as glm
+from google.ai.generativelanguage_v1beta.services.generative_service.transports.grpc_asyncio import (
+    GenerativeServiceGrpcAsyncIOTransport,
+)
+from google.generativeai.types import content_types, generation_types
 from google.generativeai.types.content_types import ContentsType
 from google.generativeai.types.generation_types import GenerationConfigType
 from loguru import logger
 
+from vmc.models.credentials import Credential
 from vmc.models.embedding import BaseEmbeddingModel
 from vmc.models.generation import BaseGenerationModel
+from vmc.models.utils import estimate_tokens
 from vmc.types import NOT_GIVEN, NotGiven
 from vmc.types.embedding import EmbeddingResponse
 from vmc.types.errors.errors import BadParamsError
@@ -26,7 +33,7 @@ from vmc.types.generation.generation_params import ResponseFormat
 from vmc.types.generation.message_params import GenerationMessageParam
 from vmc.types.generation.tokenize import TokenizeOutput
 from vmc.types.generation.tool_param import ChatCompletionToolParam
-from vmc.utils.proxy import use_proxy
+from vmc.utils.proxy import get_proxy
 
 from .response_adapter import adapt_generation, adapt_generation_chunk, gen_generation_id
 
@@ -35,11 +42,20 @@ def filter_notgiven(**kwargs):
     return {k: v for k, v in kwargs.items() if v is not NOT_GIVEN}
 
 
+def _proxied_channel(proxy: str, *args, options=(), **kwargs):
+    return GenerativeServiceGrpcAsyncIOTransport.create_channel(
+        *args, options=[*options, ("grpc.http_proxy", proxy)], **kwargs
+    )
+
+
 class Gemini(BaseGenerationModel, BaseEmbeddingModel):
+    credential_aliases = {"GOOGLE_API_KEY": "api_key", "GEMINI_API_KEY": "api_key"}
+
     def __init__(self, max_retries: int = 3, use_proxy: bool = False, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.max_retries = max_retries
-        self.use_proxy = use_proxy
+        self.proxy = get_proxy() if use_proxy else None
+        self._clients: dict[int | None, glm.GenerativeServiceAsyncClient] = {}
 
     def validate_credential(self, credential: dict[str, str]):
         assert "api_key" in credential or os.environ.get(
@@ -48,9 +64,48 @@ class Gemini(BaseGenerationModel, BaseEmbeddingModel):
         return True
 
     @property
-    def client(self):
-        genai.configure(**self.set_credential())
-        return genai.GenerativeModel(self.model_id)
+    def client(self) -> glm.GenerativeServiceAsyncClient:
+        return self._client_for(self._choose_credential())
+
+    @property
+    def model_name(self) -> str:
+        return self.model_id if "/" in self.model_id else f"models/{self.model_id}"
+
+    def _client_for(self, credential: Credential | None) -> glm.GenerativeServiceAsyncClient:
+        """The async client of a credential, created once with its api key and proxy.
+
+        Clients are not taken from `genai.configure`, which is process-wide, so concurrent
+        requests with different keys and proxies do not interfere.
+        """
+        key = credential.index if credential else None
+        if key not in self._clients:
+            options = credential.options if credential else {}
+            proxy = options.get("proxy") or self.proxy
+            transport = "grpc_asyncio"
+            if proxy:
+                transport = functools.partial(
+                    GenerativeServiceGrpcAsyncIOTransport,
+                    channel=functools.partial(_proxied_channel, proxy),
+                )
+            self._clients[key] = glm.GenerativeServiceAsyncClient(
+                client_options={"api_key": options.get("api_key") or os.getenv("GOOGLE_API_KEY")},
+                transport=transport,
+            )
+        return self._clients[key]
+
+    def _request(
+        self, contents: ContentsType, generation_config: GenerationConfigType
+    ) -> glm.GenerateContentRequest:
+        return glm.GenerateContentRequest(
+            model=self.model_name,
+            contents=content_types.to_contents(contents),
+            generation_config=generation_types.to_generation_config_dict(generation_config),
+        )
+
+    async def close(self):
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            await client.transport.close()
 
     def prepare_contents(
         self,
@@ -135,15 +190,12 @@ class Gemini(BaseGenerationModel, BaseEmbeddingModel):
         )
 
         created = time.time()
-        context = nullcontext() if not self.use_proxy else use_proxy()
-        with context:
-            res = await self.client.generate_content_async(
-                contents=self.prepare_contents(content, tools),
-                generation_config=generation_config,
-                request_options={"timeout": timeout},
-            )
+        request = self._request(self.prepare_contents(content, tools), generation_config)
+        tokens = estimate_tokens(content, max_tokens=max_tokens)
+        async with self._use_credential(tokens) as credential:
+            res = await self._client_for(credential).generate_content(request, timeout=timeout)
         return adapt_generation(
-            res,
+            generation_types.AsyncGenerateContentResponse.from_response(res),
             model=self.model_id,
             pricing=self.pricing,
             created=created,
@@ -180,23 +232,24 @@ class Gemini(BaseGenerationModel, BaseEmbeddingModel):
         )
 
         created = time.time()
-        context = nullcontext() if not self.use_proxy else use_proxy()
         gid = gen_generation_id()
-        with context:
-            async for chunk in await self.client.generate_content_async(
-                contents=self.prepare_contents(content, tools),
-                generation_config=generation_config,
-                request_options={"timeout": timeout},
-                stream=stream,
-            ):
-                yield adapt_generation_chunk(
-                    chunk,
-                    id=gid,
-                    model=self.model_id,
-                    pricing=self.pricing,
-                    created=created,
-                    return_raw_response=return_original_response,
+        request = self._request(self.prepare_contents(content, tools), generation_config)
+        tokens = estimate_tokens(content, max_tokens=max_tokens)
+        async with self._use_credential(tokens) as credential:
+            with generation_types.rewrite_stream_error():
+                iterator = await self._client_for(credential).stream_generate_content(
+                    request, timeout=timeout
                 )
+            response = await generation_types.AsyncGenerateContentResponse.from_aiterator(iterator)
+        async for chunk in response:
+            yield adapt_generation_chunk(
+                chunk,
+                id=gid,
+                model=self.model_id,
+                pricing=self.pricing,
+                created=created,
+                return_raw_response=return_original_response,
+            )
 
     async def tokenize(
         self,
@@ -205,7 +258,12 @@ class Gemini(BaseGenerationModel, BaseEmbeddingModel):
     ) -> TokenizeOutput:
         if kwargs:
             logger.warning(f"{self.model_id} Unused parameters: {kwargs}")
-        res = await self.client.count_tokens_async(contents=self.prepare_contents(content, []))
+        res = await self.client.count_tokens(
+            glm.CountTokensRequest(
+                model=self.model_name,
+                contents=content_types.to_contents(self.prepare_contents(content, [])),
+            )
+        )
         return TokenizeOutput(tokens=[], length=res.total_tokens)
 
     async def embedding(
@@ -220,16 +278,17 @@ class Gemini(BaseGenerationModel, BaseEmbeddingModel):
         if kwargs:
             logger.warning(f"{self.model_id} Unused parameters: {kwargs}")
         created = time.time()
-        genai.configure(**self.set_credential())
-        res = await genai.embed_content_async(
-            model=self.model_id,
-            content=content,
-            **filter_notgiven(
-                task_type=task_type,
-                title=title,
-                output_dimensionality=dimensions,
-            ),
-        )
+        async with self._use_credential(estimate_tokens(content)) as credential:
+            res = await genai.embed_content_async(
+                model=self.model_id,
+                content=content,
+                client=self._client_for(credential),
+                **filter_notgiven(
+                    task_type=task_type,
+                    title=title,
+                    output_dimensionality=dimensions,
+                ),
+            )
         return EmbeddingResponse(
             created=created,
             embed_time=time.time() - created,
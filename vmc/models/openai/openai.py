@@ -15,7 +15,7 @@ from typing import (
 import httpx
 import tiktoken
 from loguru import logger
-from openai import AsyncAzureOpenAI, AsyncOpenAI
+from openai import AsyncAzureOpenAI, AsyncOpenAI, DefaultAsyncHttpxClient
 from openai._types import Body, Headers, Query
 from openai.types.chat import completion_create_params
 from openai.types.chat.chat_completion_message_param import ChatCompletionMessageParam
@@ -26,13 +26,16 @@ from openai.types.chat.chat_completion_tool_choice_option_param import (
 from openai.types.chat.chat_completion_tool_param import ChatCompletionToolParam
 from openai.types.chat_model import ChatModel
 
+from vmc.models.credentials import Credential
 from vmc.models.embedding import BaseEmbeddingModel
 from vmc.models.generation import BaseGenerationModel
+from vmc.models.utils import estimate_tokens
 from vmc.types import NOT_GIVEN, NotGiven
 from vmc.types.embedding import EmbeddingResponse
 from vmc.types.errors.errors import ModelNotFoundError
 from vmc.types.generation import Generation, GenerationChunk, TokenizeOutput
 from vmc.types.generation.message_params import GenerationMessageParam
+from vmc.utils.proxy import get_proxy
 
 from .response_adapter import adapt_completion, adapt_completion_chunk, adapt_embedding
 
@@ -61,6 +64,9 @@ class OpenAIConfig:
     top_p: Optional[float] | None = None
     user: str | None = None
     timeout: httpx.Timeout = httpx.Timeout(timeout=600.0, connect=30.0)
+    max_connections: int = 1000
+    max_keepalive_connections: int = 100
+    keepalive_expiry: float = 60.0
 
 
 def filter_notgiven(**kwargs):
@@ -68,18 +74,30 @@ def filter_notgiven(**kwargs):
 
 
 class OpenAI(BaseGenerationModel, BaseEmbeddingModel):
+    credential_aliases = {"OPENAI_API_KEY": "api_key", "OPENAI_BASE_URL": "base_url"}
+
     def __init__(
         self,
         max_retries: int | None = None,
         timeout: httpx.Timeout | None = None,
         use_proxy: bool = False,
+        max_connections: int | None = None,
+        max_keepalive_connections: int | None = None,
+        keepalive_expiry: float | None = None,
         *args,
         **kwargs,
     ):
         super().__init__(*args, **kwargs)
         self.max_retries = max_retries or OpenAIConfig.max_retries
         self.timeout = timeout or OpenAIConfig.timeout
-        self.use_proxy = use_proxy
+        self.proxy = get_proxy() if use_proxy else None
+        self.limits = httpx.Limits(
+            max_connections=max_connections or OpenAIConfig.max_connections,
+            max_keepalive_connections=max_keepalive_connections
+            or OpenAIConfig.max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry or OpenAIConfig.keepalive_expiry,
+        )
+        self._clients: dict[int | None, AsyncOpenAI | AsyncAzureOpenAI] = {}
 
     def validate_credential(self, credential: dict[str, str]):
         assert (
@@ -128,51 +146,65 @@ class OpenAI(BaseGenerationModel, BaseEmbeddingModel):
         if kwargs:
             logger.warning(f"{self.model_id} Unused arguments: {kwargs}")
         created = time.time()
-        completion = await self.client.chat.completions.create(
-            **filter_notgiven(
-                messages=self.prepare_content(content),
-                model=self.model_id,
-                frequency_penalty=frequency_penalty,
-                logit_bias=logit_bias,
-                logprobs=logprobs,
-                max_completion_tokens=max_completion_tokens,
-                max_tokens=max_tokens,
-                metadata=metadata,
-                n=n,
-                parallel_tool_calls=parallel_tool_calls,
-                presence_penalty=presence_penalty,
-                response_format=response_format,
-                seed=seed,
-                service_tier=service_tier,
-                stop=stop,
-                store=store,
-                temperature=temperature,
-                tool_choice=tool_choice,
-                tools=tools,
-                top_logprobs=top_logprobs,
-                top_p=top_p,
-                user=user,
-                extra_headers=extra_headers,
-                extra_query=extra_query,
-                extra_body=extra_body,
-                timeout=timeout,
+        async with self._use_credential(
+            estimate_tokens(
+                content, max_tokens=max_tokens, max_completion_tokens=max_completion_tokens
+            )
+        ) as credential:
+            completion = await self._client_for(credential).chat.completions.create(
+                **filter_notgiven(
+                    messages=self.prepare_content(content),
+                    model=self.model_id,
+                    frequency_penalty=frequency_penalty,
+                    logit_bias=logit_bias,
+                    logprobs=logprobs,
+                    max_completion_tokens=max_completion_tokens,
+                    max_tokens=max_tokens,
+                    metadata=metadata,
+                    n=n,
+                    parallel_tool_calls=parallel_tool_calls,
+                    presence_penalty=presence_penalty,
+                    response_format=response_format,
+                    seed=seed,
+                    service_tier=service_tier,
+                    stop=stop,
+                    store=store,
+                    temperature=temperature,
+                    tool_choice=tool_choice,
+                    tools=tools,
+                    top_logprobs=top_logprobs,
+                    top_p=top_p,
+                    user=user,
+                    extra_headers=extra_headers,
+                    extra_query=extra_query,
+                    extra_body=extra_body,
+                    timeout=timeout,
+                )
             )
-        )
         return adapt_completion(
             completion, self.pricing, created=created, return_original=return_original_response
         )
 
     @property
-    def client(self):
-        credential = self.set_credential()
-        httpx_client = None
-        if self.use_proxy and os.getenv("_HTTP_PROXY", None) and os.getenv("_HTTPS_PROXY", None):
-            httpx_client = httpx.AsyncClient(
-                proxies={
-                    "http_proxy://": os.getenv("_HTTP_PROXY", None),
-                    "https_proxy://": os.getenv("_HTTPS_PROXY", None),
-                }
-            )
+    def client(self) -> AsyncOpenAI | AsyncAzureOpenAI:
+        """An upstream client for one of the credentials.
+
+        Clients are cached per credential, so every request made with the same api key, endpoint
+        and proxy reuses the same connection pool instead of paying TCP and TLS setup again.
+        """
+        return self._client_for(self._choose_credential())
+
+    def _client_for(self, credential: Credential | None) -> AsyncOpenAI | AsyncAzureOpenAI:
+        key = credential.index if credential else None
+        if key not in self._clients:
+            self._clients[key] = self._build_client(credential.options if credential else {})
+        return self._clients[key]
+
+    def _build_client(self, credential: dict[str, str]) -> AsyncOpenAI | AsyncAzureOpenAI:
+        """A client with its own connection pool, through the credential's `proxy` if any."""
+        http_client = DefaultAsyncHttpxClient(
+            limits=self.limits, timeout=self.timeout, proxy=credential.get("proxy") or self.proxy
+        )
         client_type = credential.get("client_type", "openai")
         if client_type == "openai":
             return AsyncOpenAI(
@@ -180,7 +212,7 @@ class OpenAI(BaseGenerationModel, BaseEmbeddingModel):
                 base_url=credential.get("base_url"),
                 max_retries=self.max_retries,
                 timeout=self.timeout,
-                http_client=httpx_client,
+                http_client=http_client,
             )
         elif client_type == "azure":
             return AsyncAzureOpenAI(
@@ -191,11 +223,16 @@ class OpenAI(BaseGenerationModel, BaseEmbeddingModel):
                 organization=credential.get("organization"),
                 max_retries=self.max_retries,
                 timeout=self.timeout,
-                http_client=httpx_client,
+                http_client=http_client,
             )
         else:
             raise ValueError(f"Invalid client type: {client_type}")
 
+    async def close(self):
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            await client.close()
+
     async def tokenize(
         self,
         content: Union[str, Iterable[GenerationMessageParam], Iterable[str]],
@@ -262,38 +299,45 @@ class OpenAI(BaseGenerationModel, BaseEmbeddingModel):
         created = time.time()
         first_chunk = None
         last_chunk = None
-        async for chunk in await self.client.chat.completions.create(
-            **filter_notgiven(
-                messages=self.prepare_content(content),
-                model=self.model_id,
-                frequency_penalty=frequency_penalty,
-                logit_bias=logit_bias,
-                logprobs=logprobs,
-                max_completion_tokens=max_completion_tokens,
-                max_tokens=max_tokens,
-                metadata=metadata,
-                n=n,
-                parallel_tool_calls=parallel_tool_calls,
-                presence_penalty=presence_penalty,
-                response_format=response_format,
-                seed=seed,
-                service_tier=service_tier,
-                stop=stop,
-                store=store,
-                stream=True,
-                stream_options={"include_usage": True},
-                temperature=temperature,
-                tool_choice=tool_choice,
-                tools=tools,
-                top_logprobs=top_logprobs,
-                top_p=top_p,
-                user=user,
-                extra_headers=extra_headers,
-                extra_query=extra_query,
-                extra_body=extra_body,
-                timeout=timeout,
+        async with self._use_credential(
+            estimate_tokens(
+                content, max_tokens=max_tokens, max_completion_tokens=max_completion_tokens
             )
-        ):
+        ) as credential:
+            """Only the request counts for the credential, not the time spent streaming"""
+            response = await self._client_for(credential).chat.completions.create(
+                **filter_notgiven(
+                    messages=self.prepare_content(content),
+                    model=self.model_id,
+                    frequency_penalty=frequency_penalty,
+                    logit_bias=logit_bias,
+                    logprobs=logprobs,
+                    max_completion_tokens=max_completion_tokens,
+                    max_tokens=max_tokens,
+                    metadata=metadata,
+                    n=n,
+                    parallel_tool_calls=parallel_tool_calls,
+                    presence_penalty=presence_penalty,
+                    response_format=response_format,
+                    seed=seed,
+                    service_tier=service_tier,
+                    stop=stop,
+                    store=store,
+                    stream=True,
+                    stream_options={"include_usage": True},
+                    temperature=temperature,
+                    tool_choice=tool_choice,
+                    tools=tools,
+                    top_logprobs=top_logprobs,
+                    top_p=top_p,
+                    user=user,
+                    extra_headers=extra_headers,
+                    extra_query=extra_query,
+                    extra_body=extra_body,
+                    timeout=timeout,
+                )
+            )
+        async for chunk in response:
             if not first_chunk:
                 first_chunk = chunk
                 last_chunk = chunk
@@ -336,19 +380,20 @@ class OpenAI(BaseGenerationModel, BaseEmbeddingModel):
             logger.warning(f"{self.model_id} Unused arguments: {kwargs}")
         assert not return_spase_embedding, "Sparse embeddings are not supported"
         created = time.time()
-        embedding = await self.client.embeddings.create(
-            input=content,
-            **filter_notgiven(
-                model=self.model_id,
-                dimensions=dimensions,
-                encoding_format=encoding_format,
-                user=user,
-                extra_headers=extra_headers,
-                extra_query=extra_query,
-                extra_body=extra_body,
-                timeout=timeout,
-            ),
-        )
+        async with self._use_credential(estimate_tokens(content)) as credential:
+            embedding = await self._client_for(credential).embeddings.create(
+                input=content,
+                **filter_notgiven(
+                    model=self.model_id,
+                    dimensions=dimensions,
+                    encoding_format=encoding_format,
+                    user=user,
+                    extra_headers=extra_headers,
+                    extra_query=extra_query,
+                    extra_body=extra_body,
+                    timeout=timeout,
+                ),
+            )
         return adapt_embedding(
             embedding,
             pricing=self.pricing,
@@ -3,17 +3,50 @@ from typing import Iterable, List, Union
 
 from loguru import logger
 
+from vmc.models.credentials import Credential
 from vmc.models.embedding import BaseEmbeddingModel
 from vmc.models.rerank import BaseRerankModel
+from vmc.models.utils import estimate_tokens
 from vmc.types.embedding import EmbeddingResponse
 from vmc.types.rerank import RerankOutput
 from vmc.utils.api_client import AsyncAPIClient
 
 
 class TeiEmbedding(BaseEmbeddingModel, BaseRerankModel):
-    def __init__(self, port: int, host: str = "localhost", *args, **kwargs):
+    """Text Embeddings Inference server.
+
+    Credentials are optional, each entry may point to another replica with `base_url` and send
+    an `api_key`, calls are then scheduled over them by the credential pool.
+    """
+
+    def __init__(self, port: int | None = None, host: str = "localhost", *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.client = AsyncAPIClient(base_url=f"http://{host}:{port}")
+        self.client = AsyncAPIClient(base_url=f"http://{host}:{port}") if port is not None else None
+        """Client of the local server, None when every replica is given by a credential"""
+        self._clients: dict[str, AsyncAPIClient] = {}
+
+    def _client_for(self, credential: Credential | None) -> tuple[AsyncAPIClient, dict]:
+        """The client and request headers of a credential."""
+        options = credential.options if credential else {}
+        headers = {}
+        if options.get("api_key"):
+            headers["Authorization"] = f"Bearer {options['api_key']}"
+        base_url = options.get("base_url")
+        if base_url is None:
+            if self.client is None:
+                raise ValueError(
+                    f"{self.model_id} has no `port` and its credential has no `base_url`"
+                )
+            return self.client, headers
+        if base_url not in self._clients:
+            self._clients[base_url] = AsyncAPIClient(base_url=base_url)
+        return self._clients[base_url], headers
+
+    async def close(self):
+        clients, self._clients = self._clients, {}
+        for client in [self.client, *clients.values()]:
+            if client is not None:
+                await client.close()
 
     async def embedding(
         self,
@@ -26,12 +59,15 @@ class TeiEmbedding(BaseEmbeddingModel, BaseRerankModel):
         created = time.time()
         embeddings = []
         for i in range(0, len(content), batch_size):
-            res = await self.client.post(
-                "/embed",
-                body={"inputs": content[i : i + batch_size]},
-                options={"raw_response": True},
-                cast_to=list[list[int]],
-            )
+            batch = content[i : i + batch_size]
+            async with self._use_credential(estimate_tokens(batch)) as credential:
+                client, headers = self._client_for(credential)
+                res = await client.post(
+                    "/embed",
+                    body={"inputs": batch},
+                    options={"raw_response": True, "headers": headers},
+                    cast_to=list[list[int]],
+                )
             embeddings.extend(res.json())
         return EmbeddingResponse(
             embedding=embeddings,
@@ -43,10 +79,12 @@ class TeiEmbedding(BaseEmbeddingModel, BaseRerankModel):
     async def rerank(self, content: list[list[str]], **kwargs) -> RerankOutput:
         if kwargs:
             logger.warning(f"{self.model_id} Unused parameters: {kwargs}")
-        res = await self.client.post(
-            "/rerank",
-            body={"inputs": content},
-            options={"raw_response": True},
-            cast_to=list[int],
-        )
+        async with self._use_credential(estimate_tokens(content)) as credential:
+            client, headers = self._client_for(credential)
+            res = await client.post(
+                "/rerank",
+                body={"inputs": content},
+                options={"raw_response": True, "headers": headers},
+                cast_to=list[int],
+            )
         return RerankOutput(scores=res.json())
@@ -19,7 +19,29 @@ def compute_cost(pricing: Pricing, input_tokens: int, output_tokens: int) -> Gen
         total_cost=total_cost,
         total_tokens=input_tokens + output_tokens,
     )
-    
+
+
 def filter_notgiven(**kwargs):
     return {k: v for k, v in kwargs.items() if v is not NOT_GIVEN}
 
+
+def _count_chars(content) -> int:
+    if isinstance(content, str):
+        return len(content)
+    if isinstance(content, dict):
+        return _count_chars(content.get("content") or content.get("text"))
+    if isinstance(content, (list, tuple)):
+        return sum(_count_chars(c) for c in content)
+    return 0
+
+
+def estimate_tokens(content=None, *, max_tokens=None, max_completion_tokens=None, **kwargs) -> int:
+    """Cheap upper estimate of the tokens a request spends, used for tokens-per-minute limits.
+
+    Prompt tokens are estimated at 4 characters per token and the completion at its token limit.
+    """
+    tokens = _count_chars(content) // 4 + 1
+    for limit in (max_completion_tokens, max_tokens):
+        if isinstance(limit, int):
+            return tokens + limit
+    return tokens
@@ -1,47 +1,113 @@
 import httpx
+from fastapi import Request
 from fastapi.responses import StreamingResponse
 from starlette.background import BackgroundTask
+from starlette.datastructures import UploadFile
 
 from vmc.context.request import request
 from vmc.context.user import current_user
-from vmc.types.errors import VMCException
+from vmc.types.errors import APIConnectionError
+
+FORM_TYPES = ("multipart/form-data", "application/x-www-form-urlencoded")
+HOP_BY_HOP = {
+    "connection",
+    "keep-alive",
+    "proxy-authenticate",
+    "proxy-authorization",
+    "te",
+    "trailer",
+    "trailers",
+    "transfer-encoding",
+    "upgrade",
+}
+"""Headers of a single connection, never forwarded (RFC 9110 section 7.6.1)"""
+
+
+def _hop_by_hop(headers) -> set[str]:
+    """Lower-case names of the hop-by-hop headers of a message, those listed by its `Connection`
+    header included."""
+    listed = {
+        name.strip().lower()
+        for key, value in headers.raw
+        if key.lower() == b"connection"
+        for name in value.decode("latin-1").split(",")
+        if name.strip()
+    }
+    return HOP_BY_HOP | listed
+
+
+async def _request_content(req: Request, headers) -> dict:
+    """Body arguments of `httpx.AsyncClient.build_request` forwarding the body of `req`.
+
+    A body the route parsed as JSON is sent from memory, a body nobody read is streamed from the
+    client as it arrives. A form is sent again from the parsed form, whose files are spooled to
+    disk, with a new boundary.
+    """
+    if headers.get("content-type", "").startswith(FORM_TYPES):
+        form = await req.form()
+        data, files = {}, []
+        for key, value in form.multi_items():
+            if isinstance(value, UploadFile):
+                await value.seek(0)
+                files.append((key, (value.filename, value.file, value.content_type)))
+            else:
+                data.setdefault(key, []).append(value)
+        del headers["content-type"]
+        del headers["content-length"]
+        return {"data": data, "files": files}
+    return {"content": req.stream()}
 
 
 class VMC:
-    def __init__(self, port: int, host: str = "localhost"):
+    def __init__(self, port: int | None = None, host: str = "localhost", uds: str | None = None):
+        """Forward to the serve process listening on the Unix domain socket `uds` if given, else
+        on `host` and `port`."""
         self.host = host
         self.port = port
-        self.client = httpx.AsyncClient(base_url=f"http://{self.host}:{self.port}", timeout=60)
+        self.uds = uds
+        self.client = httpx.AsyncClient(
+            base_url=f"http://{self.host}" if uds else f"http://{self.host}:{self.port}",
+            transport=httpx.AsyncHTTPTransport(uds=uds) if uds else None,
+            timeout=60,
+        )
 
     def __getattr__(self, name):
         """Redirects all calls to the VMC server"""
-        if name in ["health"]:
+        if name in ["health", "close"]:
             return super().__getattribute__(name)
 
         async def _(**kwargs):
             req = request.get()
             headers = req.headers.mutablecopy()
+            for name in _hop_by_hop(req.headers) | {"host"}:
+                del headers[name]
             headers["X-VMC-Logging-User"] = current_user.username
             http_req = self.client.build_request(
                 req.method,
                 url=req.url.path,
-                content=req.scope["body"],
                 headers=headers,
+                **await _request_content(req, headers),
             )
             try:
                 res = await self.client.send(http_req, stream=True)
             except Exception:
-                raise VMCException(
-                    http_code=500,
-                    vmc_code=500,
-                    msg="Failed to connect to VMC Serve Server, please reload it.",
-                )
-            return StreamingResponse(
-                content=res.aiter_text(),
-                headers=res.headers,
+                raise APIConnectionError(
+                    msg="Failed to connect to VMC Serve Server, please reload it."
+                ) from None
+            """Bytes as received, still encoded, so `content-length` and `content-encoding` hold.
+            Each chunk is read once the previous one is sent to the client."""
+            response = StreamingResponse(
+                content=res.aiter_raw(),
                 status_code=res.status_code,
-                background=BackgroundTask(res.close),
+                background=BackgroundTask(res.aclose),
             )
+            skip = _hop_by_hop(res.headers)
+            response.raw_headers = [
+                (name.lower(), value)
+                for name, value in res.headers.raw
+                if name.decode("latin-1").lower() not in skip
+            ]
+            return response
 
         return _
 
@@ -54,3 +120,6 @@ class VMC:
         except Exception:
             return False
         return True
+
+    async def close(self):
+        await self.client.aclose()
@@ -0,0 +1,186 @@
+import asyncio
+import time
+from collections import deque
+
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+
+from vmc.types.errors import OverloadedError
+from vmc.types.model_config import AdmissionConfig
+from vmc.utils.concurrency import AdaptiveLimit
+from vmc.utils.metrics import metrics
+from vmc.utils.stream import ObservedStream
+
+from .failover import status_error
+from .stats import EWMA
+
+
+class AdmissionController:
+    """Bounds the calls of a model in flight, and the calls waiting for a slot.
+
+    Up to `max_concurrency` calls run at once, later calls wait in FIFO order. A call is rejected
+    with `OverloadedError` when `max_queue` calls are already waiting, or when it waited
+    `max_queue_time` seconds without getting a slot, so overload is shed early instead of piling
+    up behind slow upstreams. The error carries a `retry_after` estimated from the queue length
+    and the usual time a call holds its slot.
+
+    With `adaptive`, the limit follows the outcome of calls instead, see `AdaptiveLimit`.
+    """
+
+    queued = 0
+    """Calls waiting across every model"""
+
+    def __init__(self, name: str, config: AdmissionConfig | None = None):
+        self.name = name
+        self.config = config or AdmissionConfig()
+        self.inflight = 0
+        self.rejected = 0
+        self._waiters: deque[asyncio.Future] = deque()
+        self._hold_time = EWMA()
+        self.adaptive = AdaptiveLimit.from_config(name, self.config)
+        self._queue_length = metrics.gauge("admission_queue_length")
+        self._wait_time = metrics.histogram("admission_wait_seconds")
+
+    @property
+    def limited(self) -> bool:
+        return self.config.max_concurrency > 0
+
+    @property
+    def limit(self) -> int:
+        return int(self.adaptive) if self.adaptive is not None else self.config.max_concurrency
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def retry_after(self) -> float:
+        """Expected seconds until a new call would get a slot."""
+        if not self.limited:
+            return 0.0
+        rounds = (self.waiting + 1) / self.limit
+        return rounds * (self._hold_time.value or 1.0)
+
+    def _reject(self, reason: str):
+        self.rejected += 1
+        metrics.counter("admission_rejected_total").inc()
+        return OverloadedError(msg=f"{self.name} is {reason}", retry_after=self.retry_after())
+
+    def _set_queued(self, delta: int):
+        AdmissionController.queued += delta
+        self._queue_length.set(AdmissionController.queued)
+
+    async def acquire(self) -> "Permit":
+        """Wait for a slot, raises `OverloadedError` when the call is shed."""
+        if not self.limited:
+            return Permit(self)
+        if self.inflight < self.limit and not self._waiters:
+            self.inflight += 1
+            self._wait_time.observe(0)
+            return Permit(self)
+        if self.waiting >= self.config.max_queue:
+            raise self._reject("overloaded, its queue is full")
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._set_queued(1)
+        queued = time.monotonic()
+        try:
+            await asyncio.wait_for(waiter, self.config.max_queue_time)
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled():
+                """The slot was handed over just as the wait ended, pass it on"""
+                self._release()
+            else:
+                waiter.cancel()
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                    self._set_queued(-1)
+            if isinstance(e, asyncio.TimeoutError):
+                raise self._reject(f"overloaded, no slot in {self.config.max_queue_time}s")
+            raise
+        self._wait_time.observe(time.monotonic() - queued)
+        return Permit(self)
+
+    def _release(self, held: float | None = None):
+        if held is not None:
+            self._hold_time.update(held)
+        if not self.limited:
+            return
+        self.inflight = max(self.inflight - 1, 0)
+        self._wake()
+
+    def _wake(self):
+        """Hand the free slots to the waiters, in order."""
+        while self._waiters and self.inflight < self.limit:
+            waiter = self._waiters.popleft()
+            self._set_queued(-1)
+            if not waiter.done():
+                self.inflight += 1
+                waiter.set_result(None)
+
+    def record(self, error: BaseException | None, latency: float):
+        """Feed the adaptive limit with the outcome of a call, `error` is None on success."""
+        if self.adaptive is None:
+            return
+        self.adaptive.record(error, latency, self.inflight)
+        self._wake()
+
+    def dump(self) -> dict:
+        return {
+            "limit": self.limit,
+            "inflight": self.inflight,
+            "queued": self.waiting,
+            "rejected": self.rejected,
+            "retry_after": self.retry_after(),
+        }
+
+
+class Permit:
+    """A slot of an `AdmissionController`, `release` is idempotent."""
+
+    def __init__(self, controller: AdmissionController):
+        self.controller = controller
+        self.started = time.monotonic()
+        self.recorded = False
+        self.released = False
+
+    def record(self, error: BaseException | None = None):
+        """Record the outcome of the call once, at its end or at the first chunk of a stream."""
+        if self.recorded:
+            return
+        self.recorded = True
+        self.controller.record(error, time.monotonic() - self.started)
+
+    def release(self):
+        if self.released:
+            return
+        self.released = True
+        self.controller._release(time.monotonic() - self.started)
+
+    def _wrap_stream(self, stream) -> ObservedStream:
+        return ObservedStream(
+            stream, on_chunk=lambda _: self.record(), on_error=self.record, on_close=self.release
+        )
+
+    def hold(self, res):
+        """Keep the slot until the result of a call is consumed, streams until they end."""
+        if isinstance(res, StreamingResponse):
+            if res.status_code == 429 or res.status_code >= 500 or res.status_code in (423, 424):
+                self.record(status_error(res.status_code, res.headers))
+            res.body_iterator = self._wrap_stream(res.body_iterator)
+            background = res.background
+
+            async def release():
+                """Also runs when the response is discarded unread, see `VirtualModel`"""
+                try:
+                    if background is not None:
+                        await background()
+                finally:
+                    self.release()
+
+            res.background = BackgroundTask(release)
+        elif hasattr(res, "__aiter__"):
+            res = self._wrap_stream(res)
+        else:
+            self.record()
+            self.release()
+        return res
@@ -0,0 +1,126 @@
+import asyncio
+import time
+from typing import TYPE_CHECKING
+
+from loguru import logger
+
+from vmc.types.errors import ModelLoadError
+from vmc.types.model_config import EvictionConfig
+from vmc.utils.metrics import metrics
+
+if TYPE_CHECKING:
+    from .model import ProxyModel
+
+
+class Evictor:
+    """Keeps the local models launched through the manager within an idle timeout and a memory
+    budget.
+
+    A model is stopped when it has been unused for `idle_timeout` seconds, or when another model
+    needs room under `memory_budget`, least recently used first. Pinned models and models with
+    calls in flight are never stopped. A stopped model stays registered and is loaded again by
+    its next call.
+    """
+
+    def __init__(self, config: EvictionConfig | None = None):
+        self.config = config or EvictionConfig()
+        self.models: list["ProxyModel"] = []
+        self._reserved: set["ProxyModel"] = set()
+        """Models being loaded, their memory is already taken"""
+        self._lock = asyncio.Lock()
+        self._sweeper: asyncio.Task | None = None
+
+    def register(self, model: "ProxyModel"):
+        self.models.append(model)
+        model.evictor = self
+        if self._sweeper is None and self.config.idle_timeout > 0:
+            self._sweeper = asyncio.create_task(self._sweep_forever())
+
+    def unregister(self, model: "ProxyModel"):
+        if model in self.models:
+            self.models.remove(model)
+        model.evictor = None
+
+    @staticmethod
+    def _evictable(model: "ProxyModel") -> bool:
+        return (
+            model.loaded
+            and not model.model.pinned
+            and model.calls == 0
+            and model.stats.inflight == 0
+            and model.admission.waiting == 0
+        )
+
+    def memory_used(self, exclude: "ProxyModel | None" = None) -> float:
+        return sum(
+            m.model.memory
+            for m in self.models
+            if (m.loaded or m in self._reserved) and m is not exclude
+        )
+
+    async def reserve(self, model: "ProxyModel"):
+        """Stop least recently used models until `model` fits in the memory budget, and take
+        its memory until `release` is called once it is loaded."""
+        budget = self.config.memory_budget
+        if budget <= 0:
+            return
+        if model.model.memory > budget:
+            raise ModelLoadError(
+                msg=f"{model.model.name} needs {model.model.memory}GB, over the {budget}GB budget"
+            )
+        async with self._lock:
+            candidates = sorted(
+                (m for m in self.models if m is not model and self._evictable(m)),
+                key=lambda m: m.last_used,
+            )
+            while self.memory_used(exclude=model) + model.model.memory > budget:
+                if not candidates:
+                    raise ModelLoadError(
+                        msg=f"No room for {model.model.name} in the {budget}GB budget, "
+                        "every loaded model is pinned or busy"
+                    )
+                await self.evict(candidates.pop(0), reason="memory budget")
+            self._reserved.add(model)
+
+    def release(self, model: "ProxyModel"):
+        self._reserved.discard(model)
+
+    async def evict(self, model: "ProxyModel", reason: str) -> bool:
+        """Stop `model` unless a call reached it meanwhile, returns whether it was stopped.
+
+        The model is checked again once its pending start or stop is over, and marked as
+        evicting before anything is awaited, so calls arriving during the stop wait for it and
+        load the model again instead of using the one being stopped.
+        """
+        async with model._transition:
+            if not self._evictable(model):
+                return False
+            model.evicting = asyncio.Event()
+        logger.info(f"Evicting {model.model.name} ({reason})")
+        metrics.counter("model_evictions_total").inc()
+        try:
+            await model.offload()
+        finally:
+            evicting, model.evicting = model.evicting, None
+            evicting.set()
+        return True
+
+    async def sweep(self):
+        """Stop the models idle for longer than `idle_timeout`."""
+        now = time.monotonic()
+        for model in list(self.models):
+            if self._evictable(model) and now - model.last_used > self.config.idle_timeout:
+                try:
+                    await self.evict(model, reason="idle")
+                except Exception as e:
+                    logger.warning(f"Failed to evict {model.model.name}: {e}")
+
+    async def _sweep_forever(self):
+        while True:
+            await asyncio.sleep(self.config.interval)
+            await self.sweep()
+
+    def stop(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            self._sweeper = None
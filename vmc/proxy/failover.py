@@ -0,0 +1,58 @@
+from pydantic import BaseModel
+
+from vmc.exception import ErrorClass
+from vmc.types import errors as err
+from vmc.types.errors.status_code import HTTP_CODE
+
+
+class FailoverPolicy(BaseModel):
+    """When and how a model group retries a failed call on another member."""
+
+    enabled: bool = True
+    max_attempts: int = 3
+    """Attempts per call, the first one included"""
+
+    retry_on: set[ErrorClass] = {"rate_limit", "timeout", "connection", "server"}
+    """Error classes worth another attempt, see `vmc.exception.classify`"""
+
+    budget_ratio: float = 0.2
+    """Retries earned per call, bounds retries to a fraction of the traffic during an outage"""
+
+    budget_capacity: float = 10
+    """Retries that can be spent in a burst, so low-traffic groups can still fail over"""
+
+    max_retry_after: float = 5
+    """Longest `Retry-After` honoured by waiting when no other member is eligible"""
+
+
+class RetryBudget:
+    """Every call deposits `ratio` retries and every retry withdraws one, the balance holds at most
+    `capacity`. Over time retries stay below `ratio` of the calls, so they cannot amplify an outage,
+    while a burst of `capacity` retries is always available."""
+
+    def __init__(self, ratio: float, capacity: float):
+        self.ratio = ratio
+        self.capacity = capacity
+        self.balance = capacity
+
+    def deposit(self, amount: float = 1):
+        """Earn `ratio` of a call costing `amount`."""
+        self.balance = min(self.balance + self.ratio * amount, self.capacity)
+
+    def withdraw(self, amount: float = 1) -> bool:
+        if self.balance < amount:
+            return False
+        self.balance -= amount
+        return True
+
+
+def status_error(status_code: int, headers) -> err.VMCException:
+    """The error matching the status of a forwarded response."""
+    context = {"retry_after": headers.get("retry-after")}
+    if status_code == HTTP_CODE.API_RATE_LIMIT:
+        return err.RateLimitError(**context)
+    if status_code == HTTP_CODE.API_TIMEOUT:
+        return err.APITimeoutError(**context)
+    if status_code == HTTP_CODE.API_CONNECTION_ERROR:
+        return err.APIConnectionError(**context)
+    return err.InternalServerError(http_code=status_code, **context)
@@ -0,0 +1,82 @@
+import asyncio
+import time
+from typing import Awaitable, Callable
+
+from loguru import logger
+
+from vmc.types.model_config import HealthCheckConfig
+
+
+class HealthState:
+    """Cached health of a proxied model.
+
+    The state is fed by two sources: an optional background prober calling `probe` every
+    `interval` seconds, and the outcome of real requests (passive health). The model is marked
+    down after `failure_threshold` consecutive failures and up again after `success_threshold`
+    consecutive successes, so the request path only reads a boolean.
+    """
+
+    def __init__(self, name: str, config: HealthCheckConfig | None = None):
+        self.name = name
+        self.config = config or HealthCheckConfig()
+        self.healthy = False
+        self.last_change = time.time()
+        self._failures = 0
+        self._successes = 0
+        self._prober: asyncio.Task | None = None
+
+    def mark_up(self):
+        self._failures = 0
+        self._set(True)
+
+    def mark_down(self):
+        self._successes = 0
+        self._set(False)
+
+    def _set(self, healthy: bool):
+        if healthy != self.healthy:
+            logger.info(f"{self.name} is now {'healthy' if healthy else 'unhealthy'}")
+            self.healthy = healthy
+            self.last_change = time.time()
+
+    def record_success(self):
+        self._failures = 0
+        self._successes += 1
+        if not self.healthy and self._successes >= self.config.success_threshold:
+            self._set(True)
+
+    def record_failure(self):
+        self._successes = 0
+        self._failures += 1
+        if self.healthy and self._failures >= self.config.failure_threshold:
+            self._set(False)
+
+    def start(self, probe: Callable[[], Awaitable[bool]]):
+        """Start probing in the background, replacing any previous prober."""
+        self.stop()
+        if self.config.interval > 0:
+            self._prober = asyncio.create_task(self._probe_forever(probe))
+
+    def stop(self):
+        if self._prober is not None:
+            self._prober.cancel()
+            self._prober = None
+
+    async def _probe_forever(self, probe: Callable[[], Awaitable[bool]]):
+        while True:
+            await asyncio.sleep(self.config.interval)
+            try:
+                ok = await asyncio.wait_for(probe(), timeout=self.config.timeout)
+            except Exception:
+                ok = False
+            if ok:
+                self.record_success()
+            else:
+                self.record_failure()
+
+    def dump(self) -> dict:
+        return {
+            "healthy": self.healthy,
+            "last_change": self.last_change,
+            "consecutive_failures": self._failures,
+        }
@@ -0,0 +1,52 @@
+from pydantic import BaseModel
+
+from vmc.models.utils import estimate_tokens
+from vmc.types.model_config import ModelConfig
+from vmc.types.pricing import Pricing
+
+
+class HedgingPolicy(BaseModel):
+    """When a model group sends a duplicate request to a second member.
+
+    A call is hedged when its member has not answered (or, for streams, produced its first chunk)
+    within the member's rolling `percentile` latency. The first successful response wins and the
+    other request is cancelled.
+    """
+
+    enabled: bool = False
+    methods: set[str] = {"generate", "embedding"}
+    percentile: float = 95
+    min_samples: int = 20
+    """Samples a member needs before its percentile is trusted, no hedging before that"""
+
+    min_delay: float = 0.05
+    """Lower bound of the hedge delay in seconds"""
+
+    max_hedge_fraction: float = 0.05
+    """Hedges may add at most this fraction to the group's cost, estimated from `Pricing` (or
+    the request count for models without pricing)"""
+
+    budget_capacity: float = 5
+    """Hedges that can be sent in a burst, in requests of the costliest member at its token
+    limit"""
+
+
+def estimate_cost(pricing: Pricing | None, *args, **kwargs) -> float:
+    """Estimated cost of a call relative to a request without pricing, which costs 1. No call
+    costs less, so cheap or free calls cannot hedge without limit."""
+    if pricing is None:
+        return 1
+    content = args[0] if args else kwargs.get("content")
+    total = estimate_tokens(content, **{k: v for k, v in kwargs.items() if k != "content"})
+    prompt = estimate_tokens(content)
+    cost = (pricing.input * prompt + pricing.output * (total - prompt)) / pricing.multiplier
+    return max(cost, 1)
+
+
+def budget_capacity(policy: HedgingPolicy, members: list[ModelConfig]) -> float:
+    """Hedge budget capacity of a group in cost units, see `HedgingPolicy.budget_capacity`."""
+    cost = max(
+        (estimate_cost(m.pricing, max_tokens=m.max_tokens) for m in members),
+        default=1,
+    )
+    return policy.budget_capacity * cost
@@ -1,12 +1,32 @@
+import asyncio
+import contextlib
+import time
+
+from loguru import logger
 from typing_extensions import Literal, TypedDict
 
 import vmc.models as api_module
 import vmc.serve.models as serve_module
 from vmc.models import ModelType
-from vmc.types.errors import GroupExistsError, GroupNotFoundError, ModelNotFoundError
-from vmc.types.model_config import ModelConfig, ProviderConfig, Providers
+from vmc.types.errors import (
+    BadParamsError,
+    GroupExistsError,
+    GroupNotFoundError,
+    ModelNotFoundError,
+)
+from vmc.types.model_config import (
+    EvictionConfig,
+    ModelConfig,
+    PreloadConfig,
+    ProviderConfig,
+    Providers,
+)
+from vmc.utils.singleflight import SingleFlight
 
-from .model import ProxyModel, VirtualModel
+from .eviction import Evictor
+from .failover import FailoverPolicy
+from .hedging import HedgingPolicy, budget_capacity
+from .model import Algorithm, ProxyModel, VirtualModel
 
 
 def uniform(id: str):
@@ -50,29 +70,101 @@ class VirtualModelManager:
     VirtualModel will use schedule algorithm to find a proper model in the group.
 
     Support Model Priority. VirtualModel will use priority to find a proper model.
-    Supported Algorithms: Random, Round Robin, Least Busy, Priority, Budget, etc.
+    Supported Algorithms: Random, Round Robin, Least Busy, Priority, Budget, Least Outstanding
+    Requests, Power of Two Choices, Weighted Round Robin.
+
+    Local models launched through the manager are stopped when idle or to stay within a memory
+    budget according to `eviction`, and started again by their next call.
+
+    The models listed in `preload` are loaded, and optionally warmed up, by `warm`. The manager
+    is `ready` once it returns.
     """
 
-    def __init__(self, validated_config: dict[str, ValidationResult]):
+    def __init__(
+        self,
+        validated_config: dict[str, ValidationResult],
+        eviction: EvictionConfig | None = None,
+        preload: PreloadConfig | None = None,
+    ):
         self.model_configs = validated_config
         self.loaded_models = {}
+        self._loader = SingleFlight()
+        self.evictor = Evictor(eviction)
+        self.preload = preload or PreloadConfig()
+        for id in self.preload.models:
+            if uniform(id) not in self.model_configs:
+                raise ValueError(f"preloaded model {id} not found")
+        self.ready = False
 
     @classmethod
-    def from_providers(cls, providers: list[ProviderConfig]):
+    def from_providers(
+        cls,
+        providers: list[ProviderConfig],
+        eviction: EvictionConfig | None = None,
+        preload: PreloadConfig | None = None,
+    ):
         validated_config = validate_models(providers)
-        return cls(validated_config)
+        return cls(validated_config, eviction, preload)
 
     @classmethod
     def from_yaml(cls, path: str | None):
-        validated_config = validate_models(Providers.from_yaml(path).providers)
-        return cls(validated_config)
+        providers = Providers.from_yaml(path)
+        return cls(validate_models(providers.providers), providers.eviction, providers.preload)
+
+    async def warm(self):
+        """Load the preloaded models concurrently, then report ready.
+
+        A model that fails to load or warm up within `preload.timeout` is logged and left to load
+        on its first request, so a broken upstream cannot keep the proxy from becoming ready.
+        """
+        started = time.monotonic()
+        results = await asyncio.gather(
+            *(
+                asyncio.wait_for(self._warm(id), timeout=self.preload.timeout)
+                for id in self.preload.models
+            ),
+            return_exceptions=True,
+        )
+        for id, result in zip(self.preload.models, results):
+            if isinstance(result, BaseException):
+                logger.warning(f"Failed to warm up {id}: {result!r}")
+        self.ready = True
+        logger.info(
+            f"Warmed up {len(self.preload.models)} models in {time.monotonic() - started:.1f}s"
+        )
+
+    async def _warm(self, id: str):
+        model: ProxyModel = await self.load(id)
+        await model.load()
+        if not self.preload.warmup:
+            return
+        if model.forward:
+            """Forwarded calls need a client request, check the local server instead"""
+            await model.alive()
+            return
+        content = self.preload.warmup_content
+        if model.model.type == "chat":
+            with contextlib.suppress(Exception):
+                """Loads the tokenizer, e.g. downloads the tiktoken encoding"""
+                await model.tokenize(content)
+            await model.generate(content=content, max_tokens=1)
+        elif model.model.type == "embedding":
+            await model.embedding(content=[content])
+        elif model.model.type == "reranker":
+            await model.rerank(content=[[content, content]])
 
     @property
     def models(self):
         return {m["config"].name: m["config"].dump() for m in self.model_configs.values()}
 
     async def add_model_group(
-        self, group_name: str, model_ids: list[str], algorithm: str = "round_robin"
+        self,
+        group_name: str,
+        model_ids: list[str],
+        algorithm: str = "round_robin",
+        weights: list[float] | None = None,
+        failover: dict | None = None,
+        hedging: dict | None = None,
     ):
         """Add a model group with model ids and algorithm.
 
@@ -80,15 +172,27 @@ class VirtualModelManager:
             group_name: str, the group name.
             model_ids: list[str], the model ids in the group.
             algorithm: str, the algorithm to select model in the group.
+            weights: list[float] | None, member weights for `weighted_round_robin`.
+            failover: dict | None, `FailoverPolicy` fields, failover is on by default.
+            hedging: dict | None, `HedgingPolicy` fields, hedging is off by default.
         """
         if group_name in self.loaded_models:
             raise GroupExistsError(msg=f"group {group_name} already exists")
+        if algorithm not in Algorithm._value2member_map_:
+            raise BadParamsError(msg=f"unknown algorithm {algorithm}")
         for model_id in model_ids:
             if model_id not in self.model_configs:
                 raise ModelNotFoundError(msg=f"{model_id} not found")
-            self.load(model_id)
+            await self.load(model_id)
+        models = [self.loaded_models[uniform(id)] for id in model_ids]
+        hedging = HedgingPolicy(**(hedging or {}))
         self.loaded_models[group_name] = VirtualModel(
-            models=[self.loaded_models[id] for id in model_ids]
+            models=models,
+            algorithm=Algorithm(algorithm),
+            weights=weights,
+            failover=FailoverPolicy(**(failover or {})),
+            hedging=hedging,
+            hedge_budget_capacity=budget_capacity(hedging, [m.model for m in models]),
         )
 
     async def remove_model_group(self, group_name: str):
@@ -116,6 +220,9 @@ class VirtualModelManager:
             return self.loaded_models[id]
         if id not in self.model_configs:
             raise ModelNotFoundError(msg=f"{id} not found") from None
+        return await self._loader.do(id, lambda: self._load(id, physical))
+
+    async def _load(self, id: str, physical: bool):
         model = ProxyModel(
             model=self.model_configs[id]["config"],
             credentials=self.model_configs[id]["credentials"],
@@ -124,6 +231,8 @@ class VirtualModelManager:
         )
         if physical:
             await model.load()
+        elif model.model.is_local:
+            self.evictor.register(model)
         self.loaded_models[id] = model
         return self.loaded_models[id]
 
@@ -142,5 +251,23 @@ class VirtualModelManager:
                 break
         else:
             raise ModelNotFoundError(msg=f"{id} not found")
-        await self.loaded_models[_id].offload()
-        del self.loaded_models[_id]
+        self._loader.forget(_id)
+        model = self.loaded_models.pop(_id)
+        self.evictor.unregister(model)
+        await model.offload()
+
+    def circuits(self) -> dict[str, dict]:
+        """Circuit breaker states of the loaded models, by model id."""
+        return {
+            id: model.circuits()
+            for id, model in self.loaded_models.items()
+            if isinstance(model, ProxyModel)
+        }
+
+    async def close(self):
+        """Offload every loaded model, releasing their upstream connection pools. Local model
+        servers keep running for the next start."""
+        self.evictor.stop()
+        for model in self.loaded_models.values():
+            if isinstance(model, ProxyModel):
+                await model.offload(stop_server=False)
@@ -2,10 +2,30 @@ import asyncio
 import random
 import time
 from enum import Enum
+from typing import Callable, Collection
+
+import httpx
+from fastapi.responses import StreamingResponse
 
 import vmc.models as api_module
+from vmc.exception import classify, retry_after
 from vmc.models import VMC
-from vmc.types.model_config import ModelConfig
+from vmc.models._base import BaseModel
+from vmc.models.utils import estimate_tokens
+from vmc.types.errors import APIConnectionError, CircuitOpenError
+from vmc.types.model_config import ModelConfig, RateLimitConfig
+from vmc.utils.circuit import CircuitBreaker
+from vmc.utils.metrics import metrics
+from vmc.utils.ratelimit import RateLimiter
+from vmc.utils.singleflight import SingleFlight
+from vmc.utils.stream import ObservedStream
+
+from .admission import AdmissionController
+from .eviction import Evictor
+from .failover import FailoverPolicy, RetryBudget, status_error
+from .health import HealthState
+from .hedging import HedgingPolicy, estimate_cost
+from .stats import RequestStats
 
 
 class Algorithm(Enum):
@@ -14,28 +34,19 @@ class Algorithm(Enum):
     LEAST_BUSY = "least_busy"
     PRIORITY = "priority"
     BUDGET = "budget"
+    LEAST_OUTSTANDING = "least_outstanding"
+    P2C = "p2c"
+    WEIGHTED_ROUND_ROBIN = "weighted_round_robin"
+
+
+RATE_LIMITED_METHODS = {"generate", "embedding", "rerank", "transcribe"}
+"""Methods that reach the upstream, `_generate` and friends included"""
 
 
-class RateLimiter:
-    def __init__(self, rate: int, period: int):
-        self.rate = rate
-        self.period = period
-        self._count = 0
-        self._last = time.time()
-        self.next_available_wait_time = 0
-
-    def __call__(self):
-        if self.rate == 0 or self.period == 0:
-            return True
-        now = time.time()
-        if now - self._last > self.period:
-            self._count = 0
-            self._last = now
-        if self._count < self.rate:
-            self._count += 1
-            return True
-        self.next_available_wait_time = self.period - (now - self._last)
-        return False
+def base_method(name: str) -> str:
+    """The upstream method behind a call, e.g. `generate` for `_generate` and for the
+    `generate_openai` of a forwarded model."""
+    return name.lstrip("_").removesuffix("_openai")
 
 
 class ProxyModel:
@@ -51,7 +62,8 @@ class ProxyModel:
         physical: bool = False,
     ):
         self.model = model
-        self.ratelimiter = RateLimiter(rate, period)
+        rate_limit = self.model.rate_limit or RateLimitConfig(requests=rate, period=period)
+        self.ratelimiter = RateLimiter(**rate_limit.model_dump())
         self.credentials = credentials or []
         self.init_kwargs = init_kwargs or {}
         self.init_kwargs = {**self.init_kwargs, **self.model.init_kwargs}
@@ -64,8 +76,37 @@ class ProxyModel:
             and not self.physical
             and (self.model.load_method == "tf" or self.model.load_method is None)
         )
+        self.health = HealthState(self.model.name, self.model.health_check)
+        self.stats = RequestStats()
+        self.breaker = CircuitBreaker(self.model.name, self.model.circuit_breaker)
+        self.admission = AdmissionController(self.model.name, self.model.admission)
+        self.evictor: "Evictor | None" = None
+        self.last_used = time.monotonic()
+        self._loader = SingleFlight()
+        self._transition = asyncio.Lock()
+        """Orders the start and stop of a local model server"""
+        self._closing: set[asyncio.Task] = set()
+        """Closes of replaced clients waiting for their calls to end"""
+        self._uses: dict[int, int] = {}
+        """Calls in flight on each model instance, by `id`"""
+        self._drained: dict[int, asyncio.Event] = {}
+        """Set when the calls of a replaced instance are done, see `_close_when_drained`"""
+        self.calls = 0
+        """Calls inside the wrapper, from before the model is loaded until their result is
+        returned. Results still being streamed are counted by `stats` instead"""
+        self.evicting: asyncio.Event | None = None
+        """Set while the evictor stops the model, new calls wait for it and load it again"""
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
 
     async def load(self):
+        """Load the model. Concurrent callers share a single load."""
+        return await self._loader.do(self.model.name, self._load)
+
+    async def _load(self):
+        previous = self._model
         if self.model.is_local:
             if self.physical:
                 from vmc.serve.models import modules
@@ -76,57 +117,401 @@ class ProxyModel:
             else:
                 from vmc.proxy.utils import load_local_model
 
-                self._model = await load_local_model(self.model)
+                if self.evictor is not None:
+                    await self.evictor.reserve(self)
+                try:
+                    async with self._transition:
+                        self._model = await load_local_model(self.model)
+                finally:
+                    if self.evictor is not None:
+                        self.evictor.release(self)
         else:
             self._model = getattr(api_module, self.model.model_class)(
                 **{"credentials": self.credentials, **self.init_kwargs, "config": self.model}
             )
+        if previous is not None and not self.physical:
+            task = asyncio.create_task(self._close_when_drained(previous))
+            self._closing.add(task)
+            task.add_done_callback(self._closing.discard)
+        self.health.mark_up()
+        if isinstance(self._model, VMC):
+            self.health.start(self._model.health)
+
+    async def _close_when_drained(self, previous: BaseModel):
+        """Close the client replaced by a reload once its own calls are done, they may still be
+        using it. Calls on the new client do not hold it open."""
+        if self._uses.get(id(previous)):
+            drained = self._drained[id(previous)] = asyncio.Event()
+            await drained.wait()
+        await previous.close()
+
+    def _use(self, model) -> Callable[[], None]:
+        """Count a call on `model` until the returned function is called, which is idempotent."""
+        key = id(model)
+        self._uses[key] = self._uses.get(key, 0) + 1
+        released = False
+
+        def release():
+            nonlocal released
+            if released:
+                return
+            released = True
+            self._uses[key] -= 1
+            if self._uses[key] == 0:
+                del self._uses[key]
+                drained = self._drained.pop(key, None)
+                if drained is not None:
+                    drained.set()
+
+        return release
+
+    async def _invoke(self, name: str, args, kwargs):
+        """Call the current model instance, which stays in use until the result is consumed."""
+        model = self._model
+        release = self._use(model)
+        try:
+            res = await getattr(model, name)(*args, **kwargs)
+        except BaseException:
+            release()
+            raise
+        if isinstance(res, StreamingResponse):
+            res.body_iterator = ObservedStream(res.body_iterator, on_close=release)
+        elif hasattr(res, "__aiter__"):
+            res = ObservedStream(res, on_close=release)
+        else:
+            release()
+        return res
 
     async def alive(self):
         if isinstance(self._model, VMC):
             return await self._model.health()
         return self._model is not None
 
-    async def offload(self):
-        if not await self.alive():
+    async def offload(self, stop_server: bool = True):
+        """Unload the model, stopping the server of a local model unless `stop_server` is False.
+        The next call loads it again."""
+        self._loader.forget(self.model.name)
+        self.health.stop()
+        self.health.mark_down()
+        if self._model is None:
             return
+        model, self._model = self._model, None
+        if not self.physical:
+            await model.close()
+        if self.model.is_local and not self.physical and stop_server:
+            from vmc.proxy.utils import stop_local_model
+
+            async with self._transition:
+                await stop_local_model(self.model)
         if self.physical:
-            del self._model
             from vmc.utils.gpu import torch_gc
 
             torch_gc()
-        else:
-            self._model = None
 
     def __getattr__(self, name):
         async def wrapper(*args, **kwargs):
-            if not await self.alive():
-                await self.load()
-            if not self.ratelimiter():
-                await asyncio.sleep(self.ratelimiter.next_available_wait_time)
-            return await getattr(self._model, name)(*args, **kwargs)
+            self.last_used = time.monotonic()
+            while self.evicting is not None:
+                await self.evicting.wait()
+            self.calls += 1
+            try:
+                if not self.health.healthy or self._model is None:
+                    await self.load()
+                if base_method(name) not in RATE_LIMITED_METHODS:
+                    return await self._invoke(name, args, kwargs)
+                permit = await self.admission.acquire()
+                try:
+                    res = await self._call(name, args, kwargs)
+                except BaseException as e:
+                    permit.record(e)
+                    permit.release()
+                    raise
+                return permit.hold(res)
+            finally:
+                self.calls -= 1
 
         return wrapper
 
+    async def _call(self, name: str, args, kwargs):
+        """Call the upstream through the circuit breaker, the rate limiter and the stats."""
+        if not self.breaker.allow():
+            raise CircuitOpenError(
+                msg=f"{self.model.name} is failing", retry_after=self.breaker.retry_after()
+            )
+        content = args[0] if args else kwargs.get("content")
+        tokens = estimate_tokens(content, **{k: v for k, v in kwargs.items() if k != "content"})
+        try:
+            await self.ratelimiter.acquire(tokens)
+        except BaseException:
+            self.breaker.release()
+            raise
+        tracker = self.stats.start(tokens)
+        started = time.monotonic()
+        try:
+            res = await self._invoke(name, args, kwargs)
+        except (APIConnectionError, httpx.TransportError) as e:
+            tracker.finish(error=True)
+            self.breaker.record(e, time.monotonic() - started)
+            self.health.record_failure()
+            raise
+        except asyncio.CancelledError:
+            tracker.release()
+            self.breaker.release()
+            raise
+        except BaseException as e:
+            tracker.finish(error=True)
+            self.breaker.record(e, time.monotonic() - started)
+            raise
+        self.health.record_success()
+        return tracker.track(self._guard(res, started))
+
+    def _guard(self, res, started: float):
+        """Feed the circuit breaker with the outcome of a call, streams at their first chunk."""
+        if isinstance(res, StreamingResponse):
+            if res.status_code >= 500 or res.status_code in (423, 424):
+                self.breaker.record(
+                    status_error(res.status_code, res.headers), time.monotonic() - started
+                )
+            else:
+                res.body_iterator = self.breaker.guard(res.body_iterator, started)
+        elif hasattr(res, "__aiter__"):
+            res = self.breaker.guard(res, started)
+        else:
+            self.breaker.record(None, time.monotonic() - started)
+        return res
+
+    def circuits(self) -> dict:
+        """Circuit breaker states of the model and of its credentials, without secrets."""
+        pool = self._model.credential_pool if isinstance(self._model, BaseModel) else None
+        return {
+            "model": self.breaker.dump(),
+            "credentials": pool.dump() if pool is not None else [],
+        }
+
+
+_EMPTY = object()
+
+
+async def _prefetch(stream):
+    """Pull the first chunk of a stream so errors raised before the first token surface now."""
+    iterator = stream.__aiter__()
+    try:
+        first = await iterator.__anext__()
+    except StopAsyncIteration:
+        first = _EMPTY
+
+    async def replay():
+        if first is _EMPTY:
+            return
+        yield first
+        async for chunk in iterator:
+            yield chunk
+
+    return replay()
+
 
 class VirtualModel:
-    def __init__(self, models: list[ProxyModel], algorithm: Algorithm = Algorithm.ROUND_ROBIN):
+    """A group of models served as one, each call is routed to a member by `algorithm`.
+
+    Calls that reach the upstream fail over to another member according to `failover`: the
+    error class must be retryable, the group retry budget must allow it, and members that sent a
+    `Retry-After` are skipped until it expires. Streams fail over only before their first chunk.
+    Members whose circuit breaker is open are skipped as well, while every member is open calls
+    fail fast with `CircuitOpenError`.
+
+    With `hedging` enabled, an attempt that is slower than its member's usual latency is raced
+    against the same call on another member, see `HedgingPolicy`. Hedges are paid from a budget
+    of `hedge_budget_capacity` cost units, `hedging.budget_capacity` by default.
+    """
+
+    def __init__(
+        self,
+        models: list[ProxyModel],
+        algorithm: Algorithm = Algorithm.ROUND_ROBIN,
+        weights: list[float] | None = None,
+        failover: FailoverPolicy | None = None,
+        hedging: HedgingPolicy | None = None,
+        hedge_budget_capacity: float | None = None,
+    ):
         self.models = models
         self.algorithm = algorithm
+        self.weights = weights or [1.0] * len(models)
+        assert len(self.weights) == len(self.models), "one weight per model is required"
         self.index = 0
+        self._current_weights = [0.0] * len(models)
+        self.failover = failover or FailoverPolicy()
+        self._retry_budget = RetryBudget(self.failover.budget_ratio, self.failover.budget_capacity)
+        self._cooldown_until: dict[int, float] = {}
+        self.hedging = hedging or HedgingPolicy()
+        self._hedge_budget = RetryBudget(
+            self.hedging.max_hedge_fraction, hedge_budget_capacity or self.hedging.budget_capacity
+        )
+
+    @property
+    def forward(self) -> bool:
+        return all(m.forward for m in self.models)
+
+    def _candidates(self, exclude: Collection[ProxyModel]) -> list[int]:
+        now = time.monotonic()
+        indices = [i for i, m in enumerate(self.models) if m not in exclude]
+        ready = [
+            i
+            for i in indices
+            if self._cooldown_until.get(i, 0) <= now and self.models[i].breaker.available
+        ]
+        return ready or indices or list(range(len(self.models)))
 
-    def choose(self):
+    def choose(self, exclude: Collection[ProxyModel] = ()) -> ProxyModel:
+        """Pick a member, preferring members not in `exclude`, not cooling down and whose
+        circuit is not open."""
+        indices = self._candidates(exclude)
+        models = [self.models[i] for i in indices]
         if self.algorithm == Algorithm.RANDOM:
-            return random.choice(self.models)
+            return random.choice(models)
         if self.algorithm == Algorithm.ROUND_ROBIN:
-            return self.models[self.index]
+            model = models[self.index % len(models)]
+            self.index = (self.index + 1) % len(self.models)
+            return model
         if self.algorithm == Algorithm.LEAST_BUSY:
-            return min(self.models, key=lambda m: m.ratelimiter._count)
+            return min(models, key=lambda m: (m.ratelimiter.queue_depth, m.ratelimiter.delay()))
         if self.algorithm == Algorithm.PRIORITY:
-            return max(self.models, key=lambda m: m.priority)
+            return max(models, key=lambda m: m.priority)
         if self.algorithm == Algorithm.BUDGET:
-            return max(self.models, key=lambda m: m.budget)
+            return max(models, key=lambda m: m.budget)
+        if self.algorithm == Algorithm.LEAST_OUTSTANDING:
+            return min(
+                random.sample(models, len(models)),
+                key=lambda m: (
+                    m.stats.inflight + m.ratelimiter.queue_depth,
+                    m.stats.inflight_tokens,
+                    m.stats.latency.value or 0,
+                ),
+            )
+        if self.algorithm == Algorithm.P2C:
+            if len(models) == 1:
+                return models[0]
+            a, b = random.sample(models, 2)
+            return a if a.stats.load() <= b.stats.load() else b
+        if self.algorithm == Algorithm.WEIGHTED_ROUND_ROBIN:
+            """Smooth weighted round robin, spreads picks evenly instead of in bursts"""
+            for i in indices:
+                self._current_weights[i] += self.weights[i]
+            best = max(indices, key=lambda i: self._current_weights[i])
+            self._current_weights[best] -= sum(self.weights[i] for i in indices)
+            return self.models[best]
+        raise ValueError(f"Unknown algorithm: {self.algorithm}")
+
+    async def _attempt(self, model: ProxyModel, name: str, args, kwargs, last: bool):
+        res = await getattr(model, name)(*args, **kwargs)
+        if isinstance(res, StreamingResponse):
+            """Forwarded response, fail over on its status while the body is still unread"""
+            if res.status_code == 429 or res.status_code >= 500 or res.status_code in (423, 424):
+                exc = status_error(res.status_code, res.headers)
+                if not last and classify(exc) in self.failover.retry_on:
+                    if res.background is not None:
+                        await res.background()
+                    raise exc
+            return res
+        if hasattr(res, "__aiter__"):
+            return await _prefetch(res)
+        return res
+
+    async def _discard(self, res):
+        """Release the upstream of a response nobody will read."""
+        if isinstance(res, StreamingResponse):
+            if res.background is not None:
+                await res.background()
+        elif hasattr(res, "aclose"):
+            await res.aclose()
+
+    def _hedge_delay(self, model: ProxyModel, stream: bool) -> float | None:
+        policy = self.hedging
+        if model.stats.samples(ttft=stream) < policy.min_samples:
+            return None
+        return max(model.stats.percentile(policy.percentile, ttft=stream), policy.min_delay)
+
+    def _discard_late(self, task: asyncio.Task):
+        """Done callback of a cancelled loser, which may have finished before the cancellation"""
+        if not task.cancelled() and task.exception() is None:
+            asyncio.ensure_future(self._discard(task.result()))
+
+    async def _hedged_attempt(self, model: ProxyModel, name: str, args, kwargs, last: bool):
+        policy = self.hedging
+        if not policy.enabled or base_method(name) not in policy.methods or len(self.models) < 2:
+            return await self._attempt(model, name, args, kwargs, last)
+        cost = estimate_cost(model.model.pricing, *args, **kwargs)
+        self._hedge_budget.deposit(cost)
+        primary = asyncio.create_task(self._attempt(model, name, args, kwargs, last))
+        pending = {primary}
+        try:
+            delay = self._hedge_delay(model, stream=bool(kwargs.get("stream")))
+            if delay is not None:
+                await asyncio.wait(pending, timeout=delay)
+            if delay is None or primary.done():
+                return await primary
+            hedge_model = self.choose(exclude=[model])
+            if hedge_model is model or not self._hedge_budget.withdraw(cost):
+                metrics.counter("hedge_skipped_total").inc()
+                return await primary
+            metrics.counter("hedges_total").inc()
+            hedge = asyncio.create_task(self._attempt(hedge_model, name, args, kwargs, last))
+            pending.add(hedge)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winners = [t for t in done if t.exception() is None]
+                if not winners:
+                    continue
+                winner = primary if primary in winners else hedge
+                if winner is hedge:
+                    metrics.counter("hedge_wins_total").inc()
+                for task in winners:
+                    if task is not winner:
+                        await self._discard(task.result())
+                return winner.result()
+            return primary.result()
+        finally:
+            for task in pending:
+                if not task.done():
+                    task.cancel()
+                    task.add_done_callback(self._discard_late)
+
+    async def _call_with_failover(self, name: str, args, kwargs):
+        policy = self.failover
+        self._retry_budget.deposit()
+        tried: list[ProxyModel] = []
+        for attempt in range(1, policy.max_attempts + 1):
+            model = self.choose(exclude=tried)
+            tried.append(model)
+            try:
+                return await self._hedged_attempt(
+                    model, name, args, kwargs, last=attempt == policy.max_attempts
+                )
+            except Exception as e:
+                if attempt == policy.max_attempts or classify(e) not in policy.retry_on:
+                    raise
+                delay = retry_after(e)
+                if delay is not None:
+                    self._cooldown_until[self.models.index(model)] = time.monotonic() + delay
+                if not self._retry_budget.withdraw():
+                    metrics.counter("failover_budget_exhausted_total").inc()
+                    raise
+                if len(set(map(id, tried))) >= len(self.models):
+                    """Every member failed once, wait for the earliest Retry-After if short"""
+                    wait = min(self._cooldown_until.values(), default=0) - time.monotonic()
+                    if wait > policy.max_retry_after:
+                        raise
+                    await asyncio.sleep(max(wait, 0))
+                    tried.clear()
+                metrics.counter("failover_retries_total").inc()
 
     def __getattr__(self, name):
-        model = self.choose()
-        return getattr(model, name)
+        """Route each call when it is made, not when the attribute is looked up."""
+
+        async def wrapper(*args, **kwargs):
+            if base_method(name) not in RATE_LIMITED_METHODS:
+                return await getattr(self.choose(), name)(*args, **kwargs)
+            if not self.failover.enabled:
+                return await self._hedged_attempt(self.choose(), name, args, kwargs, last=True)
+            return await self._call_with_failover(name, args, kwargs)
+
+        return wrapper
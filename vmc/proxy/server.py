@@ -1,22 +1,25 @@
+import asyncio
 import json
 import os
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, Request
+from fastapi import Depends, FastAPI, Request
 from fastapi.encoders import jsonable_encoder
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
 from openai._exceptions import OpenAIError
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Receive, Scope, Send
 from zhipuai import ZhipuAIError
 
 from vmc.callback import callback, init_callback
-from vmc.context.request import request as request_context
+from vmc.context.request import bind_request
 from vmc.context.user import set_user
 from vmc.db import db, init_db, init_storage
 from vmc.exception import exception_handler
-from vmc.proxy import init_vmm
+from vmc.proxy import init_vmm, vmm
 from vmc.proxy.manager import VirtualModelManager
-from vmc.routes import openai, vmc
+from vmc.routes import admin, openai, vmc
 from vmc.types.errors._base import VMCException
 from vmc.types.errors.message import ErrorMessage
 from vmc.types.errors.status_code import HTTP_CODE as s
@@ -27,6 +30,8 @@ from vmc.utils import get_version
 async def app_startup():
     print("✅ Setting up models...")
     init_vmm(VirtualModelManager.from_yaml(None))
+    """Warm up in the background, `/ready` reports when done"""
+    app.state.warming = asyncio.create_task(vmm.warm())
     print("✅ Initializing Database...")
     init_db()
     init_storage()
@@ -49,6 +54,8 @@ async def app_startup():
 
 
 async def app_shutdown():
+    app.state.warming.cancel()
+    await vmm.close()
     await callback.on_shutdown(
         title=f"VMC Proxy v{get_version()} Stopped", message="Stopped", gather_background=True
     )
@@ -61,7 +68,7 @@ async def lifespan(app: FastAPI):
     await app_shutdown()
 
 
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(lifespan=lifespan, dependencies=[Depends(bind_request)])
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -85,7 +92,7 @@ async def handle_exception(request: Request, exc: Exception):
     return msg.to_response()
 
 
-IGNORE_PATHS = ["/docs", "/openapi.json"]
+IGNORE_PATHS = ["/docs", "/openapi.json", "/ready"]
 
 
 async def check_user(auth: str | None):
@@ -98,17 +105,23 @@ async def check_user(auth: str | None):
     return user
 
 
-@app.middleware("http")
-async def validate_token(request: Request, call_next):
-    request.scope["body"] = await request.body()
-    request_context.set(request)
-    if request.url.path in IGNORE_PATHS:
-        return await call_next(request)
-    if await check_user(request.headers.get("Authorization")):
-        return await call_next(request)
-    return ErrorMessage(
-        status_code=s.UNAUTHORIZED, code=v.UNAUTHORIZED, msg="Unauthorized"
-    ).to_response()
+class AuthMiddleware:
+    """Authenticate every request from its `Authorization` header before the body is read, so
+    rejected uploads are never buffered and accepted ones are streamed to the routes."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["path"] in IGNORE_PATHS:
+            return await self.app(scope, receive, send)
+        if await check_user(Headers(scope=scope).get("Authorization")):
+            return await self.app(scope, receive, send)
+        response = ErrorMessage(status_code=s.UNAUTHORIZED, code=v.UNAUTHORIZED, msg="Unauthorized")
+        await response.to_response()(scope, receive, send)
+
+
+app.add_middleware(AuthMiddleware)
 
 
 async def default_exception_handler(request: Request, exc: Exception):
@@ -122,3 +135,4 @@ app.add_exception_handler(ZhipuAIError, default_exception_handler)
 
 app.include_router(openai.router)
 app.include_router(vmc.router)
+app.include_router(admin.router)
@@ -0,0 +1,129 @@
+import time
+from collections import deque
+
+from fastapi.responses import StreamingResponse
+
+from vmc.utils.stream import ObservedStream
+
+
+class EWMA:
+    """Exponentially weighted moving average, `None` until the first sample."""
+
+    def __init__(self, alpha: float = 0.2):
+        self.alpha = alpha
+        self.value: float | None = None
+
+    def update(self, sample: float):
+        if self.value is None:
+            self.value = sample
+        else:
+            self.value += self.alpha * (sample - self.value)
+
+
+class RequestStats:
+    """Load and latency signals of a proxied model, used by group routing.
+
+    Tracks requests and estimated tokens in flight, EWMAs of latency and time to first token
+    (streams only), and a rolling window of recent latencies for percentiles.
+    """
+
+    def __init__(self, alpha: float = 0.2, window: int = 200):
+        self.inflight = 0
+        self.inflight_tokens = 0
+        self.requests = 0
+        self.errors = 0
+        self.latency = EWMA(alpha)
+        self.ttft = EWMA(alpha)
+        self._latencies: deque[float] = deque(maxlen=window)
+        self._ttfts: deque[float] = deque(maxlen=window)
+
+    def start(self, tokens: int = 0) -> "Tracker":
+        self.inflight += 1
+        self.inflight_tokens += tokens
+        self.requests += 1
+        return Tracker(self, tokens)
+
+    def percentile(self, q: float, ttft: bool = False) -> float | None:
+        """Latency (or time to first token) percentile, 0 to 100, over the rolling window."""
+        samples = self._ttfts if ttft else self._latencies
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(int(len(ordered) * q / 100), len(ordered) - 1)]
+
+    def samples(self, ttft: bool = False) -> int:
+        return len(self._ttfts if ttft else self._latencies)
+
+    def load(self) -> float:
+        """Expected time to serve one more request: outstanding requests times latency."""
+        return (self.inflight + 1) * (self.latency.value or 1.0)
+
+    def dump(self) -> dict:
+        return {
+            "inflight": self.inflight,
+            "inflight_tokens": self.inflight_tokens,
+            "requests": self.requests,
+            "errors": self.errors,
+            "latency_ewma": self.latency.value,
+            "ttft_ewma": self.ttft.value,
+            "latency_p50": self.percentile(50),
+            "latency_p95": self.percentile(95),
+        }
+
+
+class Tracker:
+    """A single request in flight, `finish` is idempotent."""
+
+    def __init__(self, stats: RequestStats, tokens: int):
+        self.stats = stats
+        self.tokens = tokens
+        self.started = time.monotonic()
+        self.first_token_at: float | None = None
+        self.done = False
+
+    def first_token(self):
+        if self.first_token_at is None:
+            self.first_token_at = time.monotonic()
+            self.stats.ttft.update(self.first_token_at - self.started)
+            self.stats._ttfts.append(self.first_token_at - self.started)
+
+    def finish(self, error: bool = False):
+        if not self.release():
+            return
+        if error:
+            self.stats.errors += 1
+            return
+        latency = time.monotonic() - self.started
+        self.stats.latency.update(latency)
+        self.stats._latencies.append(latency)
+
+    def release(self) -> bool:
+        """Leave the in-flight counters without recording an outcome, e.g. when the client went
+        away. Returns False if the request was already released."""
+        if self.done:
+            return False
+        self.done = True
+        self.stats.inflight -= 1
+        self.stats.inflight_tokens -= self.tokens
+        return True
+
+    def wrap_stream(self, stream) -> ObservedStream:
+        """Track an async iterator until it is exhausted, fails, or is closed or dropped by the
+        consumer."""
+        return ObservedStream(
+            stream,
+            on_chunk=lambda _: self.first_token(),
+            on_end=self.finish,
+            on_error=lambda _: self.finish(error=True),
+            on_close=self.release,
+        )
+
+    def track(self, res):
+        """Track the result of a model call, streams stay in flight until consumed."""
+        if isinstance(res, StreamingResponse):
+            res.body_iterator = self.wrap_stream(res.body_iterator)
+        elif hasattr(res, "__aiter__"):
+            res = self.wrap_stream(res)
+        else:
+            self.finish()
+        return res
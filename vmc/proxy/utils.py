@@ -1,3 +1,8 @@
+import os
+import re
+
+from loguru import logger
+
 from vmc.models import VMC
 from vmc.serve.manager.client import ManagerClient
 from vmc.types.model_config import ModelConfig
@@ -6,25 +11,49 @@ from vmc.utils import find_available_port
 _client: ManagerClient = None
 
 
-async def load_local_model(model: ModelConfig):
+def _get_client() -> ManagerClient:
     global _client
     if _client is None:
         _client = ManagerClient()
+    return _client
+
+
+def _socket_path(model: ModelConfig) -> str | None:
+    """Unix domain socket of a local model under `VMC_SERVE_UDS_DIR`, None to serve over TCP.
+    The manager must run on the same host."""
+    uds_dir = os.getenv("VMC_SERVE_UDS_DIR")
+    if not uds_dir:
+        return None
+    os.makedirs(uds_dir, exist_ok=True)
+    return os.path.join(uds_dir, re.sub(r"[^\w.-]", "_", model.name) + ".sock")
+
+
+async def load_local_model(model: ModelConfig):
+    _client = _get_client()
     await _client.health()
-    port = find_available_port()
+    uds = _socket_path(model)
+    endpoint = {"uds": uds} if uds else {"port": find_available_port()}
     load_method = model.load_method or "tf"
     res = await _client.serve(
         name=model.name,
-        port=port,
+        **endpoint,
         model_id=model.init_kwargs.get("model_id"),
         method=model.load_method or "tf",
         type=model.type,
         backend=model.backend,
         device_map_auto=model.device_map_auto,
+        continuous_batching=model.continuous_batching,
         gpu_limit=model.gpu_limit,
     )
-    port = res.port
     if load_method == "tf":
-        return VMC(port=port)
+        return VMC(port=res.port, uds=res.uds)
     else:
         raise NotImplementedError(f"{load_method} is not supported")
+
+
+async def stop_local_model(model: ModelConfig):
+    """Stop the server of a local model, a model the manager does not know is left alone."""
+    try:
+        await _get_client().stop(model.name)
+    except Exception as e:
+        logger.warning(f"Failed to stop {model.name}: {e}")
@@ -0,0 +1,20 @@
+from fastapi import APIRouter, Depends
+
+from vmc.context.user import current_user
+from vmc.proxy import vmm
+from vmc.routes.wrapper import route_class
+from vmc.types.errors import PermissionDeniedError
+from vmc.types.metrics import CircuitsOutput
+
+
+async def require_admin():
+    if current_user.role != "admin":
+        raise PermissionDeniedError(msg="Admin role required")
+
+
+router = APIRouter(prefix="/admin", route_class=route_class, dependencies=[Depends(require_admin)])
+
+
+@router.get("/circuits")
+async def get_circuits():
+    return CircuitsOutput(circuits=vmm.circuits())
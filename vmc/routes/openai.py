@@ -6,11 +6,11 @@ from openai.types.chat.completion_create_params import CompletionCreateParams
 from openai.types.embedding_create_params import EmbeddingCreateParams
 
 from vmc.proxy import vmm
-from vmc.routes.wrapper import wrap_fastapi
+from vmc.routes.wrapper import route_class, wrap_fastapi
 from vmc.types.embedding import EmbeddingParams as VMCEmbeddingParams
 from vmc.types.generation import GenerationParams
 
-router = APIRouter(prefix="/v1")
+router = APIRouter(prefix="/v1", route_class=route_class)
 
 
 def remove_keys(d: dict, keys: set):
@@ -5,16 +5,19 @@ from openai.types.audio.transcription_create_params import TranscriptionCreatePa
 
 from vmc.db import storage
 from vmc.proxy import vmm
-from vmc.routes.wrapper import wrap_fastapi
+from vmc.routes.wrapper import route_class, wrap_fastapi
 from vmc.types._base import BaseOutput
 from vmc.types.embedding import EmbeddingDimensionParams, EmbeddingParams
+from vmc.types.errors.status_code import HTTP_CODE, VMC_CODE
 from vmc.types.generation import GenerationParams
 from vmc.types.generation.tokenize_params import TokenizeParams
 from vmc.types.image.upload import ImageUploadOutput
+from vmc.types.metrics import MetricsOutput
 from vmc.types.models import ModelInfoOutput
 from vmc.types.rerank import RerankParams
+from vmc.utils.metrics import metrics
 
-router = APIRouter()
+router = APIRouter(route_class=route_class)
 
 
 def remove_keys(d: dict, keys: set):
@@ -92,3 +95,17 @@ async def image_upload(file: UploadFile = File(...)):
 @router.get("/health")
 async def health():
     return BaseOutput(msg="ok")
+
+
+@router.get("/ready")
+async def ready():
+    if not vmm.ready:
+        return BaseOutput(
+            status_code=HTTP_CODE.NOT_READY, code=VMC_CODE.NOT_READY, msg="warming up"
+        ).to_response()
+    return BaseOutput(msg="ready")
+
+
+@router.get("/metrics")
+async def get_metrics():
+    return MetricsOutput(metrics=metrics.snapshot())
@@ -1,4 +1,8 @@
-from fastapi.responses import StreamingResponse
+import asyncio
+import functools
+
+from fastapi.responses import Response, StreamingResponse
+from fastapi.routing import APIRoute
 
 from vmc.exception import exception_handler
 from vmc.models.openai.response_adapter import (
@@ -7,6 +11,27 @@ from vmc.models.openai.response_adapter import (
     restore_embedding,
 )
 from vmc.proxy.model import ProxyModel
+from vmc.utils.fastjson import FAST_JSON, FastJSONResponse
+
+
+class FastJSONRoute(APIRoute):
+    """Route whose return value is serialized by `vmc.utils.fastjson.dumps` as is, instead of
+    being converted by `jsonable_encoder` first."""
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        if asyncio.iscoroutinefunction(endpoint):
+            wrapped = endpoint
+
+            @functools.wraps(wrapped)
+            async def endpoint(*args, **params):
+                res = await wrapped(*args, **params)
+                return res if isinstance(res, Response) else FastJSONResponse(res)
+
+        super().__init__(path, endpoint, **kwargs)
+
+
+route_class = FastJSONRoute if FAST_JSON else APIRoute
+"""Route class of the routers, `VMC_FAST_JSON` enables the fast responses"""
 
 
 class FastAPIWrapper:
@@ -0,0 +1,137 @@
+import asyncio
+from typing import Awaitable, Callable, Generic, TypeVar
+
+from vmc.utils.metrics import metrics
+
+ItemT = TypeVar("ItemT")
+ResultT = TypeVar("ResultT")
+OptionsT = TypeVar("OptionsT")
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+
+
+class _Request(Generic[ItemT, OptionsT]):
+    def __init__(self, items: list[ItemT], options: OptionsT, tokens: int):
+        self.items = items
+        self.options = options
+        self.tokens = tokens
+        loop = asyncio.get_running_loop()
+        self.queued_at = loop.time()
+        self.future: asyncio.Future = loop.create_future()
+
+
+class MicroBatcher(Generic[ItemT, OptionsT, ResultT]):
+    """Merge concurrent requests into a single model call.
+
+    The first queued request opens a batch window of `max_wait` seconds. The batch is flushed when
+    the window closes or when the queued requests reach `max_batch_tokens` estimated tokens or
+    `max_batch_size` items, whichever happens first. A request is never split, so a single request
+    larger than the budget runs alone.
+
+    `process` receives the concatenated items and the options of every merged request (one entry
+    per request) and must return one result per item, results are split back to each caller.
+    """
+
+    def __init__(
+        self,
+        process: Callable[[list[ItemT], list[tuple[OptionsT, slice]]], Awaitable[list[ResultT]]],
+        *,
+        name: str,
+        count_tokens: Callable[[ItemT], int] = lambda _: 1,
+        max_wait: float = 0.005,
+        max_batch_tokens: int = 16384,
+        max_batch_size: int = 256,
+    ):
+        self.process = process
+        self.name = name
+        self.count_tokens = count_tokens
+        self.max_wait = max_wait
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_size = max_batch_size
+        self._queue: list[_Request] = []
+        self._wakeup: asyncio.Event | None = None
+        self._worker: asyncio.Task | None = None
+        self._requests_per_batch = metrics.histogram(f"{name}_batch_requests", BATCH_SIZE_BUCKETS)
+        self._items_per_batch = metrics.histogram(f"{name}_batch_items", BATCH_SIZE_BUCKETS)
+        self._tokens_per_batch = metrics.histogram(
+            f"{name}_batch_tokens", [2**i for i in range(4, 18)]
+        )
+        self._queue_time = metrics.histogram(f"{name}_batch_queue_seconds")
+
+    @property
+    def _queued_tokens(self) -> int:
+        return sum(r.tokens for r in self._queue)
+
+    @property
+    def _queued_items(self) -> int:
+        return sum(len(r.items) for r in self._queue)
+
+    async def submit(self, items: list[ItemT], options: OptionsT) -> list[ResultT]:
+        request = _Request(items, options, sum(self.count_tokens(item) for item in items))
+        self._queue.append(request)
+        if self._worker is None or self._worker.done():
+            self._wakeup = asyncio.Event()
+            self._worker = asyncio.create_task(self._run())
+        if (
+            self._queued_tokens >= self.max_batch_tokens
+            or self._queued_items >= self.max_batch_size
+        ):
+            self._wakeup.set()
+        return await request.future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while self._queue:
+            remaining = self._queue[0].queued_at + self.max_wait - loop.time()
+            if remaining > 0 and not self._wakeup.is_set():
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    pass
+            self._wakeup.clear()
+            batch = self._take_batch()
+            now = loop.time()
+            for request in batch:
+                self._queue_time.observe(now - request.queued_at)
+            await self._process(batch)
+
+    def _take_batch(self) -> list[_Request]:
+        batch, tokens, items = [], 0, 0
+        while self._queue:
+            request = self._queue[0]
+            if batch and (
+                tokens + request.tokens > self.max_batch_tokens
+                or items + len(request.items) > self.max_batch_size
+            ):
+                break
+            batch.append(self._queue.pop(0))
+            tokens += request.tokens
+            items += len(request.items)
+        self._requests_per_batch.observe(len(batch))
+        self._items_per_batch.observe(items)
+        self._tokens_per_batch.observe(tokens)
+        return batch
+
+    async def _process(self, batch: list[_Request]):
+        batch = [request for request in batch if not request.future.done()]
+        if not batch:
+            return
+        items, options, start = [], [], 0
+        for request in batch:
+            items.extend(request.items)
+            options.append((request.options, slice(start, start + len(request.items))))
+            start += len(request.items)
+        try:
+            results = await self.process(items, options)
+            if len(results) != len(items):
+                raise ValueError(
+                    f"{self.name} returned {len(results)} results for {len(items)} items"
+                )
+            for request, (_, index) in zip(batch, options):
+                if not request.future.done():
+                    request.future.set_result(results[index])
+        except Exception as e:
+            """Splitting may fail too, every caller still gets an answer and the worker lives"""
+            for request in batch:
+                if not request.future.done():
+                    request.future.set_exception(e)
@@ -0,0 +1,69 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, TypeVar
+
+from vmc.utils.metrics import metrics
+
+_T = TypeVar("_T")
+
+
+class InferenceExecutor:
+    """Run blocking inference calls on dedicated worker threads.
+
+    Torch releases the GIL inside kernels, so a bounded worker pool keeps the event loop free for
+    health probes and other requests while a model is busy. At most `max_pending` calls are
+    admitted at once, further callers wait on the loop without occupying a worker.
+    """
+
+    def __init__(self, max_workers: int = 1, max_pending: int = 64):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="vmc-inference"
+        )
+        self._slots: asyncio.Semaphore | None = None
+        self._pending = 0
+        self._queue_depth = metrics.gauge("inference_executor_pending")
+        self._wait_time = metrics.histogram("inference_executor_wait_seconds")
+        self._run_time = metrics.histogram("inference_executor_run_seconds")
+
+    async def run(self, fn: Callable[..., _T], *args, **kwargs) -> _T:
+        loop = asyncio.get_running_loop()
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_pending)
+        queued = loop.time()
+        self._pending += 1
+        self._queue_depth.set(self._pending)
+        try:
+            async with self._slots:
+
+                def _call():
+                    started = loop.time()
+                    self._wait_time.observe(started - queued)
+                    try:
+                        return fn(*args, **kwargs)
+                    finally:
+                        self._run_time.observe(loop.time() - started)
+
+                return await loop.run_in_executor(self._executor, _call)
+        finally:
+            self._pending -= 1
+            self._queue_depth.set(self._pending)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_executor: InferenceExecutor | None = None
+
+
+def get_executor() -> InferenceExecutor:
+    """The inference executor of the current serve process."""
+    global _executor
+    if _executor is None:
+        _executor = InferenceExecutor(
+            max_workers=int(os.getenv("VMC_SERVE_INFERENCE_WORKERS", 1)),
+            max_pending=int(os.getenv("VMC_SERVE_MAX_PENDING", 64)),
+        )
+    return _executor
@@ -9,15 +9,19 @@ from vmc.utils.api_client import DEFAULT_MAX_RETRIES, DEFAULT_TIMEOUT, AsyncAPIC
 
 
 class ManagerClient:
-    def __init__(self, host: str | None = None, port: int | None = None):
-        host = host or os.getenv("VMC_MANAGER_HOST")
+    def __init__(self, host: str | None = None, port: int | None = None, uds: str | None = None):
+        """Connect over the Unix domain socket `uds` (`VMC_MANAGER_UDS`) when set, else over TCP
+        to `host` and `port`."""
+        uds = uds or os.getenv("VMC_MANAGER_UDS")
+        host = host or os.getenv("VMC_MANAGER_HOST") or ("localhost" if uds else None)
         port = port or os.getenv("VMC_MANAGER_PORT")
         assert host, "VMC_MANAGER_HOST is not set"
-        assert port, "VMC_MANAGER_PORT is not set"
+        assert port or uds, "VMC_MANAGER_PORT is not set"
         self.client = AsyncAPIClient(
-            base_url=f"http://{host}:{port}",
+            base_url=f"http://{host}:{port}" if port and not uds else f"http://{host}",
             max_retries=DEFAULT_MAX_RETRIES,
             timeout=DEFAULT_TIMEOUT,
+            uds=uds,
         )
 
     async def serve(self, **kwargs: Unpack[ServeParams]):
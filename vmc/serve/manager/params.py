@@ -5,7 +5,10 @@ class ServeParams(TypedDict, total=False):
     name: Required[str]
     """custom name for the model"""
 
-    port: Required[int]
+    port: int
+    uds: str
+    """Unix domain socket the server binds instead of `host` and `port`"""
+
     host: str
     model_id: str
     method: Literal["config", "tf", "vllm", "ollama"]
@@ -14,6 +17,7 @@ class ServeParams(TypedDict, total=False):
     api_key: str
     backend: Literal["torch", "onnx", "openvino"]
     device_map_auto: bool
+    continuous_batching: bool
     gpu_limit: int
 
 
@@ -1,4 +1,5 @@
 import asyncio
+import contextlib
 import os
 from contextlib import asynccontextmanager
 
@@ -72,6 +73,7 @@ async def serve(params: ServeParams):
         "type",
         "host",
         "port",
+        "uds",
         "api_key",
         "backend",
     ]
@@ -80,10 +82,20 @@ async def serve(params: ServeParams):
             command += [f"--{option.replace('_', '-')}", str(params[option])]
     if "device_map_auto" in params and params["device_map_auto"]:
         command += ["--device-map-auto"]
+    if params.get("continuous_batching"):
+        command += ["--continuous-batching"]
+    if (
+        params["name"] in started_processes
+        and started_processes[params["name"]]["process"].returncode is not None
+    ):
+        logger.warning(f"Model {params['name']} exited, restarting it")
+        started_processes.pop(params["name"])
     if params["name"] in started_processes:
+        started = started_processes[params["name"]]
         return ServeResponse(
-            port=started_processes[params["name"]]["params"]["port"],
-            pid=started_processes[params["name"]]["process"].pid,
+            port=started["params"].get("port"),
+            uds=started["params"].get("uds"),
+            pid=started["process"].pid,
         )
     try:
         logger.debug(f"Starting model {params['name']} with command: {' '.join(command)}")
@@ -126,7 +138,7 @@ async def serve(params: ServeParams):
         "params": params,
         "pid": process.pid,
     }
-    return ServeResponse(port=params["port"], pid=process.pid)
+    return ServeResponse(port=params.get("port"), uds=params.get("uds"), pid=process.pid)
 
 
 @app.post("/stop")
@@ -136,9 +148,13 @@ async def stop(params: StopParams):
         return BaseOutput(
             status_code=HTTP_CODE.MODEL_STOP_ERROR, code=VMC_CODE.MODEL_STOP_ERROR
         ).to_response()
-    p = started_processes.pop(name)["process"]
+    started = started_processes.pop(name)
+    p = started["process"]
     logger.debug(f"Killing model {name} with pid {p.pid}")
     killpg(p.pid)
+    if started["params"].get("uds"):
+        with contextlib.suppress(OSError):
+            os.unlink(started["params"]["uds"])
     logger.debug(f"Model {name} stopped")
     return BaseOutput()
 
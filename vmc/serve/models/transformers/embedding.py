@@ -1,6 +1,7 @@
 import time
 from typing import Iterable, List, Union
 
+import numpy as np
 import torch
 from loguru import logger
 from sentence_transformers import SentenceTransformer
@@ -8,6 +9,8 @@ from typing_extensions import Literal
 
 from vmc.models.embedding import BaseEmbeddingModel
 from vmc.models.utils import filter_notgiven
+from vmc.serve.batching import MicroBatcher
+from vmc.serve.executor import get_executor
 from vmc.types._types import NOT_GIVEN, NotGiven
 from vmc.types.embedding.embedding import NO_COST, EmbeddingResponse
 from vmc.utils.gpu import torch_gc
@@ -17,9 +20,21 @@ class TransformerEmbedding(BaseEmbeddingModel):
     def __init__(
         self,
         backend: Literal["torch", "onnx", "openvino"] = "torch",
+        micro_batching: bool = True,
+        batch_wait_ms: float = 5,
+        max_batch_tokens: int = 32768,
+        max_batch_size: int = 512,
         *args,
         **kwargs,
     ):
+        """Local sentence-transformers embedding model.
+
+        Args:
+            micro_batching: Merge texts of concurrent requests into one `encode` call.
+            batch_wait_ms: How long the first request of a batch waits for others to join.
+            max_batch_tokens: Estimated token budget of a merged batch.
+            max_batch_size: Maximum number of texts in a merged batch.
+        """
         super().__init__(*args, **kwargs)
         if torch.backends.mps.is_available():
             self.device = torch.device("mps")
@@ -32,6 +47,50 @@ class TransformerEmbedding(BaseEmbeddingModel):
             self.model_id, trust_remote_code=True, device=self.device, backend=backend
         )
         self.model.eval()
+        self.batcher = None
+        if micro_batching:
+            self.batcher = MicroBatcher(
+                self._encode_batch,
+                name="embedding",
+                count_tokens=self._estimate_tokens,
+                max_wait=batch_wait_ms / 1000,
+                max_batch_tokens=max_batch_tokens,
+                max_batch_size=max_batch_size,
+            )
+
+    def _estimate_tokens(self, text: str) -> int:
+        """Upper bound of the token count, without running the tokenizer on the loop."""
+        if self.model.max_seq_length:
+            return min(len(text), self.model.max_seq_length)
+        return len(text)
+
+    def _encode(self, content: list[str], **kwargs) -> list[list[float]]:
+        embeddings = self.model.encode(content, **kwargs).tolist()
+        torch_gc()
+        return embeddings
+
+    async def _encode_batch(
+        self, content: list[str], options: list[tuple[tuple[bool, int | None], slice]]
+    ) -> np.ndarray:
+        """Encode the texts of several requests at once. `encode` sorts texts by length itself,
+        so the merged batch is padded per length bucket rather than to the longest request.
+
+        The forward batch size is the smallest `batch_size` asked by the merged requests, so no
+        request runs in larger batches than it asked for."""
+        batch_sizes = [batch_size for (_, batch_size), _ in options if batch_size]
+        embeddings = await get_executor().run(
+            self.model.encode,
+            content,
+            convert_to_numpy=True,
+            normalize_embeddings=False,
+            **({"batch_size": min(batch_sizes)} if batch_sizes else {}),
+        )
+        torch_gc()
+        for (normalize, _), index in options:
+            if normalize:
+                norms = np.linalg.norm(embeddings[index], axis=1, keepdims=True)
+                embeddings[index] = embeddings[index] / np.clip(norms, 1e-12, None)
+        return embeddings
 
     async def embedding(
         self,
@@ -45,12 +104,18 @@ class TransformerEmbedding(BaseEmbeddingModel):
             logger.warning(f"{self.model_id} Unused parameters: {kwargs}")
         content = [content] if isinstance(content, str) else content
         created = time.time()
-        embeddings = self.model.encode(
-            content,
-            **filter_notgiven(batch_size=batch_size),
-            normalize_embeddings=normalize_embeddings,
-        ).tolist()
-        torch_gc()
+        if self.batcher is not None:
+            embeddings = await self.batcher.submit(
+                content, (normalize_embeddings, batch_size or None)
+            )
+            embeddings = embeddings.tolist()
+        else:
+            embeddings = await get_executor().run(
+                self._encode,
+                content,
+                **filter_notgiven(batch_size=batch_size),
+                normalize_embeddings=normalize_embeddings,
+            )
         return EmbeddingResponse(
             embedding=embeddings,
             created=created,
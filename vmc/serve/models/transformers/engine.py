@@ -0,0 +1,281 @@
+import queue
+import threading
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Iterable, Optional
+
+import torch
+from loguru import logger
+from transformers import DynamicCache, PreTrainedModel, TextStreamer
+
+
+@dataclass
+class SamplingParams:
+    max_new_tokens: int = 512
+    temperature: Optional[float] = None
+    top_p: Optional[float] = None
+    frequency_penalty: Optional[float] = None
+
+
+@dataclass
+class Sequence:
+    """A single generation request tracked by the engine."""
+
+    input_ids: torch.Tensor
+    params: SamplingParams
+    streamer: Optional[TextStreamer] = None
+    future: Future = field(default_factory=Future)
+    generated: list[int] = field(default_factory=list)
+    finish_reason: Optional[str] = None
+
+    @property
+    def prompt_tokens(self) -> int:
+        return self.input_ids.size(-1)
+
+    @property
+    def completion_tokens(self) -> int:
+        return len(self.generated)
+
+    def abort(self):
+        """Ask the engine to drop this sequence at the next decode step."""
+        self.future.cancel()
+
+
+def _to_legacy(past_key_values) -> tuple:
+    if hasattr(past_key_values, "to_legacy_cache"):
+        return past_key_values.to_legacy_cache()
+    return past_key_values
+
+
+class ContinuousBatchingEngine:
+    """In-flight batching for a causal LM.
+
+    Requests are queued from any thread. A single worker thread owns the model and, between two
+    decode steps, prefills newly queued sequences and merges them into the running batch. Every
+    decode step runs one forward pass for all running sequences; finished (or aborted) sequences
+    are dropped from the batch right away so their slots can be reused.
+
+    The KV cache of the running batch is kept left padded, so sequences of different lengths can
+    share a single forward pass through the attention mask and explicit position ids.
+    """
+
+    def __init__(
+        self,
+        model: PreTrainedModel,
+        eos_token_id: int | Iterable[int] | None = None,
+        max_batch_size: int = 16,
+    ):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        if eos_token_id is None:
+            eos_token_id = model.generation_config.eos_token_id
+        if isinstance(eos_token_id, int):
+            eos_token_id = [eos_token_id]
+        self.eos_token_ids = set(eos_token_id or [])
+        self._pending: queue.Queue[Sequence] = queue.Queue()
+        self._running: list[Sequence] = []
+        self._cache: tuple | None = None
+        self._mask: torch.Tensor | None = None
+        self._next_tokens: torch.Tensor | None = None
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def device(self) -> torch.device:
+        return self.model.device
+
+    @property
+    def num_running(self) -> int:
+        return len(self._running)
+
+    @property
+    def num_pending(self) -> int:
+        return self._pending.qsize()
+
+    def submit(
+        self,
+        input_ids: torch.Tensor,
+        params: SamplingParams,
+        streamer: Optional[TextStreamer] = None,
+    ) -> Sequence:
+        """Queue a prompt for generation. The returned sequence's future resolves to itself."""
+        seq = Sequence(input_ids=input_ids.view(1, -1), params=params, streamer=streamer)
+        self._pending.put(seq)
+        self._ensure_started()
+        return seq
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._loop, name="vmc-generation-engine", daemon=True
+                )
+                self._thread.start()
+
+    def _loop(self):
+        while True:
+            try:
+                if not self._running:
+                    self._try_admit(self._pending.get())
+                while len(self._running) < self.max_batch_size:
+                    try:
+                        self._try_admit(self._pending.get_nowait())
+                    except queue.Empty:
+                        break
+                if self._running:
+                    self._step()
+            except Exception as e:
+                logger.exception(e)
+                for seq in self._running:
+                    self._finish(seq, exc=e)
+                self._reset()
+
+    def _try_admit(self, seq: Sequence):
+        """Admit a sequence, failing only that sequence if its prefill or merge raises. The
+        running batch is left as it was."""
+        try:
+            self._admit(seq)
+        except Exception as e:
+            logger.exception(e)
+            self._finish(seq, exc=e)
+
+    def _reset(self):
+        self._running = []
+        self._cache = None
+        self._mask = None
+        self._next_tokens = None
+
+    @torch.no_grad()
+    def _admit(self, seq: Sequence):
+        """Prefill a new sequence and merge it into the running batch."""
+        if seq.future.cancelled():
+            return
+        input_ids = seq.input_ids.to(self.device)
+        outputs = self.model(
+            input_ids=input_ids,
+            attention_mask=torch.ones_like(input_ids),
+            past_key_values=DynamicCache(),
+            use_cache=True,
+        )
+        token = self._sample(outputs.logits[0, -1], seq)
+        if self._emit(seq, token):
+            return
+        cache = _to_legacy(outputs.past_key_values)
+        mask = torch.ones_like(input_ids)
+        next_token = torch.tensor([[token]], device=self.device)
+        if self._running:
+            """Build the merged batch fully before replacing anything, a failure (e.g. out of
+            memory) must leave the running batch consistent"""
+            length = max(self._mask.size(1), mask.size(1))
+            cache = tuple(
+                (
+                    torch.cat([self._pad(bk, length), self._pad(k, length)]),
+                    torch.cat([self._pad(bv, length), self._pad(v, length)]),
+                )
+                for (bk, bv), (k, v) in zip(self._cache, cache)
+            )
+            mask = torch.cat([self._pad(self._mask, length), self._pad(mask, length)])
+            next_token = torch.cat([self._next_tokens, next_token])
+        self._cache, self._mask, self._next_tokens = cache, mask, next_token
+        self._running.append(seq)
+
+    @staticmethod
+    def _pad(tensor: torch.Tensor, length: int) -> torch.Tensor:
+        """Left pad the sequence dimension (dim 2 for kv, dim 1 for masks) to `length`."""
+        dim = 2 if tensor.dim() == 4 else 1
+        missing = length - tensor.size(dim)
+        if missing <= 0:
+            return tensor
+        shape = list(tensor.shape)
+        shape[dim] = missing
+        return torch.cat([tensor.new_zeros(shape), tensor], dim=dim)
+
+    @torch.no_grad()
+    def _step(self):
+        """Run one decode step for every running sequence."""
+        self._mask = torch.cat([self._mask, self._mask.new_ones((self._mask.size(0), 1))], dim=1)
+        position_ids = self._mask.sum(dim=-1, keepdim=True) - 1
+        outputs = self.model(
+            input_ids=self._next_tokens,
+            attention_mask=self._mask,
+            position_ids=position_ids,
+            past_key_values=DynamicCache.from_legacy_cache(self._cache),
+            use_cache=True,
+        )
+        self._cache = _to_legacy(outputs.past_key_values)
+        logits = outputs.logits[:, -1]
+        keep, next_tokens = [], []
+        for i, seq in enumerate(self._running):
+            if seq.future.cancelled():
+                continue
+            token = self._sample(logits[i], seq)
+            if not self._emit(seq, token):
+                keep.append(i)
+                next_tokens.append(token)
+        if len(keep) == len(self._running):
+            self._next_tokens = torch.tensor(next_tokens, device=self.device).unsqueeze(-1)
+            return
+        if not keep:
+            self._reset()
+            return
+        index = torch.tensor(keep, device=self.device)
+        self._running = [self._running[i] for i in keep]
+        self._mask = self._mask.index_select(0, index)
+        self._cache = tuple(
+            (k.index_select(0, index), v.index_select(0, index)) for k, v in self._cache
+        )
+        self._next_tokens = torch.tensor(next_tokens, device=self.device).unsqueeze(-1)
+        # drop padding columns no remaining sequence attends to
+        offset = int((self._mask.cumsum(dim=1) == 0).sum(dim=1).min())
+        if offset > 0:
+            self._mask = self._mask[:, offset:]
+            self._cache = tuple((k[:, :, offset:], v[:, :, offset:]) for k, v in self._cache)
+
+    def _sample(self, logits: torch.Tensor, seq: Sequence) -> int:
+        params = seq.params
+        generation_config = self.model.generation_config
+        logits = logits.float()
+        if params.frequency_penalty and seq.generated:
+            counts = torch.bincount(
+                torch.tensor(seq.generated, device=logits.device), minlength=logits.size(-1)
+            )
+            logits = logits - params.frequency_penalty * counts[: logits.size(-1)]
+        temperature = params.temperature
+        if temperature is None:
+            temperature = generation_config.temperature if generation_config.do_sample else 0
+        if not temperature:
+            return int(logits.argmax())
+        probs = torch.softmax(logits / temperature, dim=-1)
+        top_p = params.top_p if params.top_p is not None else generation_config.top_p
+        if top_p is not None and top_p < 1.0:
+            sorted_probs, sorted_index = torch.sort(probs, descending=True)
+            outside = sorted_probs.cumsum(dim=-1) - sorted_probs > top_p
+            sorted_probs[outside] = 0
+            return int(sorted_index[torch.multinomial(sorted_probs, 1)])
+        return int(torch.multinomial(probs, 1))
+
+    def _emit(self, seq: Sequence, token: int) -> bool:
+        """Record a sampled token, returns True if the sequence is finished."""
+        if token in self.eos_token_ids:
+            self._finish(seq, finish_reason="stop")
+            return True
+        seq.generated.append(token)
+        if seq.streamer is not None:
+            seq.streamer.put(torch.tensor([token]))
+        if len(seq.generated) >= seq.params.max_new_tokens:
+            self._finish(seq, finish_reason="length")
+            return True
+        return False
+
+    def _finish(self, seq: Sequence, finish_reason: str | None = None, exc: Exception = None):
+        seq.finish_reason = finish_reason
+        if not seq.future.done():
+            try:
+                if exc is not None:
+                    seq.future.set_exception(exc)
+                else:
+                    seq.future.set_result(seq)
+            except Exception:
+                """Cancelled by the caller in the meantime"""
+        if seq.streamer is not None:
+            seq.streamer.end()
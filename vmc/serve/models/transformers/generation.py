@@ -1,6 +1,6 @@
+import asyncio
 import time
 import uuid
-from threading import Thread
 from typing import (
     AsyncGenerator,
     Iterable,
@@ -12,19 +12,21 @@ from typing import (
 import torch
 from loguru import logger
 from transformers import (
+    AsyncTextIteratorStreamer,
     AutoModel,
     AutoModelForCausalLM,
     AutoTokenizer,
     PreTrainedModel,
-    TextIteratorStreamer,
 )
 from typing_extensions import Literal
 
 from vmc.models.embedding import BaseEmbeddingModel
 from vmc.models.generation import BaseGenerationModel
 from vmc.models.utils import filter_notgiven
+from vmc.serve.executor import get_executor
 from vmc.types import NOT_GIVEN, NotGiven
 from vmc.types.embedding import EmbeddingDimensionResponse, EmbeddingResponse
+from vmc.types.errors import BadParamsError
 from vmc.types.generation.generation import (
     ChatCompletionMessage,
     Choice,
@@ -37,9 +39,15 @@ from vmc.types.generation.message_params import GenerationMessageParam
 from vmc.types.generation.tokenize import TokenizeOutput
 from vmc.types.pricing import Currency
 
+from .engine import ContinuousBatchingEngine, SamplingParams
+
 
 class GenerationConfig:
     max_tokens: int = 512
+    embedding_batch_size: int = 16
+
+
+AGG_ONE_WORD_TEMPLATE = 'This sentence : "{}" means in one word:"'
 
 
 class TransformerGeneration(BaseGenerationModel, BaseEmbeddingModel):
@@ -49,9 +57,19 @@ class TransformerGeneration(BaseGenerationModel, BaseEmbeddingModel):
         torch_dtype: Literal["float16", "float32", "float64", "bfloat16"] = "bfloat16",
         max_length: Optional[int] = None,
         device_map: Optional[bool] = None,
+        continuous_batching: bool = False,
+        max_batch_size: int = 16,
         *args,
         **kwargs,
     ):
+        """Local transformers chat model.
+
+        Args:
+            continuous_batching: Batch concurrent `generate`/`stream` calls into shared decode
+                steps. Only for models using the standard `DynamicCache`, not for remote-code
+                models with sliding-window, MLA or recurrent caches.
+            max_batch_size: Maximum number of sequences decoded together.
+        """
         super().__init__(*args, **kwargs)
         if torch.backends.mps.is_available():
             self.device = torch.device("mps")
@@ -80,6 +98,35 @@ class TransformerGeneration(BaseGenerationModel, BaseEmbeddingModel):
         if self.tokenizer.pad_token_id is None:
             self.tokenizer.pad_token_id = self.tokenizer.eos_token_id
         self.max_length = max_length
+        self.engine = None
+        if continuous_batching:
+            self.engine = ContinuousBatchingEngine(
+                self.model,
+                eos_token_id=self._eos_token_ids(),
+                max_batch_size=max_batch_size,
+            )
+
+    def _eos_token_ids(self) -> list[int]:
+        eos_token_id = self.model.generation_config.eos_token_id
+        if eos_token_id is None:
+            eos_token_id = []
+        elif isinstance(eos_token_id, int):
+            eos_token_id = [eos_token_id]
+        if self.tokenizer.eos_token_id is not None:
+            eos_token_id = [*eos_token_id, self.tokenizer.eos_token_id]
+        return list(set(eos_token_id))
+
+    def make_cost(self, prompt_tokens: int, completion_tokens: int) -> GenerationCost:
+        return GenerationCost(
+            currency=Currency.CNY,
+            multiplier=0,
+            prompt_tokens=prompt_tokens,
+            prompt_cost=0,
+            generated_tokens=completion_tokens,
+            generated_cost=0,
+            total_cost=0,
+            total_tokens=prompt_tokens + completion_tokens,
+        )
 
     def prepare_input(self, content: Union[str, Iterable[GenerationMessageParam]]):
         if isinstance(content, str):
@@ -108,28 +155,38 @@ class TransformerGeneration(BaseGenerationModel, BaseEmbeddingModel):
         created = time.time()
         inputs = self.prepare_input(content)
         input_ids = inputs["input_ids"]
-        if max_tokens is NOT_GIVEN:
+        if max_tokens is NOT_GIVEN or max_tokens is None:
             max_tokens = GenerationConfig.max_tokens
-        response_ids = self.model.generate(
-            **inputs.to(self.device),
-            **filter_notgiven(
-                frequency_penalty=frequency_penalty,
-                max_new_tokens=max_tokens,
-                temperature=temperature,
-                top_p=top_p,
-            ),
-        )
         if skip_special_tokens is NOT_GIVEN:
             skip_special_tokens = True
-        response_text = self.tokenizer.decode(
-            response_ids[0][len(input_ids[0]) :], skip_special_tokens=skip_special_tokens
-        )
-        prompt_tokens = input_ids.size(1)
-        completion_tokens = response_ids.size(1) - prompt_tokens
-        if max_tokens is not NOT_GIVEN and completion_tokens > max_tokens:
-            finish_reason = "length"
+        if self.engine is not None:
+            seq = self.engine.submit(
+                input_ids,
+                SamplingParams(
+                    max_new_tokens=max_tokens,
+                    **filter_notgiven(
+                        frequency_penalty=frequency_penalty, temperature=temperature, top_p=top_p
+                    ),
+                ),
+            )
+            await asyncio.wrap_future(seq.future)
+            response_text = self.tokenizer.decode(
+                seq.generated, skip_special_tokens=skip_special_tokens
+            )
+            prompt_tokens, completion_tokens = seq.prompt_tokens, seq.completion_tokens
+            finish_reason = seq.finish_reason
         else:
-            finish_reason = "stop"
+            response_ids = await get_executor().run(
+                self.model.generate,
+                **inputs.to(self.device),
+                **filter_notgiven(max_new_tokens=max_tokens, temperature=temperature, top_p=top_p),
+            )
+            response_text = self.tokenizer.decode(
+                response_ids[0][len(input_ids[0]) :], skip_special_tokens=skip_special_tokens
+            )
+            prompt_tokens = input_ids.size(1)
+            completion_tokens = response_ids.size(1) - prompt_tokens
+            finish_reason = "length" if completion_tokens >= max_tokens else "stop"
         return Generation(
             id=f"{self.config.name}-{str(uuid.uuid4())}",
             choices=[
@@ -142,16 +199,7 @@ class TransformerGeneration(BaseGenerationModel, BaseEmbeddingModel):
             created=created,
             generation_time=time.time() - created,
             model=self.model_id,
-            cost=GenerationCost(
-                currency=Currency.CNY,
-                multiplier=0,
-                prompt_tokens=prompt_tokens,
-                prompt_cost=0,
-                generated_tokens=completion_tokens,
-                generated_cost=0,
-                total_cost=0,
-                total_tokens=prompt_tokens + completion_tokens,
-            ),
+            cost=self.make_cost(prompt_tokens, completion_tokens),
         )
 
     async def stream(
@@ -168,61 +216,80 @@ class TransformerGeneration(BaseGenerationModel, BaseEmbeddingModel):
             logger.warning(f"{self.model_id} Unused kwargs: {kwargs}")
         created = time.time()
         inputs = self.prepare_input(content)
-        streamer = TextIteratorStreamer(
-            self.tokenizer,
-            skip_prompt=True,
-            skip_special_tokens=True,
-        )
-        generation_kwargs = {
-            **inputs.to(self.device),
-            **filter_notgiven(
-                frequency_penalty=frequency_penalty,
-                max_new_tokens=max_tokens,
-                temperature=temperature,
-                top_p=top_p,
-            ),
-            "streamer": streamer,
-        }
-        thread = Thread(target=self.model.generate, kwargs=generation_kwargs)
-        thread.start()
+        if max_tokens is NOT_GIVEN or max_tokens is None:
+            max_tokens = GenerationConfig.max_tokens
+        seq = None
+        if self.engine is not None:
+            streamer = AsyncTextIteratorStreamer(self.tokenizer, skip_special_tokens=True)
+            seq = self.engine.submit(
+                inputs["input_ids"],
+                SamplingParams(
+                    max_new_tokens=max_tokens,
+                    **filter_notgiven(
+                        frequency_penalty=frequency_penalty, temperature=temperature, top_p=top_p
+                    ),
+                ),
+                streamer=streamer,
+            )
+        else:
+            streamer = AsyncTextIteratorStreamer(
+                self.tokenizer,
+                skip_prompt=True,
+                skip_special_tokens=True,
+            )
+            generation_kwargs = {
+                **inputs.to(self.device),
+                **filter_notgiven(max_new_tokens=max_tokens, temperature=temperature, top_p=top_p),
+                "streamer": streamer,
+            }
+
+            def _generate():
+                try:
+                    self.model.generate(**generation_kwargs)
+                except Exception:
+                    streamer.end()
+                    raise
+
+            task = asyncio.ensure_future(get_executor().run(_generate))
         id = f"{self.config.name}-{str(uuid.uuid4())}"
 
-        for new_text in streamer:
-            yield GenerationChunk(
-                id=id,
-                choices=[
-                    ChunkChoice(
-                        delta=ChoiceDelta(role="assistant", content=new_text),
-                        index=0,
-                        finish_reason="stop",
-                    )
-                ],
-                created=created,
-                generation_time=time.time() - created,
-                model=self.model_id,
-            )
+        try:
+            async for new_text in streamer:
+                yield GenerationChunk(
+                    id=id,
+                    choices=[
+                        ChunkChoice(
+                            delta=ChoiceDelta(role="assistant", content=new_text),
+                            index=0,
+                            finish_reason=None,
+                        )
+                    ],
+                    created=created,
+                    generation_time=time.time() - created,
+                    model=self.model_id,
+                )
+        finally:
+            if seq is not None and not seq.future.done():
+                seq.abort()
+        finish_reason, completion_tokens = "stop", 0
+        if seq is None:
+            await task
+        else:
+            await asyncio.wrap_future(seq.future)
+            finish_reason, completion_tokens = seq.finish_reason, seq.completion_tokens
         yield GenerationChunk(
             id=id,
             choices=[
                 ChunkChoice(
                     delta=ChoiceDelta(role="assistant", content=""),
                     index=0,
-                    finish_reason="stop",
+                    finish_reason=finish_reason,
                 )
             ],
             created=created,
             generation_time=time.time() - created,
             model=self.model_id,
-            cost=GenerationCost(
-                currency=Currency.CNY,
-                multiplier=0,
-                prompt_tokens=inputs["input_ids"].size(1),
-                prompt_cost=0,
-                generated_tokens=0,
-                generated_cost=0,
-                total_cost=0,
-                total_tokens=0,
-            ),
+            cost=self.make_cost(inputs["input_ids"].size(1), completion_tokens),
         )
 
     async def tokenize(
@@ -233,34 +300,81 @@ class TransformerGeneration(BaseGenerationModel, BaseEmbeddingModel):
         tokens = self.prepare_input(content)["input_ids"]
         return TokenizeOutput(tokens=tokens, length=[len(tok) for tok in tokens])
 
+    def _last_hidden_state(self, inputs) -> torch.Tensor:
+        """Hidden states of the last layer, skipping the lm head when the model allows it."""
+        base_model = self.model.base_model
+        if base_model is not self.model:
+            outputs = base_model(**inputs)
+            if getattr(outputs, "last_hidden_state", None) is not None:
+                return outputs.last_hidden_state
+        return self.model(**inputs, output_hidden_states=True).hidden_states[-1]
+
+    @torch.no_grad()
+    def _embed(
+        self,
+        content: list[str],
+        embedding_method: Literal["weighted", "last", "average", "agg_one_word"],
+        batch_size: int,
+    ) -> list[list[float]]:
+        if embedding_method == "agg_one_word":
+            content = [AGG_ONE_WORD_TEMPLATE.format(text) for text in content]
+        """Embed the same input as `prepare_input`, each text as a user turn of the chat
+        template, so batching does not change the vectors"""
+        content = [
+            self.tokenizer.apply_chat_template(
+                [{"role": "user", "content": text}], tokenize=False, add_generation_prompt=True
+            )
+            for text in content
+        ]
+        embeddings = []
+        for i in range(0, len(content), batch_size):
+            inputs = self.tokenizer(
+                content[i : i + batch_size],
+                padding=True,
+                truncation=self.max_length is not None,
+                max_length=self.max_length,
+                add_special_tokens=False,
+                return_tensors="pt",
+            ).to(self.model.device)
+            hidden_states = self._last_hidden_state(inputs).float()
+            mask = inputs["attention_mask"]
+            if embedding_method in ("last", "agg_one_word"):
+                if self.tokenizer.padding_side == "left":
+                    pooled = hidden_states[:, -1]
+                else:
+                    last = mask.sum(dim=1) - 1
+                    pooled = hidden_states[torch.arange(mask.size(0)), last]
+            else:
+                if embedding_method == "weighted":
+                    """Position weighted mean (SGPT), later tokens have seen more context"""
+                    weights = mask.cumsum(dim=1) * mask
+                elif embedding_method == "average":
+                    weights = mask
+                else:
+                    raise BadParamsError(msg=f"Unknown embedding method: {embedding_method}")
+                weights = weights.unsqueeze(-1).float()
+                pooled = (hidden_states * weights).sum(dim=1) / weights.sum(dim=1).clamp(min=1)
+            embeddings.extend(pooled.cpu().tolist())
+        return embeddings
+
     async def embedding(
         self,
         content: Union[str, List[str], Iterable[int], Iterable[Iterable[int]]],
         embedding_method: Literal["weighted", "last", "average", "agg_one_word"] = "weighted",
+        batch_size: int | NotGiven = NOT_GIVEN,
         **kwargs,
-    ) -> Generation:
+    ) -> EmbeddingResponse:
         if kwargs:
             logger.warning(f"{self.model_id} Unused kwargs: {kwargs}")
         created = time.time()
         if isinstance(content, str):
             content = [content]
-        embeddings = []
-        for item in content:
-            inputs = self.prepare_input(item)
-            with torch.no_grad():
-                last_hidden_states = (
-                    self.model(
-                        **inputs.to(self.device),
-                        output_hidden_states=True,
-                    )
-                    .hidden_states[-1]
-                    .squeeze(0)
-                )
-            weights = torch.arange(1, last_hidden_states.size(0) + 1).cuda()
-            sum_embeddings = torch.sum(last_hidden_states * weights.unsqueeze(-1), dim=0)
-            num_tokens = weights.sum()
-            sentence_embedding = sum_embeddings / num_tokens
-            embeddings.append(sentence_embedding.tolist())
+        embeddings = await get_executor().run(
+            self._embed,
+            content,
+            embedding_method,
+            batch_size or GenerationConfig.embedding_batch_size,
+        )
         return EmbeddingResponse(
             created=created,
             embed_time=time.time() - created,
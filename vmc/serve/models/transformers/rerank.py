@@ -1,15 +1,34 @@
+import numpy as np
 import torch
 from sentence_transformers import CrossEncoder
 
 from vmc.models.rerank import BaseRerankModel
 from vmc.models.utils import filter_notgiven
+from vmc.serve.batching import MicroBatcher
+from vmc.serve.executor import get_executor
 from vmc.types._types import NOT_GIVEN, NotGiven
 from vmc.types.rerank import RerankOutput
 from vmc.utils.gpu import torch_gc
 
 
 class TransformerReranker(BaseRerankModel):
-    def __init__(self, *args, **kwargs):
+    def __init__(
+        self,
+        micro_batching: bool = True,
+        batch_wait_ms: float = 5,
+        max_batch_tokens: int = 32768,
+        max_batch_size: int = 512,
+        *args,
+        **kwargs,
+    ):
+        """Local cross-encoder reranker.
+
+        Args:
+            micro_batching: Merge pairs of concurrent requests into one `predict` call.
+            batch_wait_ms: How long the first request of a batch waits for others to join.
+            max_batch_tokens: Estimated token budget of a merged batch.
+            max_batch_size: Maximum number of pairs in a merged batch.
+        """
         super().__init__(*args, **kwargs)
         if torch.backends.mps.is_available():
             self.device = torch.device("mps")
@@ -18,6 +37,46 @@ class TransformerReranker(BaseRerankModel):
         else:
             self.device = torch.device("cpu")
         self.model = CrossEncoder(self.model_id, device=self.device)
+        self.batcher = None
+        if micro_batching:
+            self.batcher = MicroBatcher(
+                self._predict_batch,
+                name="rerank",
+                count_tokens=self._estimate_tokens,
+                max_wait=batch_wait_ms / 1000,
+                max_batch_tokens=max_batch_tokens,
+                max_batch_size=max_batch_size,
+            )
+
+    def _estimate_tokens(self, pair: list[str]) -> int:
+        """Upper bound of the token count, without running the tokenizer on the loop."""
+        length = sum(len(text) for text in pair)
+        if self.model.max_length:
+            return min(length, self.model.max_length)
+        return length
+
+    async def _predict_batch(
+        self, content: list[list[str]], options: list[tuple[tuple[bool, int | None], slice]]
+    ) -> np.ndarray:
+        """Score the pairs of several requests at once, in forward batches no larger than the
+        smallest `batch_size` asked by the merged requests."""
+        batch_sizes = [batch_size for (_, batch_size), _ in options if batch_size]
+        scores = await get_executor().run(
+            self.model.predict,
+            content,
+            apply_softmax=False,
+            convert_to_numpy=True,
+            **({"batch_size": min(batch_sizes)} if batch_sizes else {}),
+        )
+        torch_gc()
+        if scores.ndim > 1:
+            """Multi-label models, softmax over labels for the requests asking for it"""
+            for (apply_softmax, _), index in options:
+                if apply_softmax:
+                    logits = scores[index] - scores[index].max(axis=1, keepdims=True)
+                    probs = np.exp(logits)
+                    scores[index] = probs / probs.sum(axis=1, keepdims=True)
+        return scores
 
     async def rerank(
         self,
@@ -27,8 +86,17 @@ class TransformerReranker(BaseRerankModel):
         apply_softmax: bool | NotGiven = NOT_GIVEN,
         **kwargs,
     ):
-        scores = self.model.predict(
-            content, **filter_notgiven(batch_size=batch_size, apply_softmax=apply_softmax)
-        ).tolist()
-        torch_gc()
+        if self.batcher is not None:
+            scores = await self.batcher.submit(content, (bool(apply_softmax), batch_size or None))
+            return RerankOutput(scores=scores.tolist())
+        scores = await get_executor().run(
+            self._predict,
+            content,
+            **filter_notgiven(batch_size=batch_size, apply_softmax=apply_softmax),
+        )
         return RerankOutput(scores=scores)
+
+    def _predict(self, content: list[list[str]], **kwargs) -> list[float]:
+        scores = self.model.predict(content, **kwargs).tolist()
+        torch_gc()
+        return scores
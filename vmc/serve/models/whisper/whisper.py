@@ -1,8 +1,8 @@
 import torch
-from openai.types.audio.transcription_create_params import TranscriptionCreateParams
 from transformers import AutoModelForSpeechSeq2Seq, AutoProcessor
 
 from vmc.models.audio import BaseAudioModel
+from vmc.serve.executor import get_executor
 from vmc.types.audio import Transcription
 
 
@@ -31,5 +31,6 @@ class Whisper(BaseAudioModel):
             torch_dtype=torch.float16,
         )
 
-    def transcribe(self, req: TranscriptionCreateParams) -> Transcription:
-        return Transcription(text=self.pipeline(req["file"])["text"])
+    async def transcribe(self, file: str, **kwargs) -> Transcription:
+        res = await get_executor().run(self.pipeline, file)
+        return Transcription(text=res["text"])
@@ -1,3 +1,4 @@
+import asyncio
 import json
 import os
 from contextlib import asynccontextmanager
@@ -16,26 +17,33 @@ from vmc.exception import exception_handler
 from vmc.proxy import vmm
 from vmc.routes import openai, vmc
 from vmc.serve import SERVER_STARTED_MSG
+from vmc.serve.executor import get_executor
 from vmc.serve.vmm import init_serve_vmm
 from vmc.types.errors._base import VMCException
 from vmc.types.errors.message import ErrorMessage
 from vmc.types.errors.status_code import HTTP_CODE as s
 from vmc.types.errors.status_code import VMC_CODE as v
 from vmc.utils import get_version
+from vmc.utils.metrics import monitor_loop_lag
 
 API_KEY = os.getenv("SERVE_API_KEY")
+_background_tasks: set[asyncio.Task] = set()
 
 
 async def app_startup():
     await init_serve_vmm()
     init_storage()
     init_db()
+    _background_tasks.add(asyncio.create_task(monitor_loop_lag()))
 
 
 async def app_shutdown():
     name = os.getenv("SERVE_NAME")
     type = os.getenv("SERVE_TYPE")
+    for task in _background_tasks:
+        task.cancel()
     await vmm.offload(name, type=type)
+    get_executor().shutdown()
 
 
 async def on_startup():
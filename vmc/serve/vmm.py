@@ -34,6 +34,7 @@ async def init_vmm_from_transformers(
     model_type: str,
     backend: str,
     device_map_auto: bool,
+    continuous_batching: bool,
 ):
     model_class = {
         "chat": "TransformerGeneration",
@@ -45,6 +46,7 @@ async def init_vmm_from_transformers(
         init_kwargs["backend"] = backend
     if model_type == "chat":
         init_kwargs["device_map"] = "auto" if device_map_auto else None
+        init_kwargs["continuous_batching"] = continuous_batching
     model_config = ModelConfig(
         name=name,
         model_class=model_class,
@@ -126,6 +128,7 @@ async def init_serve_vmm():
         "backend": os.getenv("SERVE_BACKEND", "torch"),
         "method": os.getenv("SERVE_METHOD", "config"),
         "device_map_auto": os.getenv("SERVE_DEVICE_MAP_AUTO", "False").lower() == "true",
+        "continuous_batching": os.getenv("SERVE_CONTINUOUS_BATCHING", "False").lower() == "true",
         "hf_cache_dir": os.getenv("VMC_HF_CACHE_DIR"),
         "hf_token_dir": os.getenv("VMC_HF_TOKEN_DIR"),
     }
@@ -139,4 +142,7 @@ async def init_serve_vmm():
     required_args = list(inspect.signature(init_method).parameters.keys())
     args = {k: v for k, v in init_args.items() if k in required_args}
     assert len(args) == len(required_args), f"Missing required arguments: {required_args}"
-    init_vmm(await init_method(**args))
+    vmm = await init_method(**args)
+    """The model is loaded once the init method returns, `/ready` reports it"""
+    vmm.ready = True
+    init_vmm(vmm)
@@ -5,6 +5,7 @@ from .errors import (
     BadParamsError,
     BadResponseError,
     BillLimitError,
+    CircuitOpenError,
     GroupExistsError,
     GroupNotFoundError,
     IncorrectAPIKeyError,
@@ -14,6 +15,8 @@ from .errors import (
     ModelLoadError,
     ModelNotFoundError,
     ModelNotStartedError,
+    OverloadedError,
+    PermissionDeniedError,
     RateLimitError,
     ServeError,
     VMCException,
@@ -43,4 +46,7 @@ __all__ = [
     "GroupNotFoundError",
     "VMC_CODE",
     "ServeError",
+    "CircuitOpenError",
+    "OverloadedError",
+    "PermissionDeniedError",
 ]
@@ -15,6 +15,19 @@ class AuthenticationError(VMCException):
         super().__init__(http_code, vmc_code=vmc_code, msg=msg, **kwargs)
 
 
+class PermissionDeniedError(VMCException):
+    """PermissionDeniedError: Exception for an authenticated user lacking the required role"""
+
+    def __init__(
+        self,
+        http_code: int = HTTP_CODE.FORBIDDEN,
+        vmc_code: int = VMC_CODE.FORBIDDEN,
+        msg: str = "Permission Denied",
+        **kwargs,
+    ):
+        super().__init__(http_code, vmc_code=vmc_code, msg=msg, **kwargs)
+
+
 class ModelNotFoundError(VMCException):
     """ModelNotFoundError: Exception for model not found"""
 
@@ -209,3 +222,29 @@ class ServeError(VMCException):
         **kwargs,
     ):
         super().__init__(http_code, vmc_code=vmc_code, msg=msg, **kwargs)
+
+
+class CircuitOpenError(VMCException):
+    """CircuitOpenError: Exception for a model or credential whose circuit breaker is open"""
+
+    def __init__(
+        self,
+        http_code: int = HTTP_CODE.CIRCUIT_OPEN,
+        vmc_code: int = VMC_CODE.CIRCUIT_OPEN,
+        msg: str = "Circuit Open",
+        **kwargs,
+    ):
+        super().__init__(http_code, vmc_code=vmc_code, msg=msg, **kwargs)
+
+
+class OverloadedError(VMCException):
+    """OverloadedError: Exception for a call shed because its model is at capacity"""
+
+    def __init__(
+        self,
+        http_code: int = HTTP_CODE.OVERLOADED,
+        vmc_code: int = VMC_CODE.OVERLOADED,
+        msg: str = "Overloaded",
+        **kwargs,
+    ):
+        super().__init__(http_code, vmc_code=vmc_code, msg=msg, **kwargs)
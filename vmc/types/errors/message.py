@@ -1,6 +1,19 @@
+import math
+
+import pydantic
+from fastapi.responses import JSONResponse
+
 from .._base import BaseOutput
 
 
 class ErrorMessage(BaseOutput):
     code: int = 500
     msg: str = "failed"
+    retry_after: float | None = pydantic.Field(default=None, exclude=True)
+    """Seconds sent in the `Retry-After` header, for rate limited or overloaded calls"""
+
+    def to_response(self) -> JSONResponse:
+        response = super().to_response()
+        if self.retry_after is not None:
+            response.headers["Retry-After"] = str(math.ceil(self.retry_after))
+        return response
@@ -2,6 +2,7 @@ class HTTP_CODE:
     SUCCESS = 200
     BAD_REQUEST = 400
     UNAUTHORIZED = 401
+    FORBIDDEN = 403
     MODEL_NOT_FOUND = 404
     BAD_PARAMS = 422
     API_RATE_LIMIT = 429
@@ -17,6 +18,9 @@ class HTTP_CODE:
     MODEL_LOAD_ERROR = 503
     MODEL_STOP_ERROR = 503
     MODEL_LIST_ERROR = 503
+    CIRCUIT_OPEN = 503
+    NOT_READY = 503
+    OVERLOADED = 503
 
 
 class VMC_CODE:
@@ -30,6 +34,7 @@ class VMC_CODE:
     API_CONNECTION_ERROR = 100006
     API_TIMEOUT = 100007
     BAD_RESPONSE = 100008
+    FORBIDDEN = 100009
     # model related
     MODEL_NOT_FOUND = 200001
     MODEL_NOT_STARTED = 200002
@@ -38,6 +43,9 @@ class VMC_CODE:
     GROUP_ALREADY_EXISTS = 200005
     MODEL_LOAD_ERROR = 200006
     MODEL_STOP_ERROR = 200007
+    CIRCUIT_OPEN = 200008
+    NOT_READY = 200009
+    OVERLOADED = 200010
 
     # internal error
     INTERNAL_ERROR = 300001
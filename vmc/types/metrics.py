@@ -0,0 +1,11 @@
+from typing import Any
+
+from ._base import BaseOutput
+
+
+class MetricsOutput(BaseOutput):
+    metrics: dict[str, Any]
+
+
+class CircuitsOutput(BaseOutput):
+    circuits: dict[str, Any]
@@ -10,6 +10,102 @@ class BaseModel(pydantic.BaseModel):
     model_config = pydantic.ConfigDict(protected_namespaces=())
 
 
+class HealthCheckConfig(BaseModel):
+    interval: float = 10
+    """Seconds between background probes of local models, 0 disables probing"""
+
+    timeout: float = 5
+    failure_threshold: int = 3
+    """Consecutive failed probes or requests before the model is marked down"""
+
+    success_threshold: int = 1
+    """Consecutive successful probes or requests before the model is marked up again"""
+
+
+class RateLimitConfig(BaseModel):
+    requests: int = 0
+    """Requests allowed per `period`, 0 means no limit"""
+
+    period: float = 60
+    """Period of `requests` in seconds"""
+
+    tpm: int = 0
+    """Tokens (prompt and max completion) allowed per minute, 0 means no limit"""
+
+
+class CircuitBreakerConfig(BaseModel):
+    enabled: bool = True
+    window: int = 20
+    """Number of recent calls the error and slow call rates are computed over"""
+
+    min_requests: int = 10
+    """Calls in the window before the rates are trusted"""
+
+    error_rate: float = 0.5
+    """Rate of timeouts, connection and server errors that opens the circuit"""
+
+    slow_call_duration: float = 300
+    """Seconds after which a call, or the first chunk of a stream, counts as slow"""
+
+    slow_call_rate: float = 0.8
+    """Rate of slow calls that opens the circuit"""
+
+    open_duration: float = 30
+    """Seconds the circuit stays open before trial calls are let through"""
+
+    half_open_max_calls: int = 1
+    """Trial calls in flight while half-open, all of them must succeed to close the circuit"""
+
+
+class AdmissionConfig(BaseModel):
+    max_concurrency: int = 0
+    """Calls of the model in flight at once, 0 means no limit"""
+
+    max_queue: int = 100
+    """Calls waiting for a slot, further calls are rejected at once"""
+
+    max_queue_time: float = 30
+    """Seconds a call may wait for a slot before it is rejected"""
+
+    adaptive: bool = False
+    """Adjust the limit from the outcome of calls, between `min_concurrency` and
+    `max_concurrency`, see `vmc.utils.concurrency.AdaptiveLimit`"""
+
+    min_concurrency: int = 1
+    """Lower bound and starting point of the adaptive limit"""
+
+    backoff_ratio: float = 0.9
+    """Factor applied to the adaptive limit on a rate limit error, a timeout or a slow call"""
+
+    latency_tolerance: float = 2.0
+    """A call slower than this times the usual latency backs the adaptive limit off, 0 only
+    backs off on errors"""
+
+
+class EvictionConfig(BaseModel):
+    idle_timeout: float = 0
+    """Seconds a local model may stay unused before it is stopped, 0 keeps idle models loaded"""
+
+    memory_budget: float = 0
+    """Memory in GB the loaded local models may use together, 0 means no budget. The least
+    recently used models are stopped to make room, see `ModelConfig.memory`."""
+
+    interval: float = 30
+    """Seconds between checks for idle models"""
+
+
+class PreloadConfig(BaseModel):
+    models: list[str] = []
+    """Model ids, `type/name`, loaded concurrently at startup"""
+
+    warmup: bool = False
+    """Send a small request through each preloaded model before reporting ready"""
+
+    warmup_content: str = "Hello"
+    timeout: float = 600
+    """Seconds allowed to load and warm up a model, a model failing in time is left cold"""
+
+
 class ModelConfig(BaseModel):
     name: str
     model_class: str
@@ -37,6 +133,32 @@ class ModelConfig(BaseModel):
     device_map_auto: bool = False
     """Local model device map auto"""
 
+    continuous_batching: bool = False
+    """Batch the concurrent generations of a local transformers chat model into shared decode
+    steps, for models using the standard kv cache"""
+
+    memory: float = 0
+    """GPU or host memory in GB the local model needs, counted against the eviction budget"""
+
+    pinned: bool = False
+    """Never evict the local model, for hot models"""
+
+    health_check: HealthCheckConfig = HealthCheckConfig()
+    """Health tracking of the loaded model"""
+
+    rate_limit: RateLimitConfig | None = None
+    """Rate limit of the model, shared by all its credentials. A credential can set its own
+    limits with a `rate_limit` mapping of the same fields."""
+
+    circuit_breaker: CircuitBreakerConfig = CircuitBreakerConfig()
+    """Circuit breaker of the model. Every credential has its own breaker too, configured by a
+    `circuit_breaker` mapping of the same fields or else by this one."""
+
+    admission: AdmissionConfig = AdmissionConfig()
+    """Concurrency limit and wait queue of the model, overload is rejected with a `Retry-After`.
+    With `adaptive`, every credential has its own adaptive limit too, configured by an
+    `admission` mapping of the same fields or else by this one."""
+
     def dump(self):
         d = self.model_dump()
         d.pop("init_kwargs")
@@ -76,6 +198,12 @@ class Providers(BaseModel):
     providers: list[ProviderConfig]
     """模型提供商配置"""
 
+    eviction: EvictionConfig = EvictionConfig()
+    """Eviction of idle and least recently used local models"""
+
+    preload: PreloadConfig = PreloadConfig()
+    """Models loaded and warmed up at startup"""
+
     @classmethod
     def from_yaml(cls, path: str | None):
         import pathlib
@@ -90,6 +218,8 @@ class Providers(BaseModel):
             providers = yaml.safe_load(f)
             assert isinstance(providers, dict), "providers config should be a dict"
             assert "providers" in providers, "providers key is required"
+            eviction = providers.get("eviction") or {}
+            preload = providers.get("preload") or {}
             providers = providers["providers"]
 
         for i in range(len(providers)):
@@ -108,4 +238,4 @@ class Providers(BaseModel):
                                 cache_model_path,
                                 model.init_kwargs["model_id"],
                             )
-        return cls(providers=providers)
+        return cls(providers=providers, eviction=eviction, preload=preload)
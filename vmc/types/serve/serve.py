@@ -2,7 +2,8 @@ from .._base import BaseModel, BaseOutput
 
 
 class ServeResponse(BaseOutput):
-    port: int
+    port: int | None = None
+    uds: str | None = None
     pid: int
 
 
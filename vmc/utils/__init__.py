@@ -2,7 +2,7 @@ from .gpu import get_freer_gpus, torch_gc
 from .hash import sha256
 from .objproxy import LazyObjProxy
 from .port import find_available_port
-from .proxy import use_proxy
+from .proxy import get_proxy, use_proxy
 from .version import get_version
 
 __all__ = [
@@ -10,6 +10,7 @@ __all__ = [
     "sha256",
     "torch_gc",
     "LazyObjProxy",
+    "get_proxy",
     "use_proxy",
     "find_available_port",
     "get_version",
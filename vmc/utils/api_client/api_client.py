@@ -1,5 +1,7 @@
+import asyncio
 import inspect
 import json
+import weakref
 from typing import TYPE_CHECKING, AsyncGenerator, Dict, Type, TypeVar, Union, cast
 
 import anyio
@@ -13,10 +15,12 @@ from vmc.types.errors import (
     APIConnectionError,
     APITimeoutError,
     BadResponseError,
+    RateLimitError,
     VMCException,
 )
 
 from ._constants import (
+    DEFAULT_CONNECTION_LIMITS,
     DEFAULT_MAX_RETRIES,
     DEFAULT_TIMEOUT,
     INITIAL_RETRY_DELAY,
@@ -39,7 +43,16 @@ ResponseT = TypeVar(
 
 
 class AsyncAPIClient:
-    _client: httpx.AsyncClient
+    """Async http client with retries and keep-alive connection pooling.
+
+    Pooled connections are bound to the event loop that opened them, so one `httpx.AsyncClient`
+    is kept per running loop. A client instance can therefore be shared by code that calls
+    `asyncio.run` several times, or by several threads running their own loops.
+
+    With `uds`, requests go over that Unix domain socket and the host of `base_url` is only
+    sent as the `Host` header.
+    """
+
     max_retries: int
     auth_headers: dict
 
@@ -51,10 +64,47 @@ class AsyncAPIClient:
         timeout: httpx.Timeout = DEFAULT_TIMEOUT,
         proxies: Union[None, httpx._types.ProxyTypes] = None,
         auth_headers: Union[None, Dict] = None,
+        limits: httpx.Limits = DEFAULT_CONNECTION_LIMITS,
+        http2: bool = False,
+        uds: str | None = None,
     ):
-        self._client = httpx.AsyncClient(base_url=base_url, timeout=timeout, proxies=proxies)
+        self.base_url = base_url
+        self.timeout = timeout
+        self.proxies = proxies
+        self.limits = limits
+        self.http2 = http2
+        self.uds = uds
         self.max_retries = max_retries
         self.auth_headers = auth_headers or {}
+        self._clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    @property
+    def _client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                proxies=self.proxies,
+                limits=self.limits,
+                http2=self.http2,
+                transport=(
+                    httpx.AsyncHTTPTransport(uds=self.uds, limits=self.limits, http2=self.http2)
+                    if self.uds
+                    else None
+                ),
+            )
+            self._clients[loop] = client
+        return client
+
+    async def close(self):
+        """Close the connection pool of the running event loop."""
+        client = self._clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
 
     async def get_auth_headers(self) -> dict:
         return self.auth_headers
@@ -79,8 +129,6 @@ class AsyncAPIClient:
             headers["Content-Type"] = "application/json; charset=utf-8"
         # if options.files is not None or options.data is not None and content_type is None:
         #     headers["Content-Type"] = "multipart/form-data"
-        # httpx uses connection pooling, uncompatible with asyncio
-        headers["Connection"] = "close"
         kwargs = {}
         if options.timeout is not None:
             kwargs["timeout"] = options.timeout
@@ -101,8 +149,13 @@ class AsyncAPIClient:
             body = json.loads(text)
             if "code" not in body:
                 raise ValueError("No code in response")
-        except Exception as e:
-            raise BadResponseError(msg=str(e), context={"response": text}) from e
+        except Exception as exc:
+            if isinstance(e, httpx.HTTPStatusError) and e.response.status_code == 429:
+                """Rate limited by a server that does not speak vmc, e.g. an overloaded TEI"""
+                raise RateLimitError(
+                    msg=text, retry_after=e.response.headers.get("retry-after")
+                ) from e
+            raise BadResponseError(msg=str(exc), context={"response": text}) from exc
         if body["code"] == VMC_CODE.API_TIMEOUT:
             raise APITimeoutError(context=body) from e
         if body["code"] == VMC_CODE.API_CONNECTION_ERROR:
@@ -178,6 +231,9 @@ class AsyncAPIClient:
         try:
             response.raise_for_status()
         except httpx.HTTPStatusError as e:
+            if options.stream:
+                await response.aread()
+                await response.aclose()
             logger.debug(f"Request failed: {e}, {response.text}")
             if retries > 0 and self._should_retry(response):
                 return await self._retry_request(cast_to, options, retries)
@@ -196,27 +252,32 @@ class AsyncAPIClient:
         else:
 
             async def streaming():
-                async for chunk in response.aiter_lines():
-                    if not chunk:
-                        continue
-                    if options.raw_response:
-                        yield cast(ResponseT, chunk)
-                    else:
-                        if not chunk.startswith(options.stream_prefix):
-                            raise BadResponseError(
-                                msg="Invalid stream prefix",
-                                context={"response": chunk},
-                            )
-                        data = chunk[len(options.stream_prefix) :]
-                        self._raise_api_exception_from_text(data)
-                        try:
-                            if inspect.isclass(cast_to) and issubclass(cast_to, pydantic.BaseModel):
-                                yield cast(ResponseT, cast_to.model_validate(json.loads(data)))
-                            else:
-                                yield cast(ResponseT, json.loads(data))
-                        except Exception as e:
-                            logger.error(f"Encountered Bad Response: {data}")
-                            raise BadResponseError(str(e), context={"response": data})
+                try:
+                    async for chunk in response.aiter_lines():
+                        if not chunk:
+                            continue
+                        if options.raw_response:
+                            yield cast(ResponseT, chunk)
+                        else:
+                            if not chunk.startswith(options.stream_prefix):
+                                raise BadResponseError(
+                                    msg="Invalid stream prefix",
+                                    context={"response": chunk},
+                                )
+                            data = chunk[len(options.stream_prefix) :]
+                            self._raise_api_exception_from_text(data)
+                            try:
+                                if inspect.isclass(cast_to) and issubclass(
+                                    cast_to, pydantic.BaseModel
+                                ):
+                                    yield cast(ResponseT, cast_to.model_validate(json.loads(data)))
+                                else:
+                                    yield cast(ResponseT, json.loads(data))
+                            except Exception as e:
+                                logger.error(f"Encountered Bad Response: {data}")
+                                raise BadResponseError(str(e), context={"response": data})
+                finally:
+                    await response.aclose()
 
             return streaming()
 
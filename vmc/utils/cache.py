@@ -0,0 +1,63 @@
+import time
+from collections import OrderedDict
+from typing import Callable, Generic, Hashable, TypeVar
+
+from vmc.utils.metrics import metrics
+
+_K = TypeVar("_K", bound=Hashable)
+_V = TypeVar("_V")
+
+
+class TTLCache(Generic[_K, _V]):
+    """In-process cache of at most `maxsize` entries, each kept for `ttl` seconds.
+
+    The least recently used entry is dropped when the cache is full. Hits and misses are counted
+    as `{name}_cache_hits_total` and `{name}_cache_misses_total`. A `ttl` or `maxsize` of 0
+    disables the cache.
+    """
+
+    def __init__(self, name: str, maxsize: int = 1024, ttl: float = 60):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[_K, tuple[float, _V]] = OrderedDict()
+        self._hits = metrics.counter(f"{name}_cache_hits_total")
+        self._misses = metrics.counter(f"{name}_cache_misses_total")
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.maxsize > 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: _K) -> _V | None:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self._misses.inc()
+            return None
+        self._entries.move_to_end(key)
+        self._hits.inc()
+        return entry[1]
+
+    def set(self, key: _K, value: _V):
+        if not self.enabled:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def pop(self, key: _K) -> _V | None:
+        entry = self._entries.pop(key, None)
+        return entry[1] if entry is not None else None
+
+    def invalidate(self, predicate: Callable[[_K, _V], bool]):
+        """Drop the entries matching `predicate`."""
+        for key in [k for k, (_, v) in self._entries.items() if predicate(k, v)]:
+            del self._entries[key]
+
+    def clear(self):
+        self._entries.clear()
@@ -0,0 +1,154 @@
+import time
+from collections import deque
+from typing import Literal
+
+from loguru import logger
+
+from vmc.exception import classify
+from vmc.types.model_config import CircuitBreakerConfig
+from vmc.utils.metrics import metrics
+from vmc.utils.stream import ObservedStream
+
+CircuitState = Literal["closed", "open", "half_open"]
+
+FAILURES = {"timeout", "connection", "server"}
+"""Error classes that count against a circuit, see `vmc.exception.classify`. Client errors are
+the caller's fault and count as successes, rate limits and unknown errors are not counted."""
+
+
+class CircuitBreaker:
+    """Closed, open and half-open circuit breaker of an upstream.
+
+    While closed every call is allowed and the outcome of the last `window` calls is kept. Once
+    `min_requests` outcomes are known, the circuit opens when the error rate or the slow call rate
+    reaches its threshold. While open every call is rejected, so callers fail fast or go
+    elsewhere instead of waiting for a timeout. After `open_duration` seconds the circuit is
+    half-open and lets `half_open_max_calls` trial calls through: it closes when they all succeed
+    and opens again on the first failure.
+    """
+
+    def __init__(self, name: str, config: CircuitBreakerConfig | None = None):
+        self.name = name
+        self.config = config or CircuitBreakerConfig()
+        self.state: CircuitState = "closed"
+        self.last_change = time.time()
+        self._opened_at = 0.0
+        self._outcomes: deque[tuple[bool, bool]] = deque(maxlen=self.config.window)
+        """(failed, slow) of the recent calls while closed"""
+        self._trials = 0
+        self._trial_successes = 0
+
+    def _expired(self) -> bool:
+        return time.monotonic() - self._opened_at >= self.config.open_duration
+
+    @property
+    def available(self) -> bool:
+        """Whether a call would be allowed now, without taking a half-open trial permit."""
+        if not self.config.enabled or self.state == "closed":
+            return True
+        if self.state == "open":
+            return self._expired()
+        return self._trials < self.config.half_open_max_calls
+
+    def allow(self) -> bool:
+        """Admit a call, a call allowed while half-open takes a trial permit until recorded."""
+        if not self.config.enabled or self.state == "closed":
+            return True
+        if self.state == "open":
+            if not self._expired():
+                metrics.counter("circuit_rejected_total").inc()
+                return False
+            self._set("half_open")
+        if self._trials >= self.config.half_open_max_calls:
+            metrics.counter("circuit_rejected_total").inc()
+            return False
+        self._trials += 1
+        return True
+
+    def retry_after(self) -> float:
+        """Seconds until the circuit lets a call through again."""
+        if self.state != "open":
+            return 0.0
+        return max(self.config.open_duration - (time.monotonic() - self._opened_at), 0.0)
+
+    def record(self, error: BaseException | None, duration: float):
+        """Record the outcome of an allowed call, `error` is None on success."""
+        if not self.config.enabled:
+            return
+        kind = classify(error) if error is not None else None
+        if kind is not None and kind not in FAILURES and kind != "client":
+            self.release()
+            return
+        failed = kind in FAILURES
+        slow = not failed and duration >= self.config.slow_call_duration
+        if self.state == "half_open":
+            self._trials = max(self._trials - 1, 0)
+            if failed or slow:
+                self._open()
+                return
+            self._trial_successes += 1
+            if self._trial_successes >= self.config.half_open_max_calls:
+                self._set("closed")
+            return
+        if self.state == "open":
+            return
+        self._outcomes.append((failed, slow))
+        if len(self._outcomes) < self.config.min_requests:
+            return
+        errors = sum(f for f, _ in self._outcomes) / len(self._outcomes)
+        slows = sum(s for _, s in self._outcomes) / len(self._outcomes)
+        if errors >= self.config.error_rate or slows >= self.config.slow_call_rate:
+            self._open()
+
+    def release(self):
+        """Give back the trial permit of a call that ended without an outcome, e.g. cancelled."""
+        if self.state == "half_open":
+            self._trials = max(self._trials - 1, 0)
+
+    def guard(self, stream, started: float) -> ObservedStream:
+        """Record the outcome of a stream at its first chunk, or at its end if it fails before.
+        A stream closed or dropped before any outcome gives its trial permit back."""
+        recorded = False
+
+        def record(error: BaseException | None = None):
+            nonlocal recorded
+            if not recorded:
+                recorded = True
+                self.record(error, time.monotonic() - started)
+
+        def close():
+            if not recorded:
+                self.release()
+
+        return ObservedStream(
+            stream, on_chunk=lambda _: record(), on_end=record, on_error=record, on_close=close
+        )
+
+    def reset(self):
+        self._set("closed")
+
+    def _open(self):
+        self._opened_at = time.monotonic()
+        self._set("open")
+        metrics.counter("circuit_open_total").inc()
+
+    def _set(self, state: CircuitState):
+        if state == self.state:
+            return
+        logger.warning(f"Circuit of {self.name} is now {state}")
+        self.state = state
+        self.last_change = time.time()
+        self._trials = 0
+        self._trial_successes = 0
+        if state == "closed":
+            self._outcomes.clear()
+
+    def dump(self) -> dict:
+        return {
+            "state": self.state,
+            "last_change": self.last_change,
+            "retry_after": self.retry_after(),
+            "window": len(self._outcomes),
+            "errors": sum(f for f, _ in self._outcomes),
+            "slow_calls": sum(s for _, s in self._outcomes),
+        }
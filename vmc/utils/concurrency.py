@@ -0,0 +1,82 @@
+import time
+
+from vmc.exception import classify
+from vmc.types.model_config import AdmissionConfig
+from vmc.utils.metrics import metrics
+
+DROPS = {"rate_limit", "timeout"}
+"""Error classes that mean the upstream is past its capacity, see `vmc.exception.classify`"""
+
+
+class AdaptiveLimit:
+    """AIMD concurrency limit of an upstream, in the spirit of Netflix's concurrency-limits.
+
+    The limit starts at `min_limit` and grows by one every `limit` successful calls made while
+    at least half of it was in use, up to `max_limit`. It is multiplied by `backoff_ratio` on a
+    drop: a rate limit error, a timeout, or a call slower than `latency_tolerance` times the
+    usual latency. Drops of calls started before the last decrease are ignored, so a burst of
+    errors from the same window backs off only once.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        min_limit: int = 1,
+        max_limit: int = 100,
+        backoff_ratio: float = 0.9,
+        latency_tolerance: float = 2.0,
+    ):
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max(max_limit, min_limit)
+        self.backoff_ratio = backoff_ratio
+        self.latency_tolerance = latency_tolerance
+        self.limit = float(self.min_limit)
+        self.baseline: float | None = None
+        """Long term average latency of successful calls"""
+        self._decreased_at = 0.0
+
+    @classmethod
+    def from_config(cls, name: str, config: AdmissionConfig) -> "AdaptiveLimit | None":
+        """The adaptive limit configured by `config`, None unless it is adaptive and bounded."""
+        if not config.adaptive or config.max_concurrency <= 0:
+            return None
+        return cls(
+            name,
+            min_limit=config.min_concurrency,
+            max_limit=config.max_concurrency,
+            backoff_ratio=config.backoff_ratio,
+            latency_tolerance=config.latency_tolerance,
+        )
+
+    def __int__(self):
+        return int(self.limit)
+
+    def record(self, error: BaseException | None, latency: float, inflight: int):
+        """Adjust the limit after a call that took `latency` seconds with `inflight` calls."""
+        kind = classify(error) if error is not None else None
+        if kind is not None and kind not in DROPS:
+            return
+        slow = (
+            kind is None
+            and self.latency_tolerance > 0
+            and self.baseline is not None
+            and latency > self.latency_tolerance * self.baseline
+        )
+        if kind is None:
+            self.baseline = (
+                latency
+                if self.baseline is None
+                else self.baseline + 0.05 * (latency - self.baseline)
+            )
+        if kind in DROPS or slow:
+            if time.monotonic() - latency < self._decreased_at:
+                return
+            self._decreased_at = time.monotonic()
+            self.limit = max(self.limit * self.backoff_ratio, self.min_limit)
+            metrics.counter("adaptive_limit_decreases_total").inc()
+        elif inflight * 2 >= self.limit:
+            self.limit = min(self.limit + 1 / self.limit, self.max_limit)
+
+    def dump(self) -> dict:
+        return {"limit": int(self), "latency_baseline": self.baseline}
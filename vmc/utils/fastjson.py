@@ -0,0 +1,39 @@
+import os
+
+import numpy as np
+import orjson
+import pydantic
+import pydantic_core
+from fastapi.responses import JSONResponse
+
+FAST_JSON = os.getenv("VMC_FAST_JSON", "").lower() in ("1", "true", "yes")
+"""Serialize route responses with `dumps` instead of `jsonable_encoder` and `json.dumps`, see
+`benchmarks/serialization.py`"""
+
+OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def _default(obj):
+    if isinstance(obj, pydantic.BaseModel):
+        return obj.model_dump()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj) -> bytes:
+    """JSON of `obj`, which may hold pydantic models and numpy arrays or scalars.
+
+    A pydantic model is serialized by pydantic-core, as fast as orjson for models and honouring
+    their serialization settings, anything else by orjson.
+    """
+    if isinstance(obj, pydantic.BaseModel):
+        return pydantic_core.to_json(obj)
+    return orjson.dumps(obj, default=_default, option=OPTIONS)
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return dumps(content)
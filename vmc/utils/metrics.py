@@ -0,0 +1,123 @@
+import asyncio
+import bisect
+import threading
+from typing import Iterable
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Counter:
+    def __init__(self):
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self):
+        return self._value
+
+    def snapshot(self):
+        return self._value
+
+
+class Gauge:
+    def __init__(self):
+        self._value = 0
+
+    def set(self, value: float):
+        self._value = value
+
+    @property
+    def value(self):
+        return self._value
+
+    def snapshot(self):
+        return self._value
+
+
+class Histogram:
+    """Cumulative histogram with fixed upper bounds, in the style of prometheus."""
+
+    def __init__(self, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self._counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._sum += value
+            self._count += 1
+            self._max = max(self._max, value)
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    @property
+    def mean(self) -> float:
+        return self._sum / self._count if self._count else 0.0
+
+    def snapshot(self):
+        cumulative, buckets = 0, {}
+        for bound, count in zip([*self.buckets, float("inf")], self._counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        return {
+            "count": self._count,
+            "sum": self._sum,
+            "mean": self.mean,
+            "max": self._max,
+            "buckets": buckets,
+        }
+
+
+class MetricsRegistry:
+    """Process wide metrics, exposed by the `/metrics` route."""
+
+    def __init__(self):
+        self._metrics: dict[str, Counter | Gauge | Histogram] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, name: str, factory):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = factory()
+            return self._metrics[name]
+
+    def counter(self, name: str) -> Counter:
+        return self._get_or_create(name, Counter)
+
+    def gauge(self, name: str) -> Gauge:
+        return self._get_or_create(name, Gauge)
+
+    def histogram(self, name: str, buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(name, lambda: Histogram(buckets))
+
+    def snapshot(self) -> dict:
+        return {name: metric.snapshot() for name, metric in sorted(self._metrics.items())}
+
+
+metrics = MetricsRegistry()
+
+
+async def monitor_loop_lag(interval: float = 0.5, name: str = "event_loop_lag_seconds"):
+    """Measure how late the event loop wakes up from a sleep.
+
+    A responsive loop wakes up almost on time; blocking calls on the loop thread show up as lag.
+    """
+    loop = asyncio.get_running_loop()
+    histogram = metrics.histogram(name)
+    gauge = metrics.gauge(f"{name}_last")
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - start - interval)
+        histogram.observe(lag)
+        gauge.set(lag)
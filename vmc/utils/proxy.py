@@ -2,14 +2,31 @@ import os
 import warnings
 
 
+def get_proxy() -> str | None:
+    """Upstream proxy configured by `_HTTPS_PROXY` (or `_HTTP_PROXY`), for models initialized
+    with `use_proxy=True`. The proxy is passed to each client, the process environment is left
+    alone."""
+    return os.getenv("_HTTPS_PROXY") or os.getenv("_HTTP_PROXY")
+
+
 class use_proxy:
+    """Deprecated, pass `get_proxy()` to the client instead.
+
+    Sets `http_proxy` and `https_proxy` for the whole process while in the block, so concurrent
+    requests that should not go through the proxy do.
+    """
+
     def __enter__(self):
+        warnings.warn(
+            "use_proxy is deprecated, pass get_proxy() to the client instead",
+            DeprecationWarning,
+            stacklevel=2,
+        )
         if os.getenv("http_proxy") or os.getenv("https_proxy"):
             warnings.warn("http_proxy or https_proxy already set, overriding")
-        os.environ["http_proxy"] = os.getenv("_HTTP_PROXY")
-        os.environ["https_proxy"] = os.getenv("_HTTP_PROXY")
+        os.environ["http_proxy"] = os.environ["https_proxy"] = get_proxy() or ""
         return self
 
     def __exit__(self, *args):
-        os.environ.pop("http_proxy")
-        os.environ.pop("https_proxy")
+        os.environ.pop("http_proxy", None)
+        os.environ.pop("https_proxy", None)
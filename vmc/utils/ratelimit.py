@@ -0,0 +1,120 @@
+import asyncio
+import time
+
+from vmc.utils.metrics import metrics
+
+
+class TokenBucket:
+    """A bucket holding up to `capacity` units, refilled continuously at `rate` units per second."""
+
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.level = capacity
+        self._updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay(self, amount: float) -> float:
+        """Seconds until `amount` units are available. Requests larger than the bucket only wait
+        for a full bucket and leave it in debt, so they are slowed down but never starved."""
+        missing = min(amount, self.capacity) - self.level
+        return max(missing / self.rate, 0)
+
+    def consume(self, amount: float):
+        self.level -= amount
+
+
+class RateLimiter:
+    """Async token bucket limiting requests per `period` and tokens per minute.
+
+    Waiters are served in FIFO order: the head of the queue holds the lock while it sleeps until
+    both buckets can admit it, so a large request is not starved by smaller ones behind it. A
+    cancelled waiter leaves the queue without consuming anything.
+
+    A limit of 0 disables the corresponding bucket.
+    """
+
+    def __init__(self, requests: int = 0, period: float = 60, tpm: int = 0):
+        self.requests = TokenBucket(requests, requests / period) if requests and period else None
+        self.tokens = TokenBucket(tpm, tpm / 60) if tpm else None
+        self._lock = asyncio.Lock()
+        self._waiting = 0
+        self._acquired = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._wait_time = metrics.histogram("ratelimit_wait_seconds")
+
+    @property
+    def enabled(self) -> bool:
+        return self.requests is not None or self.tokens is not None
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of callers waiting for the limiter."""
+        return self._waiting
+
+    @property
+    def avg_wait(self) -> float:
+        return self._total_wait / self._acquired if self._acquired else 0.0
+
+    def delay(self, tokens: int = 0) -> float:
+        """Seconds a new caller would wait right now, ignoring the queue in front of it."""
+        now = time.monotonic()
+        delay = 0.0
+        if self.requests is not None:
+            self.requests.refill(now)
+            delay = max(delay, self.requests.delay(1))
+        if self.tokens is not None and tokens:
+            self.tokens.refill(now)
+            delay = max(delay, self.tokens.delay(tokens))
+        return delay
+
+    def headroom(self, tokens: int = 0) -> float:
+        """Fraction of the fullest-used budget left after one more request of `tokens`, 1 without
+        limits. Negative when the request would have to wait."""
+        now = time.monotonic()
+        left = 1.0
+        if self.requests is not None:
+            self.requests.refill(now)
+            left = min(left, (self.requests.level - 1) / self.requests.capacity)
+        if self.tokens is not None:
+            self.tokens.refill(now)
+            cost = min(tokens, self.tokens.capacity)
+            left = min(left, (self.tokens.level - cost) / self.tokens.capacity)
+        return left
+
+    async def acquire(self, tokens: int = 0):
+        """Wait until one request and `tokens` tokens can be spent, then spend them."""
+        if not self.enabled:
+            return
+        start = time.monotonic()
+        self._waiting += 1
+        try:
+            async with self._lock:
+                while (delay := self.delay(tokens)) > 0:
+                    await asyncio.sleep(delay)
+                if self.requests is not None:
+                    self.requests.consume(1)
+                if self.tokens is not None:
+                    self.tokens.consume(tokens)
+        finally:
+            self._waiting -= 1
+        waited = time.monotonic() - start
+        self._acquired += 1
+        self._total_wait += waited
+        self._max_wait = max(self._max_wait, waited)
+        self._wait_time.observe(waited)
+
+    def stats(self) -> dict:
+        self.delay()
+        return {
+            "queue_depth": self._waiting,
+            "acquired": self._acquired,
+            "avg_wait": self.avg_wait,
+            "max_wait": self._max_wait,
+            "requests_available": self.requests.level if self.requests else None,
+            "tokens_available": self.tokens.level if self.tokens else None,
+        }
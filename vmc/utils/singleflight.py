@@ -0,0 +1,54 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Deduplicate concurrent async calls sharing a key.
+
+    The first caller of `do` for a key runs `fn`, concurrent callers with the same key await the
+    same result. A failure is raised to every waiter and remembered for `negative_ttl` seconds,
+    during which new calls fail fast instead of retrying the expensive operation.
+
+    `fn` runs in its own task, so a cancelled caller does not abort the call for the others.
+    """
+
+    def __init__(self, negative_ttl: float = 5.0):
+        self.negative_ttl = negative_ttl
+        self._inflight: dict[Hashable, asyncio.Future] = {}
+        self._failures: dict[Hashable, tuple[float, Exception]] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        failure = self._failures.get(key)
+        if failure is not None:
+            failed_at, exc = failure
+            if time.monotonic() - failed_at < self.negative_ttl:
+                raise exc
+            del self._failures[key]
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._run(key, fn))
+            future.add_done_callback(_retrieve_exception)
+            self._inflight[key] = future
+        return await asyncio.shield(future)
+
+    async def _run(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        try:
+            return await fn()
+        except Exception as e:
+            self._failures[key] = (time.monotonic(), e)
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    def forget(self, key: Hashable):
+        """Drop the remembered failure of `key`, the next call runs again."""
+        self._failures.pop(key, None)
+
+
+def _retrieve_exception(future: asyncio.Future):
+    """Avoid 'exception was never retrieved' warnings when every waiter was cancelled"""
+    if not future.cancelled():
+        future.exception()
@@ -0,0 +1,68 @@
+from typing import AsyncIterator, Callable, Generic, TypeVar
+
+_T = TypeVar("_T")
+
+
+class ObservedStream(Generic[_T]):
+    """Async iterator over `stream` that reports its chunks, its end and its failure.
+
+    `on_close` runs exactly once: when the stream ends or fails, when it is closed with `aclose`,
+    or when it is garbage collected unread. An async generator with a `finally` block does not
+    give that guarantee, its body never runs when it is dropped before the first `__anext__`.
+    """
+
+    def __init__(
+        self,
+        stream: AsyncIterator[_T],
+        on_chunk: Callable[[_T], None] | None = None,
+        on_end: Callable[[], None] | None = None,
+        on_error: Callable[[Exception], None] | None = None,
+        on_close: Callable[[], None] | None = None,
+    ):
+        self.stream = stream
+        self.on_chunk = on_chunk
+        self.on_end = on_end
+        self.on_error = on_error
+        self.on_close = on_close
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> _T:
+        if self.closed:
+            raise StopAsyncIteration
+        try:
+            chunk = await self.stream.__anext__()
+        except StopAsyncIteration:
+            if self.on_end is not None:
+                self.on_end()
+            self._close()
+            raise
+        except Exception as e:
+            if self.on_error is not None:
+                self.on_error(e)
+            self._close()
+            raise
+        except BaseException:
+            self._close()
+            raise
+        if self.on_chunk is not None:
+            self.on_chunk(chunk)
+        return chunk
+
+    async def aclose(self):
+        self._close()
+        aclose = getattr(self.stream, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+    def _close(self):
+        if self.closed:
+            return
+        self.closed = True
+        if self.on_close is not None:
+            self.on_close()
+
+    def __del__(self):
+        self._close()